@@ -0,0 +1,165 @@
+"""
+Caché en disco de resultados por archivo
+
+Guarda el DataFrame extraído de cada adjunto indexado por el hash de su
+contenido, para no volver a parsear archivos ya procesados en corridas
+anteriores. Los DataFrames se guardan en pickle (conserva tipos exactos y se
+lee mucho más rápido que un Excel); la caché es local del usuario y solo
+contiene archivos escritos por la propia aplicación.
+"""
+import hashlib
+import os
+import shutil
+import uuid
+from typing import List, Optional
+
+import pandas as pd
+
+
+class CacheResultados:
+    """
+    Caché de DataFrames por contenido de archivo y versión del procesador
+
+    Cada versión usa su propio subdirectorio: al cambiar la versión (formato
+    extraído, columnas o pandas) las entradas anteriores se descartan.
+    """
+
+    EXTENSION = '.pkl'
+    MAX_ENTRADAS = 5000
+    BLOQUE_LECTURA = 1024 * 1024
+
+    def __init__(self, directorio: str, version: str, max_entradas: Optional[int] = None):
+        """
+        Args:
+            directorio: Directorio base de la caché (uno por tipo de resultado)
+            version: Identificador de la versión del procesador y del formato
+            max_entradas: Máximo de archivos a conservar (los menos usados se borran)
+        """
+        self.version = hashlib.sha256(f"{version}|pandas {pd.__version__}".encode()).hexdigest()[:16]
+        self.directorio = os.path.join(directorio, self.version)
+        self.max_entradas = max_entradas or self.MAX_ENTRADAS
+        self.aciertos = 0
+        self.fallos = 0
+
+        try:
+            os.makedirs(self.directorio, exist_ok=True)
+            self._borrar_versiones_anteriores(directorio)
+        except OSError as e:
+            print(f"⚠️ No se pudo preparar la caché {self.directorio}: {e}")
+
+    def _borrar_versiones_anteriores(self, directorio: str):
+        """Elimina subdirectorios de versiones distintas a la actual"""
+        for nombre in os.listdir(directorio):
+            ruta = os.path.join(directorio, nombre)
+            if nombre != self.version and os.path.isdir(ruta):
+                shutil.rmtree(ruta, ignore_errors=True)
+
+    # ==================== CLAVES ====================
+
+    @classmethod
+    def hash_archivo(cls, ruta: str) -> str:
+        """SHA-256 del contenido de un archivo"""
+        h = hashlib.sha256()
+        with open(ruta, 'rb') as f:
+            for bloque in iter(lambda: f.read(cls.BLOQUE_LECTURA), b''):
+                h.update(bloque)
+        return h.hexdigest()
+
+    def clave_archivo(self, ruta: str, *extra) -> Optional[str]:
+        """
+        Clave de caché de un archivo: hash del contenido, extensión y datos extra
+
+        Returns:
+            Clave o None si el archivo no se pudo leer
+        """
+        return self.clave_archivos([ruta], *extra)
+
+    def clave_archivos(self, rutas: List[str], *extra) -> Optional[str]:
+        """
+        Clave de caché de un resultado que sale de varios archivos (en orden)
+
+        Returns:
+            Clave o None si alguno de los archivos no se pudo leer
+        """
+        partes = []
+        try:
+            for ruta in rutas:
+                partes.extend([self.hash_archivo(ruta), os.path.splitext(ruta)[1].lower()])
+        except OSError:
+            return None
+        partes.extend(str(p) for p in extra)
+        return hashlib.sha256('|'.join(partes).encode('utf-8')).hexdigest()
+
+    def _ruta(self, clave: str) -> str:
+        return os.path.join(self.directorio, clave + self.EXTENSION)
+
+    # ==================== LECTURA / ESCRITURA ====================
+
+    def obtener(self, clave: Optional[str]) -> Optional[pd.DataFrame]:
+        """DataFrame guardado para la clave o None si no existe o está dañado"""
+        if not clave:
+            return None
+        ruta = self._ruta(clave)
+        if not os.path.exists(ruta):
+            self.fallos += 1
+            return None
+
+        try:
+            df = pd.read_pickle(ruta)
+            os.utime(ruta)  # Marca de uso para conservar las entradas recientes
+        except Exception:
+            self._borrar(ruta)
+            self.fallos += 1
+            return None
+
+        self.aciertos += 1
+        return df
+
+    def guardar(self, clave: Optional[str], df: pd.DataFrame) -> bool:
+        """Guarda el DataFrame de forma atómica (archivo temporal + reemplazo)"""
+        if not clave or df is None:
+            return False
+        ruta = self._ruta(clave)
+        temporal = f"{ruta}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            df.to_pickle(temporal)
+            os.replace(temporal, ruta)
+            return True
+        except Exception as e:
+            self._borrar(temporal)
+            print(f"⚠️ No se pudo guardar en caché: {e}")
+            return False
+
+    @staticmethod
+    def _borrar(ruta: str):
+        try:
+            os.remove(ruta)
+        except OSError:
+            pass
+
+    # ==================== MANTENIMIENTO ====================
+
+    def podar(self) -> int:
+        """
+        Deja como máximo max_entradas archivos, borrando los de uso más antiguo
+
+        Returns:
+            Cantidad de entradas eliminadas
+        """
+        try:
+            entradas = [e for e in os.scandir(self.directorio) if e.name.endswith(self.EXTENSION)]
+        except OSError:
+            return 0
+        if len(entradas) <= self.max_entradas:
+            return 0
+
+        entradas.sort(key=lambda e: e.stat().st_mtime)
+        sobrantes = entradas[:len(entradas) - self.max_entradas]
+        for entrada in sobrantes:
+            self._borrar(entrada.path)
+        return len(sobrantes)
+
+    def limpiar(self):
+        """Elimina todas las entradas de la versión actual"""
+        shutil.rmtree(self.directorio, ignore_errors=True)
+        os.makedirs(self.directorio, exist_ok=True)
@@ -0,0 +1,51 @@
+"""
+Lectura rápida del encabezado de archivos Excel
+
+Lee solo la primera fila de la primera hoja con openpyxl en modo
+``read_only`` (las filas se recorren desde el XML sin cargar el libro), para
+clasificar archivos o decidir qué columnas leer antes del parseo completo
+con pandas.
+"""
+import os
+from typing import List, Optional
+
+from openpyxl import load_workbook
+
+# Formatos que openpyxl puede abrir
+EXTENSIONES_OPENPYXL = ('.xlsx', '.xlsm')
+
+
+def leer_encabezado(ruta: str) -> Optional[List[object]]:
+    """
+    Valores de la primera fila de la primera hoja (la que lee pd.read_excel)
+
+    Returns:
+        Lista de valores (None en celdas vacías) o None si el formato no es
+        compatible o el archivo no se pudo leer
+    """
+    if os.path.splitext(str(ruta))[1].lower() not in EXTENSIONES_OPENPYXL:
+        return None
+
+    try:
+        wb = load_workbook(ruta, read_only=True, data_only=True)
+    except Exception:
+        return None
+
+    try:
+        ws = wb.worksheets[0]
+        for fila in ws.iter_rows(min_row=1, max_row=1, values_only=True):
+            valores = list(fila)
+            # Las celdas vacías al final no son columnas
+            while valores and valores[-1] is None:
+                valores.pop()
+            return valores
+        return []
+    except Exception:
+        return None
+    finally:
+        wb.close()
+
+
+def nombres_normalizados(encabezado: Optional[List[object]]) -> List[str]:
+    """Nombres de columna en minúsculas y sin espacios extremos ('' si vacíos)"""
+    return ['' if valor is None else str(valor).strip().lower() for valor in encabezado or []]
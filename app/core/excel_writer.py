@@ -0,0 +1,286 @@
+"""
+Escritura rápida de archivos Excel (.xlsx)
+
+Reemplaza a ``DataFrame.to_excel`` con openpyxl, que arma todo el libro en
+memoria celda por celda. Los motores disponibles escriben fila a fila en
+streaming con memoria constante:
+
+- ``xlsxwriter`` con ``constant_memory`` (si está instalado, el más rápido)
+- ``openpyxl`` en modo ``write_only`` (siempre disponible)
+
+``EscritorExcel`` permite además agregar DataFrames a las hojas por partes
+(para volcar resultados a medida que se procesan).
+
+El contenido es el mismo que genera pandas: mismos nombres de hoja y orden
+de columnas, encabezado sin estilo, NaN como celda vacía, infinito como
+texto 'inf' y fechas con formato ``YYYY-MM-DD HH:MM:SS`` / ``YYYY-MM-DD``.
+"""
+from datetime import date, datetime
+from typing import Callable, Dict, List, Mapping, Optional, Union
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+
+try:
+    import xlsxwriter
+except ImportError:
+    xlsxwriter = None
+
+
+# Hoja usada cuando se escribe un solo DataFrame (igual que pandas)
+HOJA_POR_DEFECTO = 'Sheet1'
+
+# Formatos de fecha que aplica pandas al exportar
+FORMATO_FECHA_HORA = 'YYYY-MM-DD HH:MM:SS'
+FORMATO_FECHA = 'YYYY-MM-DD'
+
+# Excel no representa infinito: pandas lo escribe como texto
+INF_REP = 'inf'
+
+# Filas que se convierten a valores Python a la vez (acota la memoria)
+FILAS_POR_BLOQUE = 10_000
+
+
+# ==================== PREPARACIÓN DE DATOS ====================
+
+def _valores_columna(serie: pd.Series) -> list:
+    """Valores Python de una columna con None en vacíos e infinito como texto"""
+    valores = serie.tolist()
+    nulos = serie.isna().to_numpy()
+
+    for i in np.flatnonzero(nulos):
+        valores[i] = None
+
+    if serie.dtype.kind in 'fO':
+        posiciones = np.flatnonzero(~nulos)
+        arreglo = serie.to_numpy()[posiciones]
+        for i in posiciones[arreglo == np.inf]:
+            valores[i] = INF_REP
+        for i in posiciones[arreglo == -np.inf]:
+            valores[i] = f"-{INF_REP}"
+    return valores
+
+
+def _columnas_con_fechas(df: pd.DataFrame) -> List[int]:
+    """Posiciones de columnas que pueden contener fechas"""
+    return [
+        i for i, dtype in enumerate(df.dtypes)
+        if pd.api.types.is_object_dtype(dtype)
+        or isinstance(dtype, pd.CategoricalDtype)
+        or pd.api.types.is_datetime64_any_dtype(dtype)
+    ]
+
+
+def _filas(df: pd.DataFrame):
+    """
+    Itera las filas de datos como listas de valores Python
+
+    Convierte FILAS_POR_BLOQUE filas a la vez para que la memoria extra no
+    crezca con el tamaño del DataFrame.
+    """
+    for inicio in range(0, len(df), FILAS_POR_BLOQUE):
+        bloque = df.iloc[inicio:inicio + FILAS_POR_BLOQUE]
+        columnas = [_valores_columna(bloque.iloc[:, i]) for i in range(bloque.shape[1])]
+        for fila in zip(*columnas, strict=True):
+            yield list(fila)
+
+
+def _formato_fecha(valor) -> Optional[str]:
+    """Formato numérico para fechas, None si el valor no es fecha"""
+    if isinstance(valor, datetime):
+        return FORMATO_FECHA_HORA
+    if isinstance(valor, date):
+        return FORMATO_FECHA
+    return None
+
+
+# ==================== MOTORES ====================
+
+class _LibroOpenpyxl:
+    """Libro openpyxl en modo write_only (cada hoja se vuelca a disco al escribir)"""
+
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        self.wb = Workbook(write_only=True)
+        self.hojas = {}
+
+    def crear_hoja(self, nombre: str, columnas: List) -> None:
+        ws = self.wb.create_sheet(title=nombre)
+        ws.append(list(columnas))
+        self.hojas[nombre] = ws
+
+    def agregar_filas(self, nombre: str, df: pd.DataFrame, fila_inicial: int) -> None:
+        ws = self.hojas[nombre]
+        con_fechas = _columnas_con_fechas(df)
+
+        for fila in _filas(df):
+            for c in con_fechas:
+                formato = _formato_fecha(fila[c])
+                if formato:
+                    celda = WriteOnlyCell(ws, value=fila[c])
+                    celda.number_format = formato
+                    fila[c] = celda
+            ws.append(fila)
+
+    def cerrar(self) -> None:
+        self.wb.save(self.ruta)
+
+
+class _LibroXlsxwriter:
+    """Libro xlsxwriter en modo constant_memory (filas en orden por hoja)"""
+
+    def __init__(self, ruta: str):
+        self.wb = xlsxwriter.Workbook(ruta, {
+            'constant_memory': True,
+            'strings_to_urls': False,
+        })
+        self.formatos = {
+            FORMATO_FECHA_HORA: self.wb.add_format({'num_format': FORMATO_FECHA_HORA}),
+            FORMATO_FECHA: self.wb.add_format({'num_format': FORMATO_FECHA}),
+        }
+        self.hojas = {}
+
+    def crear_hoja(self, nombre: str, columnas: List) -> None:
+        ws = self.wb.add_worksheet(nombre)
+        ws.write_row(0, 0, list(columnas))
+        self.hojas[nombre] = ws
+
+    def agregar_filas(self, nombre: str, df: pd.DataFrame, fila_inicial: int) -> None:
+        ws = self.hojas[nombre]
+        con_fechas = _columnas_con_fechas(df)
+
+        for r, fila in enumerate(_filas(df), start=fila_inicial):
+            for c in con_fechas:
+                formato = _formato_fecha(fila[c])
+                if formato:
+                    ws.write_datetime(r, c, fila[c], self.formatos[formato])
+                    fila[c] = None
+            # Las celdas None sin formato no se escriben
+            ws.write_row(r, 0, fila)
+
+    def cerrar(self) -> None:
+        self.wb.close()
+
+
+# Motores registrados: nombre -> clase del libro
+MOTORES: Dict[str, Callable[[str], object]] = {
+    'openpyxl': _LibroOpenpyxl,
+}
+if xlsxwriter is not None:
+    MOTORES['xlsxwriter'] = _LibroXlsxwriter
+
+
+def motor_por_defecto() -> str:
+    """Motor más rápido disponible en esta instalación"""
+    return 'xlsxwriter' if 'xlsxwriter' in MOTORES else 'openpyxl'
+
+
+def _validar_motor(motor: Optional[str]) -> str:
+    motor = motor or motor_por_defecto()
+    if motor not in MOTORES:
+        raise ValueError(f"Motor de Excel no disponible: {motor}")
+    return motor
+
+
+# ==================== API ====================
+
+def escribir_excel(ruta: str,
+                   datos: Union[pd.DataFrame, Mapping[str, pd.DataFrame]],
+                   motor: Optional[str] = None) -> str:
+    """
+    Escribe uno o varios DataFrames a un archivo .xlsx sin índice
+
+    Args:
+        ruta: Ruta del archivo de salida
+        datos: DataFrame (hoja 'Sheet1') o diccionario {nombre_hoja: DataFrame}
+            en el orden en que deben quedar las hojas
+        motor: Nombre del motor ('xlsxwriter' u 'openpyxl'); por defecto el
+            más rápido disponible
+
+    Returns:
+        Nombre del motor usado
+
+    Raises:
+        ValueError: Si no hay hojas o el motor no está disponible
+    """
+    hojas = {HOJA_POR_DEFECTO: datos} if isinstance(datos, pd.DataFrame) else dict(datos)
+    if not hojas:
+        raise ValueError("No hay hojas para escribir")
+
+    with EscritorExcel(ruta, motor) as escritor:
+        for nombre, df in hojas.items():
+            escritor.agregar(nombre, df)
+    return escritor.motor
+
+
+class EscritorExcel:
+    """
+    Escribe un archivo .xlsx por partes, agregando DataFrames a sus hojas
+
+    Permite volcar resultados a medida que se generan sin tener todo el
+    contenido en memoria. El encabezado de cada hoja lo fija el primer
+    DataFrame que se le agrega; en los siguientes se toman esas mismas
+    columnas (las que falten quedan vacías y las nuevas se ignoran).
+
+    Uso:
+        with EscritorExcel(ruta) as escritor:
+            for parte in partes:
+                escritor.agregar('Detalles', parte)
+    """
+
+    def __init__(self, ruta: str, motor: Optional[str] = None):
+        """
+        Args:
+            ruta: Ruta del archivo de salida
+            motor: Nombre del motor ('xlsxwriter' u 'openpyxl'); por defecto el
+                más rápido disponible
+
+        Raises:
+            ValueError: Si el motor no está disponible
+        """
+        self.motor = _validar_motor(motor)
+        self.ruta = str(ruta)
+        self._libro = MOTORES[self.motor](self.ruta)
+        self._columnas: Dict[str, List] = {}
+        self._filas: Dict[str, int] = {}
+
+    def agregar(self, hoja: str, df: pd.DataFrame) -> int:
+        """
+        Agrega las filas del DataFrame al final de la hoja (la crea si no existe)
+
+        Returns:
+            Filas de datos escritas en la hoja hasta ahora
+        """
+        if hoja not in self._columnas:
+            self._columnas[hoja] = list(df.columns)
+            self._filas[hoja] = 0
+            self._libro.crear_hoja(hoja, self._columnas[hoja])
+
+        columnas = self._columnas[hoja]
+        if list(df.columns) != columnas:
+            df = df.reindex(columns=columnas)
+
+        if len(df):
+            self._libro.agregar_filas(hoja, df, self._filas[hoja] + 1)
+            self._filas[hoja] += len(df)
+        return self._filas[hoja]
+
+    def columnas(self, hoja: str) -> List:
+        """Encabezado de la hoja (vacío si aún no se creó)"""
+        return list(self._columnas.get(hoja, []))
+
+    def filas(self, hoja: str) -> int:
+        """Filas de datos escritas en la hoja"""
+        return self._filas.get(hoja, 0)
+
+    def cerrar(self) -> None:
+        """Guarda el archivo"""
+        self._libro.cerrar()
+
+    def __enter__(self) -> 'EscritorExcel':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.cerrar()
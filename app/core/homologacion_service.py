@@ -2,14 +2,37 @@
 Servicio CRUD para gestionar archivos de homologación de múltiples EPS
 Permite agregar, editar, eliminar y consultar códigos de homologación
 con sistema de caché optimizado para mejorar rendimiento
+
+Persistencia:
+    Cada EPS tiene un snapshot XLSX y un journal de cambios append-only
+    (``<archivo>.journal.jsonl``) en el mismo directorio de red. Las
+    operaciones CRUD solo agregan una línea al journal; la lectura aplica
+    el journal sobre el último snapshot y la compactación reescribe el XLSX
+    cuando el journal crece demasiado.
+
+Concurrencia:
+    Varios analistas editan los mismos archivos. Cada escritura se hace bajo
+    un lock file (``<archivo>.lock``) con lease y verifica la versión leída
+    (firma de snapshot + journal). Si otro usuario escribió entretanto, los
+    cambios propios se fusionan fila a fila sobre el estado del disco y solo
+    se rechazan los que tocan una fila modificada por el otro usuario.
 """
 import pandas as pd
+import numpy as np
 import os
+import json
+import time
+import threading
+import platform
+import uuid
+import itertools
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime
 import shutil
-from typing import Optional, Dict, Any
-from functools import lru_cache
-import hashlib
+from typing import Optional, Dict, Any, List, Tuple
+
+from app.core import excel_writer
 
 
 class HomologacionService:
@@ -36,9 +59,31 @@ class HomologacionService:
     # Columnas por defecto (para compatibilidad)
     COLUMNAS = ['Código Servicio de la ERP', 'Código producto en DGH', 'COD_SERV_FACT']
     
+    # Journal de cambios junto a cada archivo de homologación
+    JOURNAL_SUFIJO = ".journal.jsonl"
+    
+    # Entradas del journal que disparan la compactación al XLSX
+    JOURNAL_MAX_ENTRADAS = 200
+    
+    # Lock de escritura compartido entre usuarios
+    LOCK_SUFIJO = ".lock"
+    LOCK_LEASE_SEGUNDOS = 60    # Un lock sin renovar por más tiempo se considera abandonado
+    LOCK_ESPERA_SEGUNDOS = 10   # Tiempo máximo esperando a otro usuario
+    LOCK_RENOVACION_SEGUNDOS = 20  # Cada cuánto el dueño renueva el lock mientras lo mantiene
+    
+    # Máximo de códigos recordados por EPS en el caché de búsqueda (LRU)
+    SEARCH_CACHE_MAX = 2048
+    
     # Cache class-level para compartir entre instancias
     _file_cache: Dict[str, Dict[str, Any]] = {}
-    _search_cache: Dict[str, Dict[str, pd.DataFrame]] = {}
+    # Por EPS: {'version': versión de la tabla, 'columnas': tupla, 'filas': OrderedDict código -> (índice, valores) o None}
+    _search_cache: Dict[str, Dict[str, Any]] = {}
+    
+    # Separa columnas en el texto de búsqueda para que un filtro no coincida entre dos
+    _SEPARADOR_BUSQUEDA = "\x1f"
+    
+    # Versiones únicas para DataFrames modificados en memoria y aún no guardados
+    _contador_versiones = itertools.count(1)
     
     def __init__(self, eps: Optional[str] = None):
         """
@@ -49,55 +94,126 @@ class HomologacionService:
         """
         self.eps = eps
         self.homologacion_path: Optional[str] = None
+        self._version_local = 0  # 0 = igual al disco; otro valor = cambios en memoria
+        self._codigos_cache: Optional[Tuple[str, pd.Series]] = None  # (versión, códigos normalizados)
+        self._texto_busqueda: Optional[Tuple[str, pd.Series]] = None  # (versión, texto de búsqueda por fila)
+        self._ultimo_filtro: Optional[Tuple[str, str, Any]] = None  # (versión, filtro, posiciones)
+        self.total_coincidencias = 0  # Filas que cumplen el último filtro de listar
         self.df: Optional[pd.DataFrame] = None
         self.columnas_actuales: list = self.COLUMNAS  # Columnas según EPS
-        self._file_hash: Optional[str] = None  # Hash para detectar cambios
+        self._firma: Optional[str] = None  # Firma (snapshot + journal) para detectar cambios
+        self.conflictos: List[Dict[str, Any]] = []  # Cambios rechazados en el último guardado
         
         if eps:
             self._set_eps(eps)
     
-    def _get_file_hash(self, file_path: str) -> str:
-        """Calcula hash MD5 de un archivo para detectar cambios"""
-        if not os.path.exists(file_path):
-            return ""
+    @property
+    def df(self) -> Optional[pd.DataFrame]:
+        """Tabla de homologación en memoria"""
+        return self._df
+    
+    @df.setter
+    def df(self, valor: Optional[pd.DataFrame]):
+        self._df = valor
+        self._marcar_modificado()
+    
+    def _marcar_modificado(self):
+        """Registra un cambio en memoria: invalida por versión los cachés de búsqueda"""
+        self._version_local = next(self._contador_versiones)
+    
+    def _fijar_firma(self, firma: str):
+        """Sincroniza la versión con el disco tras leer o guardar"""
+        self._firma = firma
+        self._version_local = 0
+    
+    def _version_tabla(self) -> str:
+        """
+        Versión de la tabla en memoria
         
-        with open(file_path, 'rb') as f:
-            file_hash = hashlib.md5()
-            for chunk in iter(lambda: f.read(4096), b""):
-                file_hash.update(chunk)
-        return file_hash.hexdigest()
+        Dos instancias con la misma firma y sin cambios locales comparten
+        versión (y caché); cualquier cambio sin guardar genera una única.
+        """
+        return f"{self._firma}#{self._version_local}"
+    
+    @staticmethod
+    def _get_file_signature(file_path: str) -> str:
+        """
+        Firma barata de un archivo (mtime + tamaño) para detectar cambios
+        sin leer su contenido completo por la red
+        """
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return ""
+        return f"{stat.st_mtime_ns}:{stat.st_size}"
+    
+    def _get_firma_tabla(self, file_path: str) -> str:
+        """Firma combinada del snapshot XLSX y su journal de cambios"""
+        return self.firma_tabla(file_path)
     
     def _is_cache_valid(self, cache_key: str) -> bool:
-        """Verifica si el caché es válido comparando hash del archivo"""
+        """Verifica si el caché es válido comparando la firma del snapshot y del journal"""
         if cache_key not in self._file_cache:
             return False
             
         cache_entry = self._file_cache[cache_key]
-        current_hash = self._get_file_hash(cache_entry.get('file_path', ''))
+        if cache_entry.get('file_path') != self.homologacion_path:
+            return False
         
-        return current_hash == cache_entry.get('file_hash', '')
+        firma_actual = self._get_firma_tabla(cache_entry.get('file_path', ''))
+        
+        return firma_actual == cache_entry.get('firma', '')
     
     def _update_file_cache(self, cache_key: str, df: pd.DataFrame, file_path: str):
-        """Actualiza el caché de archivo con nuevo DataFrame y hash"""
-        file_hash = self._get_file_hash(file_path)
-        
+        """Actualiza el caché de archivo con nuevo DataFrame y firma"""
         self._file_cache[cache_key] = {
             'df': df.copy(),
             'file_path': file_path,
-            'file_hash': file_hash,
+            'firma': self._get_firma_tabla(file_path),
             'timestamp': datetime.now()
         }
         
-        # Limpiar caché de búsqueda relacionado
-        search_cache_key = f"{cache_key}_search"
-        if search_cache_key in self._search_cache:
-            del self._search_cache[search_cache_key]
+    def _get_search_cache(self) -> Dict[str, Any]:
+        """
+        Caché de búsqueda de la EPS para la versión actual de la tabla
+        
+        Si la tabla cambió (versión distinta) el caché se descarta completo,
+        sin depender de que cada operación recuerde limpiarlo.
+        """
+        cache_key = f"{self.eps}_search"
+        version = self._version_tabla()
+        entrada = self._search_cache.get(cache_key)
+        if entrada is None or entrada['version'] != version:
+            entrada = {
+                'version': version,
+                'columnas': tuple(self.df.columns) if self.df is not None else (),
+                'filas': OrderedDict()
+            }
+            self._search_cache[cache_key] = entrada
+        return entrada
     
-    def _clear_search_cache(self, cache_key: str):
-        """Limpia el caché de búsqueda para una EPS específica"""
-        search_cache_key = f"{cache_key}_search"
-        if search_cache_key in self._search_cache:
-            del self._search_cache[search_cache_key]
+    def _guardar_en_search_cache(self, entrada: Dict[str, Any], codigo: str, fila: Optional[Tuple]):
+        """Agrega un resultado al LRU descartando los menos usados"""
+        filas = entrada['filas']
+        filas[codigo] = fila
+        filas.move_to_end(codigo)
+        while len(filas) > self.SEARCH_CACHE_MAX:
+            filas.popitem(last=False)
+    
+    @staticmethod
+    def _fila_desde_cache(entrada: Dict[str, Any], fila: Optional[Tuple]) -> Optional[pd.Series]:
+        """Reconstruye la Serie de un resultado cacheado"""
+        if fila is None:
+            return None
+        indice, valores = fila
+        return pd.Series(list(valores), index=list(entrada['columnas']), name=indice, dtype=object)
+    
+    def _codigos_normalizados(self) -> pd.Series:
+        """Códigos ERP como texto sin espacios, calculados una vez por versión"""
+        version = self._version_tabla()
+        if self._codigos_cache is None or self._codigos_cache[0] != version:
+            self._codigos_cache = (version, self.df['Código Servicio de la ERP'].astype(str).str.strip())
+        return self._codigos_cache[1]
     
     @classmethod
     def clear_all_cache(cls):
@@ -122,8 +238,11 @@ class HomologacionService:
                     if os.path.exists(filepath):
                         # Obtener cantidad de registros
                         try:
-                            df = pd.read_excel(filepath, nrows=0)
                             df_full = pd.read_excel(filepath)
+                            df_full.columns = df_full.columns.str.strip()
+                            entradas = cls._leer_journal(cls._journal_path_de(filepath))
+                            if entradas:
+                                df_full = cls._aplicar_journal(df_full, entradas)
                             count = len(df_full)
                         except:
                             count = 0
@@ -173,33 +292,27 @@ class HomologacionService:
             # Verificar si tenemos caché válido
             if self._is_cache_valid(cache_key):
                 self.df = self._file_cache[cache_key]['df'].copy()
-                self._file_hash = self._file_cache[cache_key]['file_hash']
+                self._fijar_firma(self._file_cache[cache_key]['firma'])
                 eps_name = self.eps.upper() if self.eps else "DESCONOCIDA"
                 print(f"⚡ Homologación {eps_name} cargada desde caché: {len(self.df)} registros") # type: ignore
                 return True
             
             # Cargar desde archivo si no hay caché válido
-            if os.path.exists(self.homologacion_path):
-                print(f"📁 Cargando homologación {self.eps} desde archivo...")
-                self.df = pd.read_excel(self.homologacion_path)
-                
-                # Limpiar columnas
-                self.df.columns = self.df.columns.str.strip()
-                
-                # Mantener solo columnas relevantes para esta EPS
-                cols_existentes = [c for c in self.columnas_actuales if c in self.df.columns]
-                if cols_existentes:
-                    self.df = self.df[cols_existentes].copy()
+            df_disco = self._leer_estado_disco()
+            if df_disco is not None:
+                print(f"📁 Homologación {self.eps} leída desde archivo")
+                self.df = df_disco
                 
                 # Actualizar caché
                 self._update_file_cache(cache_key, self.df, self.homologacion_path)
-                self._file_hash = self._file_cache[cache_key]['file_hash']
+                self._fijar_firma(self._file_cache[cache_key]['firma'])
                 
                 eps_name = self.eps.upper() if self.eps else "DESCONOCIDA"
                 print(f"✅ Homologación {eps_name} cargada: {len(self.df)} registros (guardado en caché)")
             else:
                 # Crear DataFrame vacío con las columnas de esta EPS
                 self.df = pd.DataFrame(columns=self.columnas_actuales)
+                self._fijar_firma(self._get_firma_tabla(self.homologacion_path))
                 print(f"⚠️ Archivo de homologación {self.eps or 'desconocida'} no encontrado, creando nuevo")
                 
             return True
@@ -210,33 +323,136 @@ class HomologacionService:
             self.df = pd.DataFrame(columns=self.columnas_actuales)
             return False
     
-    def _guardar(self):
-        """Guarda los cambios en el archivo e invalida caché"""
+    def _guardar(self, cambios: Optional[List[Dict[str, Any]]] = None):
+        """
+        Persiste los cambios e invalida caché
+        
+        Args:
+            cambios: Entradas de journal a agregar. Si es None se reescribe
+                el snapshot completo (compactación)
+        
+        Returns:
+            True si se guardó correctamente
+        """
+        if not self.homologacion_path:
+            print("❌ No hay EPS seleccionada")
+            return False
+        
+        if self.df is None:
+            print("❌ No hay datos para guardar")
+            return False
+        
+        if cambios is None:
+            return self.compactar()
+        
+        self.conflictos = []
+        if not cambios:
+            return True
+        
+        try:
+            with self._bloqueo_escritura() as bloqueado:
+                if not bloqueado:
+                    print("❌ Archivo de homologación bloqueado por otro usuario, intenta de nuevo")
+                    return False
+                
+                # Otro usuario escribió desde nuestra lectura: fusionar fila a fila
+                if self._hay_cambios_externos():
+                    df_disco, cambios = self._fusionar_con_disco(cambios)
+                    self.df = self._aplicar_journal(df_disco, cambios)
+                    print(f"🔀 Cambios fusionados con la versión de otro usuario "
+                          f"({len(cambios)} aplicados, {len(self.conflictos)} en conflicto)")
+                
+                if cambios:
+                    journal_path = self._journal_path_de(self.homologacion_path)
+                    pendientes = len(self._leer_journal(journal_path))
+                    
+                    # Si el journal quedaría demasiado grande, compactar directamente
+                    if pendientes + len(cambios) >= self.JOURNAL_MAX_ENTRADAS:
+                        if not self._escribir_snapshot():
+                            return False
+                    else:
+                        self._registrar_en_journal(journal_path, cambios)
+                        eps_name = self.eps.upper() if self.eps else "DESCONOCIDA"
+                        print(f"✅ {len(cambios)} cambio(s) {eps_name} registrados en journal")
+                
+                # Actualizar caché con la versión en memoria (sin releer el XLSX)
+                cache_key = f"{self.eps}_homologacion"
+                self._update_file_cache(cache_key, self.df, self.homologacion_path)
+                self._fijar_firma(self._file_cache[cache_key]['firma'])
+            
+            for conflicto in self.conflictos:
+                print(f"⚠️ Conflicto en {conflicto['codigo']}: {conflicto['motivo']}")
+            return not self.conflictos
+            
+        except Exception as e:
+            print(f"❌ Error guardando: {e}")
+            return False
+    
+    def compactar(self):
+        """
+        Reescribe el snapshot XLSX con el estado actual y archiva el journal
+        
+        El journal aplicado se mueve a ``backups`` como delta. Solo se copia el
+        XLSX completo cuando no hay journal que archivar.
+        
+        Returns:
+            True si se compactó correctamente
+        """
         if not self.homologacion_path:
             print("❌ No hay EPS seleccionada")
             return False
             
         try:
-            # Crear backup antes de guardar
-            if os.path.exists(self.homologacion_path):
-                backup_dir = os.path.join(self.HOMOLOGACION_DIR, "backups")
-                os.makedirs(backup_dir, exist_ok=True)
-                backup_filename = f"{self.eps}_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-                backup_path = os.path.join(backup_dir, backup_filename)
-                shutil.copy2(self.homologacion_path, backup_path)
-                print(f"📋 Backup creado: {backup_filename}")
-            
             # Guardar archivo
             if self.df is None:
                 print("❌ No hay datos para guardar")
                 return False
+            
+            with self._bloqueo_escritura() as bloqueado:
+                if not bloqueado:
+                    print("❌ Archivo de homologación bloqueado por otro usuario, intenta de nuevo")
+                    return False
                 
-            self.df.to_excel(self.homologacion_path, index=False)
+                # Los cambios propios ya están en el journal: compactar la versión del disco
+                if self._hay_cambios_externos():
+                    df_disco = self._leer_estado_disco()
+                    if df_disco is not None:
+                        self.df = df_disco
+                
+                return self._escribir_snapshot()
+            
+        except Exception as e:
+            print(f"❌ Error guardando: {e}")
+            return False
+    
+    def _escribir_snapshot(self) -> bool:
+        """Reescribe el XLSX y archiva el journal (se llama con el lock tomado)"""
+        try:
+            journal_path = self._journal_path_de(self.homologacion_path)
+            backup_dir = os.path.join(os.path.dirname(self.homologacion_path), "backups")
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            tiene_journal = os.path.exists(journal_path)
+            
+            # Sin journal que archivar: backup completo antes de sobrescribir
+            if not tiene_journal and os.path.exists(self.homologacion_path):
+                os.makedirs(backup_dir, exist_ok=True)
+                backup_filename = f"{self.eps}_backup_{timestamp}.xlsx"
+                shutil.copy2(self.homologacion_path, os.path.join(backup_dir, backup_filename))
+                print(f"📋 Backup creado: {backup_filename}")
+            
+            excel_writer.escribir_excel(self.homologacion_path, self.df)
+            
+            # El snapshot ya incluye los cambios: archivar el journal como delta
+            if tiene_journal:
+                os.makedirs(backup_dir, exist_ok=True)
+                delta_filename = f"{self.eps}_cambios_{timestamp}.jsonl"
+                shutil.move(journal_path, os.path.join(backup_dir, delta_filename))
+                print(f"📋 Journal archivado: {delta_filename}")
             
             # Actualizar caché con nueva versión
             cache_key = f"{self.eps}_homologacion"
             self._update_file_cache(cache_key, self.df, self.homologacion_path)
-            self._file_hash = self._file_cache[cache_key]['file_hash']
+            self._fijar_firma(self._file_cache[cache_key]['firma'])
             
             eps_name = self.eps.upper() if self.eps else "DESCONOCIDA"
             print(f"✅ Archivo {eps_name} guardado (caché actualizado)")
@@ -246,32 +462,502 @@ class HomologacionService:
             print(f"❌ Error guardando: {e}")
             return False
     
+    # ==================== JOURNAL ====================
+    
+    @classmethod
+    def _journal_path_de(cls, file_path: str) -> str:
+        """Ruta del journal de cambios asociado a un archivo de homologación"""
+        return os.path.splitext(file_path)[0] + cls.JOURNAL_SUFIJO
+    
+    @staticmethod
+    def _leer_journal(journal_path: str) -> List[Dict[str, Any]]:
+        """
+        Lee las entradas del journal de cambios
+        
+        Las líneas incompletas (escritura interrumpida) se ignoran.
+        """
+        try:
+            with open(journal_path, encoding='utf-8') as f:
+                lineas = f.readlines()
+        except FileNotFoundError:
+            return []
+        
+        entradas = []
+        for linea in lineas:
+            linea = linea.strip()
+            if not linea:
+                continue
+            try:
+                entradas.append(json.loads(linea))
+            except json.JSONDecodeError:
+                print(f"⚠️ Línea de journal inválida ignorada en {os.path.basename(journal_path)}")
+        return entradas
+    
+    @staticmethod
+    def _registrar_en_journal(journal_path: str, cambios: List[Dict[str, Any]]):
+        """Agrega entradas al final del journal en una sola escritura"""
+        lineas = "".join(json.dumps(c, ensure_ascii=False) + "\n" for c in cambios)
+        with open(journal_path, 'a', encoding='utf-8') as f:
+            f.write(lineas)
+            f.flush()
+            os.fsync(f.fileno())
+    
+    def _nueva_entrada(self, op: str, codigo: str, valores: Optional[Dict[str, Any]] = None,
+                       antes: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Crea una entrada de journal para una operación CRUD"""
+        return {
+            'ts': datetime.now().isoformat(timespec='seconds'),
+            'eps': self.eps,
+            'op': op,
+            'codigo': codigo,
+            'valores': valores or {},
+            'antes': antes
+        }
+    
+    @staticmethod
+    def _fila_como_dict(fila: Optional[pd.Series]) -> Optional[Dict[str, Any]]:
+        """Convierte una fila a dict serializable en JSON (NaN -> None)"""
+        if fila is None:
+            return None
+        return {str(k): (None if pd.isna(v) else str(v)) for k, v in fila.items()}
+    
+    @staticmethod
+    def _aplicar_journal(df: pd.DataFrame, entradas: List[Dict[str, Any]]) -> pd.DataFrame:
+        """
+        Aplica las entradas del journal sobre un snapshot
+        
+        Las operaciones se resuelven primero en diccionarios por código y se
+        aplican al DataFrame en una sola pasada (sin un scan por operación).
+        Reaplicar un journal ya incluido en el snapshot no cambia el resultado.
+        """
+        col_erp = 'Código Servicio de la ERP'
+        if col_erp in df.columns:
+            codigos_base = df[col_erp].astype(str).str.strip()
+        else:
+            codigos_base = pd.Series(dtype=str)
+        existentes = set(codigos_base)
+        
+        eliminados: set = set()
+        actualizaciones: Dict[str, Dict[str, Any]] = {}
+        nuevos: Dict[str, Dict[str, Any]] = {}
+        
+        for entrada in entradas:
+            op = entrada.get('op')
+            codigo = str(entrada.get('codigo', '')).strip()
+            valores = entrada.get('valores') or {}
+            en_base = codigo in existentes and codigo not in eliminados
+            
+            if op == 'agregar':
+                if codigo not in nuevos and not en_base:
+                    nuevos[codigo] = dict(valores)
+            elif op == 'actualizar':
+                if codigo in nuevos:
+                    nuevos[codigo].update(valores)
+                elif en_base:
+                    actualizaciones.setdefault(codigo, {}).update(valores)
+            elif op == 'eliminar':
+                if codigo in nuevos:
+                    del nuevos[codigo]
+                elif en_base:
+                    eliminados.add(codigo)
+                    actualizaciones.pop(codigo, None)
+        
+        resultado = df
+        if actualizaciones:
+            resultado = resultado.copy()
+            columnas = {col for valores in actualizaciones.values() for col in valores}
+            for col in columnas:
+                por_codigo = {c: v[col] for c, v in actualizaciones.items() if col in v}
+                nuevos_valores = codigos_base.map(por_codigo)
+                mask = codigos_base.isin(por_codigo.keys())
+                if col not in resultado.columns:
+                    resultado[col] = None
+                resultado[col] = resultado[col].astype(object)
+                resultado.loc[mask, col] = nuevos_valores[mask]
+        
+        if eliminados:
+            resultado = resultado[~codigos_base.isin(eliminados)]
+        
+        if nuevos:
+            df_nuevos = pd.DataFrame(list(nuevos.values()))
+            resultado = pd.concat([resultado, df_nuevos], ignore_index=True)
+        elif eliminados:
+            resultado = resultado.reset_index(drop=True)
+        
+        return resultado
+    
+    # ==================== CONCURRENCIA ====================
+    
+    def _leer_estado_disco(self) -> Optional[pd.DataFrame]:
+        """
+        Reconstruye la tabla desde el disco (snapshot + journal)
+        
+        Returns:
+            DataFrame con el estado actual o None si no existe snapshot ni journal
+        """
+        return self.leer_tabla_vigente(self.homologacion_path, self.columnas_actuales)
+    
+    @classmethod
+    def leer_tabla_vigente(cls, file_path: str, columnas: Optional[List[str]] = None) -> Optional[pd.DataFrame]:
+        """
+        Lee un archivo de homologación con los cambios pendientes del journal
+        
+        Los cambios del CRUD se registran en el journal y llegan al XLSX solo
+        al compactar: todo lector de la tabla (procesadores, vistas) debe usar
+        este método en lugar de ``pd.read_excel`` para ver los guardados
+        recientes.
+        
+        Args:
+            file_path: Ruta del snapshot XLSX
+            columnas: Columnas a conservar (None = todas las del archivo)
+        
+        Returns:
+            DataFrame con el estado actual o None si no existe snapshot ni journal
+        """
+        entradas = cls._leer_journal(cls._journal_path_de(file_path))
+        
+        if os.path.exists(file_path):
+            df = pd.read_excel(file_path)
+            
+            # Limpiar columnas
+            df.columns = df.columns.str.strip()
+            
+            # Mantener solo columnas relevantes para esta EPS
+            cols_existentes = [c for c in columnas or [] if c in df.columns]
+            if cols_existentes:
+                df = df[cols_existentes].copy()
+        elif entradas:
+            df = pd.DataFrame(columns=columnas or cls.COLUMNAS)
+        else:
+            return None
+        
+        # Aplicar cambios pendientes del journal sobre el snapshot
+        if entradas:
+            df = cls._aplicar_journal(df, entradas)
+            print(f"📝 {len(entradas)} cambios del journal aplicados")
+        
+        return df
+    
+    @classmethod
+    def firma_tabla(cls, file_path: str) -> str:
+        """
+        Firma combinada del snapshot XLSX y su journal de cambios
+        
+        Cambia con cada guardado del CRUD (aunque el XLSX no se reescriba);
+        sirve a quien guarde en caché la tabla leída con leer_tabla_vigente.
+        """
+        journal_path = cls._journal_path_de(file_path)
+        return f"{cls._get_file_signature(file_path)}|{cls._get_file_signature(journal_path)}"
+    
+    def _hay_cambios_externos(self) -> bool:
+        """True si el snapshot o el journal cambiaron desde la última lectura propia"""
+        if self._firma is None or not self.homologacion_path:
+            return False
+        return self._get_firma_tabla(self.homologacion_path) != self._firma
+    
+    def refrescar(self) -> bool:
+        """
+        Recarga la tabla si otro usuario la modificó desde la última lectura
+        
+        Returns:
+            True si se recargó
+        """
+        if not self._hay_cambios_externos():
+            return False
+        print(f"🔄 Homologación {self.eps} modificada por otro usuario, recargando...")
+        return self._cargar()
+    
+    def _fusionar_con_disco(self, cambios: List[Dict[str, Any]]) -> Tuple[pd.DataFrame, List[Dict[str, Any]]]:
+        """
+        Rebasa los cambios propios sobre la versión actual del disco
+        
+        Un cambio entra en conflicto cuando la fila que pretende modificar ya no
+        coincide con la que se leyó (``antes``). Los cambios que el otro usuario
+        ya dejó aplicados se descartan sin conflicto. Los conflictos quedan en
+        ``self.conflictos``.
+        
+        Returns:
+            Tupla (DataFrame del disco, cambios aplicables)
+        """
+        col_erp = 'Código Servicio de la ERP'
+        df_disco = self._leer_estado_disco()
+        if df_disco is None:
+            df_disco = pd.DataFrame(columns=self.columnas_actuales)
+        
+        filas: Dict[str, Dict[str, Any]] = {}
+        if col_erp in df_disco.columns:
+            codigos = df_disco[col_erp].astype(str).str.strip()
+            solo_propios = codigos.isin({str(c['codigo']).strip() for c in cambios})
+            for codigo, fila in zip(codigos[solo_propios], df_disco[solo_propios].to_dict('records'), strict=True):
+                filas.setdefault(codigo, self._fila_como_dict(pd.Series(fila)))
+        
+        aplicables = []
+        for cambio in cambios:
+            codigo = str(cambio['codigo']).strip()
+            actual = filas.get(codigo)
+            valores = cambio.get('valores') or {}
+            antes = cambio.get('antes')
+            motivo = None
+            
+            if cambio['op'] == 'agregar':
+                if actual is None:
+                    filas[codigo] = dict(valores)
+                    aplicables.append(cambio)
+                elif not self._mismos_valores(actual, valores):
+                    motivo = "otro usuario ya lo agregó con otros valores"
+            elif cambio['op'] == 'actualizar':
+                if actual is None:
+                    motivo = "otro usuario lo eliminó"
+                elif antes is None or self._mismos_valores(actual, antes):
+                    actual.update(valores)
+                    aplicables.append(cambio)
+                elif not self._mismos_valores(actual, valores):
+                    motivo = "otro usuario lo modificó"
+            elif cambio['op'] == 'eliminar':
+                if actual is not None:
+                    if antes is None or self._mismos_valores(actual, antes):
+                        del filas[codigo]
+                        aplicables.append(cambio)
+                    else:
+                        motivo = "otro usuario lo modificó"
+            
+            if motivo:
+                self.conflictos.append({'codigo': codigo, 'op': cambio['op'], 'motivo': motivo})
+        
+        return df_disco, aplicables
+    
+    @staticmethod
+    def _mismos_valores(fila: Dict[str, Any], esperado: Dict[str, Any]) -> bool:
+        """Compara como texto las columnas de ``esperado`` contra una fila"""
+        return all(
+            str(fila.get(col) or '').strip() == str(valor or '').strip()
+            for col, valor in esperado.items()
+        )
+    
+    @classmethod
+    def _lock_path_de(cls, file_path: str) -> str:
+        """Ruta del lock de escritura asociado a un archivo de homologación"""
+        return os.path.splitext(file_path)[0] + cls.LOCK_SUFIJO
+    
+    @contextmanager
+    def _bloqueo_escritura(self):
+        """
+        Toma el lock de escritura del archivo mientras dura el bloque
+        
+        Yields:
+            True si se obtuvo el lock dentro del tiempo de espera
+        """
+        lock_path = self._lock_path_de(self.homologacion_path)
+        token = self._adquirir_lock(lock_path)
+        
+        # Renovar el lease mientras dure el bloque (compactaciones largas)
+        detener = threading.Event()
+        renovador = None
+        if token:
+            renovador = threading.Thread(target=self._renovar_lock, args=(lock_path, token, detener), daemon=True)
+            renovador.start()
+        try:
+            yield token is not None
+        finally:
+            if token:
+                detener.set()
+                renovador.join()
+                self._liberar_lock(lock_path, token)
+    
+    def _adquirir_lock(self, lock_path: str) -> Optional[str]:
+        """
+        Crea el lock file de forma atómica (O_EXCL)
+        
+        Un lock sin renovar por más de ``LOCK_LEASE_SEGUNDOS`` se considera
+        abandonado (proceso cerrado a la fuerza) y se reemplaza
+        (ver ``_romper_lock_vencido``).
+        
+        Returns:
+            Token del dueño o None si otro usuario lo mantiene ocupado
+        """
+        usuario = os.environ.get('USERNAME') or os.environ.get('USER') or 'desconocido'
+        token = f"{usuario}@{platform.node()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        limite = time.monotonic() + self.LOCK_ESPERA_SEGUNDOS
+        
+        while True:
+            try:
+                fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                dueno = self._dueno_lock(lock_path)
+                if self._lock_vencido(lock_path) and self._romper_lock_vencido(lock_path, dueno):
+                    print(f"⚠️ Lock vencido en {os.path.basename(lock_path)}, se reemplaza")
+                    continue
+                if time.monotonic() >= limite:
+                    return None
+                time.sleep(0.2)
+                continue
+            
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(self._contenido_lock(token), f)
+            return token
+    
+    def _romper_lock_vencido(self, lock_path: str, dueno: Optional[str]) -> bool:
+        """
+        Aparta el lock vencido de ``dueno`` sin llevarse el lock de otro usuario
+        
+        Dos usuarios esperando el mismo lock vencido lo ven vencido a la vez;
+        un ``os.remove`` del segundo borraría el lock nuevo que acaba de crear
+        el primero y ambos creerían tenerlo. Por eso el lock se mueve con
+        ``os.replace`` (atómico) a un nombre único y se revisa lo que se
+        movió: solo se descarta si sigue siendo el lock vencido de ``dueno``;
+        si no, se devuelve a su lugar sin pisar un lock más nuevo.
+        
+        Returns:
+            True si se apartó el lock vencido y se puede reintentar O_EXCL
+        """
+        if self._dueno_lock(lock_path) != dueno:
+            return False
+        apartado = f"{lock_path}.stale.{uuid.uuid4().hex[:8]}"
+        try:
+            os.replace(lock_path, apartado)
+        except OSError:
+            return False  # Otro usuario ya lo apartó
+        
+        vencido = self._dueno_lock(apartado) == dueno and self._lock_vencido(apartado)
+        if not vencido:
+            try:
+                os.link(apartado, lock_path)  # Falla si ya existe un lock más nuevo
+            except OSError:
+                pass
+        try:
+            os.remove(apartado)
+        except OSError:
+            pass
+        return vencido
+    
+    @staticmethod
+    def _contenido_lock(token: str) -> Dict[str, Any]:
+        """Dueño del lock y momento de la última renovación (reloj del dueño)"""
+        return {'owner': token, 'ts': datetime.now().isoformat(timespec='milliseconds')}
+    
+    def _renovar_lock(self, lock_path: str, token: str, detener: threading.Event):
+        """
+        Reescribe el ts del lock cada ``LOCK_RENOVACION_SEGUNDOS`` mientras sea nuestro
+        
+        Se escribe en un temporal y se reemplaza para que otro usuario nunca
+        lea el lock a medio escribir. Si el reemplazo falla (el lock está
+        abierto en otro equipo) se reintenta en la siguiente vuelta.
+        """
+        while not detener.wait(self.LOCK_RENOVACION_SEGUNDOS):
+            if self._dueno_lock(lock_path) != token:
+                return
+            temporal = f"{lock_path}.{uuid.uuid4().hex[:8]}.tmp"
+            try:
+                with open(temporal, 'w', encoding='utf-8') as f:
+                    json.dump(self._contenido_lock(token), f)
+                os.replace(temporal, lock_path)
+            except OSError:
+                try:
+                    os.remove(temporal)
+                except OSError:
+                    pass
+    
+    @staticmethod
+    def _dueno_lock(lock_path: str) -> Optional[str]:
+        """Token del dueño del lock o None si no existe o no se puede leer"""
+        try:
+            with open(lock_path, encoding='utf-8') as f:
+                return json.load(f).get('owner')
+        except (OSError, ValueError, AttributeError):
+            return None
+    
+    def _lock_vencido(self, lock_path: str) -> bool:
+        """
+        True si el lock superó su lease
+        
+        La antigüedad se mide desde el ``ts`` que escribe y renueva el dueño,
+        no desde el mtime del archivo (en el recurso compartido el mtime lo
+        pone el reloj del servidor). Se asume que los equipos tienen la hora
+        sincronizada (NTP del dominio) con un desfase muy inferior a
+        ``LOCK_LEASE_SEGUNDOS``. Solo si el lock no tiene ``ts`` legible
+        (escritura interrumpida, versiones anteriores) se usa el mtime.
+        """
+        try:
+            with open(lock_path, encoding='utf-8') as f:
+                renovado = datetime.fromisoformat(json.load(f)['ts']).timestamp()
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            try:
+                renovado = os.path.getmtime(lock_path)
+            except OSError:
+                return False
+        return time.time() - renovado > self.LOCK_LEASE_SEGUNDOS
+    
+    @classmethod
+    def _liberar_lock(cls, lock_path: str, token: str):
+        """Elimina el lock solo si sigue siendo nuestro (no fue reemplazado por vencido)"""
+        if cls._dueno_lock(lock_path) == token:
+            try:
+                os.remove(lock_path)
+            except OSError:
+                pass
+    
     # ==================== CRUD ====================
     
-    def listar(self, filtro=None, limite=100):
+    def listar(self, filtro=None, limite=100, desde=0):
         """
         Lista códigos de homologación
         
         Args:
             filtro: Texto para filtrar (busca en todas las columnas)
             limite: Máximo de registros a retornar
+            desde: Posición inicial dentro de los resultados (paginación)
             
         Returns:
-            DataFrame con los registros
+            DataFrame con los registros (el total queda en total_coincidencias)
         """
         if self.df is None or self.df.empty:
+            self.total_coincidencias = 0
             return pd.DataFrame(columns=self.columnas_actuales)
         
-        df_resultado = self.df.copy()
-        
         if filtro:
-            filtro = str(filtro).lower()
-            mask = df_resultado.apply(
-                lambda row: any(filtro in str(v).lower() for v in row), axis=1
-            )
-            df_resultado = df_resultado[mask]
+            posiciones = self._filtrar_posiciones(str(filtro).lower())
+        else:
+            posiciones = np.arange(len(self.df))
+        
+        self.total_coincidencias = len(posiciones)
+        return self.df.iloc[posiciones[desde:desde + limite]].copy()
+    
+    def _get_texto_busqueda(self) -> pd.Series:
+        """
+        Columna de búsqueda: valores de cada fila en minúscula unidos por un
+        separador, construida una vez por versión de la tabla
+        """
+        version = self._version_tabla()
+        if self._texto_busqueda is None or self._texto_busqueda[0] != version:
+            texto = pd.Series('', index=self.df.index, dtype=object)
+            for i, col in enumerate(self.df.columns):
+                valores = self.df[col].map(str).str.lower()
+                texto = valores if i == 0 else texto + self._SEPARADOR_BUSQUEDA + valores
+            self._texto_busqueda = (version, texto.reset_index(drop=True))
+        return self._texto_busqueda[1]
+    
+    def _filtrar_posiciones(self, filtro: str) -> np.ndarray:
+        """
+        Posiciones de las filas que contienen el filtro en alguna columna
+        
+        Si el filtro extiende al anterior (el usuario sigue escribiendo), solo
+        se revisan las filas que ya coincidían.
+        """
+        texto = self._get_texto_busqueda()
+        version = self._version_tabla()
+        
+        previo = self._ultimo_filtro
+        if previo and previo[0] == version and previo[1] in filtro:
+            candidatas = previo[2]
+            coincide = texto.iloc[candidatas].str.contains(filtro, regex=False).to_numpy()
+            posiciones = candidatas[coincide]
+        else:
+            posiciones = texto.str.contains(filtro, regex=False).to_numpy().nonzero()[0]
         
-        return df_resultado.head(limite)
+        self._ultimo_filtro = (version, filtro, posiciones)
+        return posiciones
     
     def buscar_por_codigo_erp(self, codigo_erp):
         """
@@ -286,29 +972,25 @@ class HomologacionService:
         if self.df is None or self.df.empty:
             return None
         
-        cache_key = f"{self.eps}_search"
         codigo_str = str(codigo_erp).strip()
+        cache = self._get_search_cache()
         
         # Verificar caché de búsqueda
-        if cache_key in self._search_cache:
-            search_cache = self._search_cache[cache_key]
-            if codigo_str in search_cache:
-                cached_result = search_cache[codigo_str]
-                if not cached_result.empty:
-                    return cached_result.iloc[0]
-                return None
-        else:
-            # Inicializar caché de búsqueda para esta EPS
-            self._search_cache[cache_key] = {}
+        if codigo_str in cache['filas']:
+            cache['filas'].move_to_end(codigo_str)
+            return self._fila_desde_cache(cache, cache['filas'][codigo_str])
         
         # Búsqueda en DataFrame
-        mask = self.df['Código Servicio de la ERP'].astype(str).str.strip() == codigo_str
-        resultado = self.df[mask]
+        posiciones = (self._codigos_normalizados() == codigo_str).to_numpy().nonzero()[0]
+        fila = None
+        if len(posiciones):
+            pos = posiciones[0]
+            fila = (self.df.index[pos], tuple(self.df.iloc[pos]))
         
-        # Guardar en caché de búsqueda
-        self._search_cache[cache_key][codigo_str] = resultado.copy()
+        # Guardar en caché de búsqueda (tupla liviana, no una copia del DataFrame)
+        self._guardar_en_search_cache(cache, codigo_str, fila)
         
-        return resultado.iloc[0] if not resultado.empty else None
+        return self._fila_desde_cache(cache, fila)
     
     def buscar_por_codigo_erp_lote(self, codigos_erp: list) -> Dict[str, Any]:
         """
@@ -323,41 +1005,32 @@ class HomologacionService:
         if self.df is None or self.df.empty:
             return {}
         
-        cache_key = f"{self.eps}_search"
+        cache = self._get_search_cache()
         resultados = {}
         codigos_a_buscar = []
         
         # Verificar caché primero
-        if cache_key in self._search_cache:
-            search_cache = self._search_cache[cache_key]
-            for codigo in codigos_erp:
-                codigo_str = str(codigo).strip()
-                if codigo_str in search_cache:
-                    cached_result = search_cache[codigo_str]
-                    resultados[codigo_str] = cached_result.iloc[0] if not cached_result.empty else None
-                else:
-                    codigos_a_buscar.append(codigo_str)
-        else:
-            # Inicializar caché
-            self._search_cache[cache_key] = {}
-            codigos_a_buscar = [str(c).strip() for c in codigos_erp]
+        for codigo in codigos_erp:
+            codigo_str = str(codigo).strip()
+            if codigo_str in cache['filas']:
+                cache['filas'].move_to_end(codigo_str)
+                resultados[codigo_str] = self._fila_desde_cache(cache, cache['filas'][codigo_str])
+            else:
+                codigos_a_buscar.append(codigo_str)
         
-        # Buscar códigos no cacheados
+        # Buscar códigos no cacheados en una sola pasada (primera aparición de cada uno)
         if codigos_a_buscar:
-            df_codigos = self.df['Código Servicio de la ERP'].astype(str).str.strip()
+            codigos = self._codigos_normalizados().reset_index(drop=True)
+            encontrados = codigos[codigos.isin(set(codigos_a_buscar))].drop_duplicates()
+            primera = dict(zip(encontrados, encontrados.index, strict=True))
+            
             for codigo_str in codigos_a_buscar:
-                mask = df_codigos == codigo_str
-                resultado = self.df[mask]
-                
-                # Guardar en caché
-                self._search_cache[cache_key][codigo_str] = resultado.copy()
-                resultados[codigo_str] = resultado.iloc[0] if not resultado.empty else None
+                pos = primera.get(codigo_str)
+                fila = None if pos is None else (self.df.index[pos], tuple(self.df.iloc[pos]))
+                self._guardar_en_search_cache(cache, codigo_str, fila)
+                resultados[codigo_str] = self._fila_desde_cache(cache, fila)
         
         return resultados
-        
-        if not resultado.empty:
-            return resultado.iloc[0]
-        return None
     
     def agregar(self, codigo_erp, codigo_dgh, cod_serv_fact=None):
         """
@@ -371,6 +1044,7 @@ class HomologacionService:
         Returns:
             True si se agregó correctamente
         """
+        self.conflictos = []
         try:
             # Validar que no exista
             if self.buscar_por_codigo_erp(codigo_erp) is not None:
@@ -393,10 +1067,8 @@ class HomologacionService:
             
             self.df = pd.concat([self.df, nuevo], ignore_index=True)
             
-            # Limpiar caché de búsqueda después de modificar datos
-            self._clear_search_cache(f"{self.eps}_homologacion")
-            
-            if self._guardar():
+            cambio = self._nueva_entrada('agregar', nuevo_registro['Código Servicio de la ERP'], nuevo_registro)
+            if self._guardar([cambio]):
                 print(f"✅ Código agregado: {codigo_erp} → {codigo_dgh}")
                 return True
             return False
@@ -417,28 +1089,33 @@ class HomologacionService:
         Returns:
             True si se actualizó correctamente
         """
+        self.conflictos = []
         try:
             if self.df is None:
                 print("❌ No hay datos cargados")
                 return False
             
             codigo_str = str(codigo_erp).strip()
-            mask = self.df['Código Servicio de la ERP'].astype(str).str.strip() == codigo_str
+            mask = self._codigos_normalizados() == codigo_str
             
             if not mask.any():
                 print(f"⚠️ Código {codigo_erp} no encontrado")
                 return False
             
+            antes = self._fila_como_dict(self.df[mask].iloc[0])
+            valores = {}
             if codigo_dgh:
-                self.df.loc[mask, 'Código producto en DGH'] = str(codigo_dgh).strip()
+                valores['Código producto en DGH'] = str(codigo_dgh).strip()
             # Solo actualizar COD_SERV_FACT si la EPS lo tiene (Mutualser)
             if cod_serv_fact and 'COD_SERV_FACT' in self.columnas_actuales:
-                self.df.loc[mask, 'COD_SERV_FACT'] = str(cod_serv_fact).strip()
+                valores['COD_SERV_FACT'] = str(cod_serv_fact).strip()
             
-            # Limpiar caché de búsqueda después de actualizar
-            self._clear_search_cache(f"{self.eps}_homologacion")
+            for col, valor in valores.items():
+                self.df.loc[mask, col] = valor
+            self._marcar_modificado()
             
-            if self._guardar():
+            cambio = self._nueva_entrada('actualizar', codigo_str, valores, antes)
+            if self._guardar([cambio]):
                 print(f"✅ Código actualizado: {codigo_erp}")
                 return True
             return False
@@ -457,24 +1134,24 @@ class HomologacionService:
         Returns:
             True si se eliminó correctamente
         """
+        self.conflictos = []
         try:
             if self.df is None:
                 print("❌ No hay datos cargados")
                 return False
             
             codigo_str = str(codigo_erp).strip()
-            mask = self.df['Código Servicio de la ERP'].astype(str).str.strip() == codigo_str
+            mask = self._codigos_normalizados() == codigo_str
             
             if not mask.any():
                 print(f"⚠️ Código {codigo_erp} no encontrado")
                 return False
             
+            antes = self._fila_como_dict(self.df[mask].iloc[0])
             self.df = self.df[~mask].copy()
             
-            # Limpiar caché de búsqueda después de eliminar
-            self._clear_search_cache(f"{self.eps}_homologacion")
-            
-            if self._guardar():
+            cambio = self._nueva_entrada('eliminar', codigo_str, antes=antes)
+            if self._guardar([cambio]):
                 print(f"✅ Código eliminado: {codigo_erp}")
                 return True
             return False
@@ -493,33 +1170,131 @@ class HomologacionService:
         Returns:
             Cantidad de códigos agregados exitosamente
         """
-        agregados = 0
+        registros = []
         for codigo in codigos:
             if len(codigo) == 2:
                 codigo_erp, codigo_dgh = codigo
                 cod_serv_fact = codigo_dgh
             else:
                 codigo_erp, codigo_dgh, cod_serv_fact = codigo
+            registros.append({
+                'Código Servicio de la ERP': codigo_erp,
+                'Código producto en DGH': codigo_dgh,
+                'COD_SERV_FACT': cod_serv_fact
+            })
+        
+        if not registros:
+            return 0
+        
+        resultado = self.upsert_masivo(pd.DataFrame(registros))
+        return resultado['agregados']
+    
+    def upsert_masivo(self, df_nuevos: pd.DataFrame, sobrescribir: bool = False) -> Dict[str, Any]:
+        """
+        Agrega (o actualiza) un lote completo de códigos en una sola operación
+        
+        Valida, elimina duplicados y cruza el lote contra la tabla existente con
+        operaciones de conjunto/índice, y persiste una única vez.
+        
+        Args:
+            df_nuevos: DataFrame con 'Código Servicio de la ERP', 'Código producto en DGH'
+                y opcionalmente 'COD_SERV_FACT' (por defecto igual al código DGH)
+            sobrescribir: Si True, los códigos existentes se actualizan; si False se omiten
             
-            # Validar que no exista
-            if self.buscar_por_codigo_erp(codigo_erp) is None:
-                # Crear registro según columnas de la EPS
-                nuevo_registro = {
-                    'Código Servicio de la ERP': str(codigo_erp).strip(),
-                    'Código producto en DGH': str(codigo_dgh).strip()
-                }
-                # Solo agregar COD_SERV_FACT si la EPS lo requiere
-                if 'COD_SERV_FACT' in self.columnas_actuales:
-                    nuevo_registro['COD_SERV_FACT'] = str(cod_serv_fact).strip()
-                
-                nuevo = pd.DataFrame([nuevo_registro])
-                self.df = pd.concat([self.df, nuevo], ignore_index=True)
-                agregados += 1
+        Returns:
+            Dict con cantidades 'agregados', 'actualizados', 'omitidos' y lista de 'errores'
+        """
+        resultado: Dict[str, Any] = {'agregados': 0, 'actualizados': 0, 'omitidos': 0, 'errores': []}
+        col_erp = 'Código Servicio de la ERP'
+        col_dgh = 'Código producto en DGH'
         
-        if agregados > 0 and self._guardar():
-            print(f"✅ {agregados} códigos agregados")
+        if df_nuevos is None or df_nuevos.empty:
+            return resultado
+        
+        if self.df is None:
+            self.df = pd.DataFrame(columns=self.columnas_actuales)
         
-        return agregados
+        try:
+            lote = pd.DataFrame({
+                col_erp: self._normalizar_texto(df_nuevos[col_erp]),
+                col_dgh: self._normalizar_texto(df_nuevos[col_dgh]),
+            })
+            if 'COD_SERV_FACT' in self.columnas_actuales:
+                if 'COD_SERV_FACT' in df_nuevos.columns:
+                    serv_fact = self._normalizar_texto(df_nuevos['COD_SERV_FACT'])
+                    lote['COD_SERV_FACT'] = serv_fact.where(serv_fact != '', lote[col_dgh])
+                else:
+                    lote['COD_SERV_FACT'] = lote[col_dgh]
+            
+            # Validar y eliminar duplicados dentro del lote
+            validos = (lote[col_erp] != '') & (lote[col_dgh] != '')
+            if not validos.all():
+                resultado['errores'].append(f"{int((~validos).sum())} registros sin código ERP o DGH")
+            lote = lote[validos].drop_duplicates(subset=col_erp, keep='first')
+            
+            # Cruzar contra la tabla existente
+            codigos_tabla = self.df[col_erp].astype(str).str.strip() if col_erp in self.df.columns else pd.Series(dtype=str)
+            existe = lote[col_erp].isin(set(codigos_tabla))
+            df_agregar = lote[~existe]
+            df_existentes = lote[existe]
+            
+            cambios = [
+                self._nueva_entrada('agregar', r[col_erp], r)
+                for r in df_agregar.to_dict('records')
+            ]
+            
+            if sobrescribir and not df_existentes.empty:
+                columnas_valor = [c for c in df_existentes.columns if c != col_erp]
+                por_codigo = df_existentes.set_index(col_erp)
+                mask = codigos_tabla.isin(por_codigo.index)
+                self.df = self.df.copy()
+                for col in columnas_valor:
+                    if col not in self.df.columns:
+                        self.df[col] = None
+                    self.df[col] = self.df[col].astype(object)
+                    self.df.loc[mask, col] = codigos_tabla[mask].map(por_codigo[col])
+                cambios.extend(
+                    self._nueva_entrada('actualizar', codigo, valores)
+                    for codigo, valores in por_codigo.to_dict('index').items()
+                )
+                resultado['actualizados'] = len(df_existentes)
+            else:
+                resultado['omitidos'] = len(df_existentes)
+            
+            if not df_agregar.empty:
+                self.df = pd.concat([self.df, df_agregar], ignore_index=True)
+            
+            if not cambios:
+                return resultado
+            
+            self._marcar_modificado()
+            
+            if self._guardar(cambios):
+                resultado['agregados'] = len(df_agregar)
+                print(f"✅ {resultado['agregados']} códigos agregados, {resultado['actualizados']} actualizados")
+            elif self.conflictos:
+                # Guardado parcial: los cambios sin conflicto sí quedaron persistidos
+                rechazados = {(c['op'], c['codigo']) for c in self.conflictos}
+                resultado['agregados'] = sum(1 for c in df_agregar[col_erp] if ('agregar', c) not in rechazados)
+                if resultado['actualizados']:
+                    resultado['actualizados'] -= sum(1 for op, _ in rechazados if op == 'actualizar')
+                resultado['errores'].extend(
+                    f"Código {c['codigo']}: {c['motivo']}" for c in self.conflictos
+                )
+            else:
+                resultado['actualizados'] = 0
+                resultado['errores'].append("Error al guardar el archivo")
+        
+        except Exception as e:
+            resultado['errores'].append(f"Error en carga masiva: {str(e)}")
+        
+        return resultado
+    
+    @staticmethod
+    def _normalizar_texto(serie: pd.Series) -> pd.Series:
+        """Convierte una columna a texto sin espacios; vacíos, NaN y 'nan' quedan como ''"""
+        texto = serie.where(serie.notna(), '').astype(str).str.strip()
+        return texto.where(texto.str.lower() != 'nan', '')
     
     def obtener_no_homologados(self, codigos_tecnologia):
         """
@@ -600,7 +1375,7 @@ class HomologacionService:
         
         df_export = pd.DataFrame(export_data)
         
-        df_export.to_excel(output_path, index=False)
+        excel_writer.escribir_excel(output_path, df_export)
         print(f"✅ Exportado: {output_path} ({len(codigos)} códigos pendientes)")
         return output_path
 
@@ -659,43 +1434,48 @@ class HomologacionService:
                     .dropna().astype(str).str.strip().tolist()
                 )
             
-            # Rastrear códigos en la carga para detectar duplicados internos
-            codigos_en_carga = {}
+            carga = pd.DataFrame({
+                'codigo': self._normalizar_texto(df_carga[col_eps]).to_numpy(),
+                'homologo': self._normalizar_texto(df_carga[col_homologo]).to_numpy(),
+                'fila': df_carga.index.to_numpy() + 2
+            })
             
-            for idx, row in df_carga.iterrows():
-                codigo_eps = str(row[col_eps]).strip() if pd.notna(row[col_eps]) else ''
-                codigo_homologo = str(row[col_homologo]).strip() if pd.notna(row[col_homologo]) else ''
-                
-                # Validar que no estén vacíos
-                if not codigo_eps or codigo_eps.lower() == 'nan':
-                    resultado['errores'].append(f"Fila {idx + 2}: Código EPS vacío")
-                    continue
-                if not codigo_homologo or codigo_homologo.lower() == 'nan':
-                    resultado['errores'].append(f"Fila {idx + 2}: Código homólogo vacío para {codigo_eps}")
-                    continue
-                
-                # Verificar si ya existe en el archivo
-                if codigo_eps in codigos_existentes:
-                    resultado['duplicados_archivo'].append({
-                        'codigo': codigo_eps,
-                        'homologo_nuevo': codigo_homologo,
-                        'fila': idx + 2
-                    })
-                    continue
-                
-                # Verificar si está duplicado en la misma carga
-                if codigo_eps in codigos_en_carga:
-                    resultado['duplicados_carga'].append({
-                        'codigo': codigo_eps,
-                        'homologo': codigo_homologo,
-                        'fila_original': codigos_en_carga[codigo_eps]['fila'],
-                        'fila_duplicada': idx + 2
-                    })
-                    continue
-                
-                # Es válido
-                codigos_en_carga[codigo_eps] = {'homologo': codigo_homologo, 'fila': idx + 2}
-                resultado['validos'].append((codigo_eps, codigo_homologo))
+            # Validar que no estén vacíos (un mensaje por fila, en orden)
+            sin_eps = carga['codigo'] == ''
+            sin_homologo = ~sin_eps & (carga['homologo'] == '')
+            mensajes = pd.Series('', index=carga.index)
+            mensajes[sin_eps] = 'Fila ' + carga.loc[sin_eps, 'fila'].astype(str) + ': Código EPS vacío'
+            mensajes[sin_homologo] = (
+                'Fila ' + carga.loc[sin_homologo, 'fila'].astype(str)
+                + ': Código homólogo vacío para ' + carga.loc[sin_homologo, 'codigo']
+            )
+            resultado['errores'].extend(mensajes[sin_eps | sin_homologo].tolist())
+            carga = carga[~(sin_eps | sin_homologo)]
+            
+            # Verificar si ya existen en el archivo
+            en_archivo = carga['codigo'].isin(codigos_existentes)
+            resultado['duplicados_archivo'] = [
+                {'codigo': r['codigo'], 'homologo_nuevo': r['homologo'], 'fila': int(r['fila'])}
+                for r in carga[en_archivo].to_dict('records')
+            ]
+            carga = carga[~en_archivo]
+            
+            # Verificar duplicados dentro de la misma carga
+            repetido = carga['codigo'].duplicated(keep='first')
+            primera_fila = carga[~repetido].set_index('codigo')['fila']
+            resultado['duplicados_carga'] = [
+                {
+                    'codigo': r['codigo'],
+                    'homologo': r['homologo'],
+                    'fila_original': int(primera_fila[r['codigo']]),
+                    'fila_duplicada': int(r['fila'])
+                }
+                for r in carga[repetido].to_dict('records')
+            ]
+            
+            # Válidos: primera aparición de cada código nuevo
+            validos = carga[~repetido]
+            resultado['validos'] = list(zip(validos['codigo'], validos['homologo'], strict=True))
             
         except Exception as e:
             resultado['errores'].append(f"Error procesando archivo: {str(e)}")
@@ -712,34 +1492,13 @@ class HomologacionService:
         Returns:
             Dict con cantidad agregada y errores
         """
-        agregados = 0
-        errores = []
+        if not codigos_validos:
+            return {'agregados': 0, 'errores': []}
         
-        try:
-            nuevos_registros = []
-            for codigo_eps, codigo_homologo in codigos_validos:
-                # Crear registro según columnas de la EPS
-                nuevo_registro = {
-                    'Código Servicio de la ERP': str(codigo_eps).strip(),
-                    'Código producto en DGH': str(codigo_homologo).strip()
-                }
-                # Solo agregar COD_SERV_FACT si la EPS lo requiere (Mutualser)
-                if 'COD_SERV_FACT' in self.columnas_actuales:
-                    nuevo_registro['COD_SERV_FACT'] = str(codigo_homologo).strip()  # Mismo valor por defecto
-                
-                nuevos_registros.append(nuevo_registro)
-            
-            if nuevos_registros:
-                df_nuevos = pd.DataFrame(nuevos_registros)
-                self.df = pd.concat([self.df, df_nuevos], ignore_index=True)
-                
-                if self._guardar():
-                    agregados = len(nuevos_registros)
-                    print(f"✅ {agregados} códigos agregados masivamente")
-                else:
-                    errores.append("Error al guardar el archivo")
-        
-        except Exception as e:
-            errores.append(f"Error en carga masiva: {str(e)}")
-        
-        return {'agregados': agregados, 'errores': errores}
+        # COD_SERV_FACT toma el mismo valor del homólogo por defecto (Mutualser)
+        df_nuevos = pd.DataFrame(
+            list(codigos_validos),
+            columns=['Código Servicio de la ERP', 'Código producto en DGH']
+        )
+        resultado = self.upsert_masivo(df_nuevos)
+        return {'agregados': resultado['agregados'], 'errores': resultado['errores']}
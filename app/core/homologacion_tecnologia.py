@@ -0,0 +1,127 @@
+"""
+Homologación de tecnologías contra el archivo de homologación (reglas MUTUALSER)
+
+FLUJO DE HOMOLOGACIÓN:
+1. Buscar el código en "Código Servicio de la ERP" (exacto y, si no, por dígitos)
+2. De la primera fila encontrada, tomar "Código producto en DGH"
+3. Validarlo contra TODA la columna "COD_SERV_FACT" (exacto y, si no, por dígitos)
+4. Si existe → devolverlo, si no → dejar en blanco
+
+Compartido por MutualserProcessor y HomologadorObservacion. Los índices se
+arman una vez por archivo de homologación y cada código distinto de un lote
+se resuelve una sola vez.
+"""
+from typing import Any, Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+COL_ERP = 'Código Servicio de la ERP'
+COL_PRODUCTO = 'Código producto en DGH'
+COL_COD_SERV_FACT = 'COD_SERV_FACT'
+
+
+def _solo_digitos(texto: str) -> str:
+    return ''.join(filter(str.isdigit, texto))
+
+
+class IndiceHomologacion:
+    """Índices de búsqueda ERP → producto DGH → COD_SERV_FACT"""
+
+    def __init__(self, df_homologacion: Optional[pd.DataFrame], cod_serv_fact: Optional[Iterable[str]]):
+        """
+        Args:
+            df_homologacion: Archivo de homologación (None si no se pudo cargar)
+            cod_serv_fact: Valores válidos de COD_SERV_FACT
+        """
+        self.df_homologacion = df_homologacion
+        self._por_codigo: Dict[str, Any] = {}
+        self._por_digitos: Dict[str, Any] = {}
+        self._cod_serv_fact = set()
+        self._cod_por_digitos: Dict[str, str] = {}
+
+        self.disponible = df_homologacion is not None and all(
+            col in df_homologacion.columns for col in (COL_ERP, COL_PRODUCTO, COL_COD_SERV_FACT)
+        )
+        if not self.disponible:
+            return
+
+        # Producto DGH de la primera fila por código ERP (exacto y solo dígitos)
+        texto_erp = df_homologacion[COL_ERP].astype(str)
+        productos = df_homologacion[COL_PRODUCTO].to_numpy(dtype=object)
+
+        claves = texto_erp.str.strip()
+        primeras = ~claves.duplicated().to_numpy()
+        self._por_codigo = dict(zip(claves[primeras], productos[primeras], strict=True))
+
+        digitos = texto_erp.str.replace(r'\D', '', regex=True)
+        primeras = (~digitos.duplicated() & (digitos != '')).to_numpy()
+        self._por_digitos = dict(zip(digitos[primeras], productos[primeras], strict=True))
+
+        # Primer COD_SERV_FACT por parte numérica, en el orden de recorrido del conjunto
+        self._cod_serv_fact = cod_serv_fact if isinstance(cod_serv_fact, set) else set(cod_serv_fact or ())
+        for cod in self._cod_serv_fact:
+            self._cod_por_digitos.setdefault(_solo_digitos(cod), cod)
+        self._cod_por_digitos.pop('', None)
+
+    def buscar(self, codigo_tecnologia) -> str:
+        """Código homologado de una tecnología ('' si no se encuentra)"""
+        if not self.disponible or pd.isna(codigo_tecnologia):
+            return ''
+        return self._buscar_texto(str(codigo_tecnologia))
+
+    def _buscar_texto(self, texto: str) -> str:
+        codigo_str = texto.strip()
+        if not codigo_str or codigo_str == 'nan':
+            return ''
+
+        if codigo_str in self._por_codigo:
+            producto = self._por_codigo[codigo_str]
+        else:
+            codigo_numerico = _solo_digitos(codigo_str)
+            if not codigo_numerico or codigo_numerico not in self._por_digitos:
+                return ''
+            producto = self._por_digitos[codigo_numerico]
+
+        return self._validar_producto(producto)
+
+    def _validar_producto(self, producto) -> str:
+        """Producto DGH confirmado en COD_SERV_FACT ('' si no existe)"""
+        if pd.isna(producto):
+            return ''
+        cod_str = str(producto).strip()
+        if not cod_str or cod_str == '0' or cod_str == 'nan':
+            return ''
+        if cod_str in self._cod_serv_fact:
+            return cod_str
+
+        cod_numerico = _solo_digitos(cod_str)
+        return self._cod_por_digitos.get(cod_numerico, '') if cod_numerico else ''
+
+    def homologar(self, tecnologias: pd.Series) -> pd.Series:
+        """
+        Código homologado para cada fila de una columna de tecnologías
+
+        Returns:
+            Serie de texto con el mismo índice ('' para las no homologadas)
+        """
+        if not self.disponible or tecnologias.empty:
+            return pd.Series('', index=tecnologias.index, dtype=object)
+
+        texto = tecnologias.astype(object).map(str)
+        codigos, unicos = pd.factorize(texto)
+        resultados = np.array([self._buscar_texto(valor) for valor in unicos] + [''], dtype=object)
+        resultado = resultados[codigos]
+        resultado[tecnologias.isna().to_numpy()] = ''
+        return pd.Series(resultado, index=tecnologias.index)
+
+
+def tecnologias_no_homologadas(tecnologias: pd.Series, codigos_homologados: pd.Series) -> pd.Series:
+    """
+    Tecnología original en las filas sin código homologado, vacío en el resto
+
+    Returns:
+        Serie con el índice de ``tecnologias``
+    """
+    sin_codigo = codigos_homologados.isna() | (codigos_homologados.astype(object) == '')
+    return tecnologias.astype(object).where(sin_codigo & tecnologias.notna(), '')
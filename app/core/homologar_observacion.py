@@ -14,6 +14,9 @@ import pandas as pd
 import os
 from datetime import datetime
 
+from app.core.homologacion_service import HomologacionService
+from app.core.homologacion_tecnologia import IndiceHomologacion, tecnologias_no_homologadas
+
 
 class HomologadorObservacion:
     """Clase para homologar códigos del archivo de observación"""
@@ -29,6 +32,7 @@ class HomologadorObservacion:
         self.homologacion_path = homologacion_path or r"\\minerva\Cartera\GLOSAAP\HOMOLOGADOR\HOMOLOGADOR_MUTUALSER.xlsx"
         self.df_homologacion = None
         self.todos_cod_serv_fact = set()
+        self._indice = None
         
         # Cargar archivo de homologación
         self._cargar_homologacion()
@@ -40,8 +44,8 @@ class HomologadorObservacion:
                 print(f"⚠️ Archivo de homologación no encontrado: {self.homologacion_path}")
                 return
             
-            self.df_homologacion = pd.read_excel(self.homologacion_path)
-            self.df_homologacion.columns = self.df_homologacion.columns.str.strip()
+            # Snapshot + journal: incluye los guardados del CRUD aún no compactados
+            self.df_homologacion = HomologacionService.leer_tabla_vigente(self.homologacion_path)
             
             # Crear conjunto de todos los valores válidos en COD_SERV_FACT
             columna_cod_serv_fact = 'COD_SERV_FACT'
@@ -62,6 +66,12 @@ class HomologadorObservacion:
         except Exception as e:
             print(f"❌ Error al cargar archivo de homologación: {e}")
     
+    def _indice_homologacion(self):
+        """Índices de búsqueda del archivo de homologación cargado (se arman una vez)"""
+        if self._indice is None or self._indice.df_homologacion is not self.df_homologacion:
+            self._indice = IndiceHomologacion(self.df_homologacion, self.todos_cod_serv_fact)
+        return self._indice
+    
     def _buscar_codigo_homologado(self, codigo_tecnologia):
         """
         Busca el código homologado según las reglas de negocio
@@ -72,64 +82,7 @@ class HomologadorObservacion:
         3. Buscar ese valor en TODA la columna "COD_SERV_FACT"
         4. Si existe → devolverlo
         """
-        if self.df_homologacion is None or pd.isna(codigo_tecnologia):
-            return ''
-        
-        try:
-            # Convertir código a string y limpiar
-            codigo_str = str(codigo_tecnologia).strip()
-            
-            # Si está vacío, retornar vacío
-            if not codigo_str or codigo_str == 'nan':
-                return ''
-            
-            # Nombres de columnas
-            columna_erp = 'Código Servicio de la ERP'
-            columna_codigo_producto = 'Código producto en DGH'
-            columna_cod_serv_fact = 'COD_SERV_FACT'
-            
-            # Verificar que las columnas existen
-            for col in [columna_erp, columna_codigo_producto, columna_cod_serv_fact]:
-                if col not in self.df_homologacion.columns:
-                    return ''
-            
-            # Extraer solo dígitos del código para comparación flexible
-            codigo_numerico = ''.join(filter(str.isdigit, codigo_str))
-            
-            # PASO 1: Buscar en 'Código Servicio de la ERP'
-            mask = self.df_homologacion[columna_erp].astype(str).str.strip() == codigo_str
-            resultado = self.df_homologacion[mask]
-            
-            # Búsqueda flexible si no encuentra exacto
-            if resultado.empty and codigo_numerico:
-                mask = self.df_homologacion[columna_erp].astype(str).str.replace(r'\D', '', regex=True) == codigo_numerico
-                resultado = self.df_homologacion[mask]
-            
-            if not resultado.empty:
-                # PASO 2: Tomar el valor de 'Código producto en DGH'
-                codigo_producto_dgh = resultado.iloc[0][columna_codigo_producto]
-                
-                if pd.notna(codigo_producto_dgh):
-                    codigo_producto_str = str(codigo_producto_dgh).strip()
-                    
-                    if codigo_producto_str and codigo_producto_str != '0' and codigo_producto_str != 'nan':
-                        # PASO 3: Buscar en TODA la columna COD_SERV_FACT
-                        if codigo_producto_str in self.todos_cod_serv_fact:
-                            return codigo_producto_str
-                        
-                        # Búsqueda flexible por parte numérica
-                        codigo_producto_numerico = ''.join(filter(str.isdigit, codigo_producto_str))
-                        if codigo_producto_numerico:
-                            for cod in self.todos_cod_serv_fact:
-                                cod_numerico = ''.join(filter(str.isdigit, cod))
-                                if cod_numerico == codigo_producto_numerico:
-                                    return cod
-            
-            return ''
-            
-        except Exception as e:
-            print(f"   ⚠️ Error buscando código {codigo_tecnologia}: {e}")
-            return ''
+        return self._indice_homologacion().buscar(codigo_tecnologia)
     
     def homologar_archivo(self, archivo_entrada, archivo_salida=None):
         """
@@ -160,37 +113,17 @@ class HomologadorObservacion:
                 print("❌ Columna 'Tecnología' no encontrada")
                 return None
             
-            # Homologar cada código
+            # Homologar cada código distinto una sola vez
             print(f"\n🔄 Homologando códigos...")
-            codigos_homologados = []
-            tecnologias_no_homologadas = []
             total = len(df)
-            encontrados = 0
-            
-            for idx, row in df.iterrows():
-                tecnologia = row.get('Tecnología')
-                codigo_homologado = self._buscar_codigo_homologado(tecnologia)
-                codigos_homologados.append(codigo_homologado)
-                
-                if codigo_homologado:
-                    encontrados += 1
-                else:
-                    if pd.notna(tecnologia) and str(tecnologia).strip():
-                        tecnologias_no_homologadas.append(str(tecnologia).strip())
-                
-                # Mostrar progreso cada 10%
-                if (len(codigos_homologados)) % max(1, total // 10) == 0:
-                    porcentaje = (len(codigos_homologados) / total) * 100
-                    print(f"   Progreso: {porcentaje:.0f}% ({len(codigos_homologados)}/{total})")
+            codigos_homologados = self._indice_homologacion().homologar(df['Tecnología'])
+            encontrados = int((codigos_homologados != '').sum())
             
             # Actualizar columna de código homologado
             df['Codigo homologado DGH'] = codigos_homologados
             
             # Agregar columna de tecnologías NO homologadas
-            df['Tecnologia NO homologada'] = df.apply(
-                lambda row: row['Tecnología'] if (pd.isna(row['Codigo homologado DGH']) or row['Codigo homologado DGH'] == '') and pd.notna(row['Tecnología']) else '',
-                axis=1
-            )
+            df['Tecnologia NO homologada'] = tecnologias_no_homologadas(df['Tecnología'], df['Codigo homologado DGH'])
             
             # Generar archivo de salida
             if archivo_salida is None:
@@ -1,5 +1,6 @@
 import imaplib
 import email
+import email.message
 from email.header import decode_header
 import os
 import tempfile
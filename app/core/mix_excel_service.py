@@ -6,6 +6,8 @@ import pandas as pd
 from pathlib import Path
 from typing import Optional, List, Tuple, Dict
 
+from app.core import excel_writer
+
 
 class MixExcelService:
     """Servicio para mezclar/transferir datos entre archivos Excel"""
@@ -164,7 +166,7 @@ class MixExcelService:
             return False, "No hay archivo destino cargado"
         
         try:
-            self.dest_df.to_excel(self.dest_file, index=False)
+            excel_writer.escribir_excel(self.dest_file, self.dest_df)
             return True, f"Guardado en {Path(self.dest_file).name}"
         except PermissionError:
             return False, "El archivo está abierto. Ciérralo e intenta de nuevo."
@@ -3,9 +3,55 @@ Procesador específico para MUTUALSER
 Maneja la extracción, homologación y generación de archivos de objeciones
 """
 import pandas as pd
+import numpy as np
+from pandas.io.parsers import TextParser
 import os
+from concurrent.futures import ProcessPoolExecutor, BrokenExecutor, as_completed
 from datetime import datetime
-from typing import Optional
+from typing import Optional, Callable, List, Tuple, Dict, Any
+
+from app.core import excel_writer, objeciones
+from app.core.cache_resultados import CacheResultados
+from app.core.homologacion_service import HomologacionService
+from app.core.homologacion_tecnologia import IndiceHomologacion, tecnologias_no_homologadas
+
+
+# Tildes ignoradas al comparar nombres de columnas
+_SIN_TILDES = str.maketrans('óáéíú', 'oaeiu')
+
+
+def _tipo_texto_compacto():
+    """Dtype de texto respaldado por pyarrow (None si pyarrow no está instalado)"""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return None
+    try:
+        return pd.StringDtype('pyarrow', na_value=np.nan)
+    except TypeError:  # pandas < 2.3: solo existe la variante con pd.NA
+        return pd.StringDtype('pyarrow')
+
+
+_TIPO_TEXTO = _tipo_texto_compacto()
+
+# Procesador sin homologación reutilizado por cada proceso del pool
+_procesador_worker: Optional["MutualserProcessor"] = None
+
+
+def _procesar_archivo_worker(file_path: str) -> Tuple[Optional[pd.DataFrame], list]:
+    """
+    Procesa un archivo en un proceso del pool
+    
+    Debe vivir a nivel de módulo para poder enviarse a otro proceso (spawn en
+    Windows). Retorna el DataFrame extraído y los errores del archivo.
+    """
+    global _procesador_worker
+    if _procesador_worker is None:
+        _procesador_worker = MutualserProcessor(output_dir=os.getcwd(), cargar_homologacion=False)
+    
+    _procesador_worker.errores = []
+    df = _procesador_worker.procesar_archivo(file_path)
+    return df, _procesador_worker.errores
 
 
 class MutualserProcessor:
@@ -23,7 +69,30 @@ class MutualserProcessor:
     # Ruta de red para homologación
     HOMOLOGACION_PATH = r"\\MINERVA\Cartera\GLOSAAP\HOMOLOGADOR\mutualser_homologacion.xlsx"
     
-    def __init__(self, output_dir: str = 'outputs', homologacion_path: Optional[str] = None):
+    # Desde cuántos archivos conviene repartir la lectura en varios procesos
+    PARALELO_MIN_ARCHIVOS = 20
+    
+    # Filas revisadas por bloque al buscar el encabezado
+    ENCABEZADO_FILAS_BLOQUE = 50
+    
+    # Tipos del consolidado (ver _normalizar_tipos)
+    COLUMNAS_CATEGORICAS = ['Número de glosa', 'Concepto de glosa', 'Código de glosa']
+    COLUMNAS_NUMERICAS = ['Cantidad facturada', 'Valor Facturado', 'Cantidad glosada', 'Valor glosado']
+    COLUMNAS_FECHA = ['Fecha']
+    COLUMNAS_TEXTO = ['Número de factura', 'Tecnología', 'Observacion']
+    
+    # Una columna pasa a categoría si sus valores distintos no superan esta fracción de filas
+    MAX_PROPORCION_CATEGORIAS = 0.5
+    
+    # Versión del DataFrame extraído por archivo: cambiarla invalida la caché de resultados
+    VERSION_EXTRACCION = 1
+    
+    # Mapeo de columnas resuelto por firma de encabezados (compartido entre instancias)
+    _mapeos_por_encabezado: Dict[tuple, Dict[str, Any]] = {}
+    _MAX_MAPEOS = 256
+    
+    def __init__(self, output_dir: str = 'outputs', homologacion_path: Optional[str] = None,
+                 cargar_homologacion: bool = True, cache_dir: Optional[str] = None):
         self.output_dir = output_dir
         self.homologacion_path = homologacion_path or self.HOMOLOGACION_PATH
         self.df_consolidado: Optional[pd.DataFrame] = None
@@ -31,6 +100,16 @@ class MutualserProcessor:
         self.archivos_procesados: list = []
         self.errores: list = []
         self._todos_cod_serv_fact: Optional[set] = None
+        self._indice: Optional[IndiceHomologacion] = None
+        
+        # Alias normalizados de las columnas requeridas (se calculan una vez)
+        self._alias_columnas = [(col, self._normalizar_nombre(col)) for col in self.COLUMNAS_REQUERIDAS]
+        
+        # Caché de resultados por archivo (None = siempre parsear)
+        self.cache: Optional[CacheResultados] = None
+        if cache_dir:
+            version = f"mutualser-{self.VERSION_EXTRACCION}|{'|'.join(self.COLUMNAS_REQUERIDAS)}"
+            self.cache = CacheResultados(cache_dir, version)
         
         # Crear directorio si no existe (funciona con rutas de red)
         try:
@@ -38,7 +117,8 @@ class MutualserProcessor:
         except Exception as e:
             print(f"⚠️ No se pudo crear directorio {output_dir}: {e}")
         
-        self._cargar_homologacion()
+        if cargar_homologacion:
+            self._cargar_homologacion()
     
     # ==================== HOMOLOGACIÓN ====================
     
@@ -76,9 +156,19 @@ class MutualserProcessor:
                 self.df_homologacion = None
                 return
             
-            # Cargar archivo de homologación
-            self.df_homologacion = pd.read_excel(self.homologacion_path)
-            self.df_homologacion.columns = self.df_homologacion.columns.str.strip()
+            self._leer_homologacion()
+            
+        except Exception as e:
+            print(f"❌ Error cargando homologación: {e}")
+            self.df_homologacion = None
+    
+    def _leer_homologacion(self):
+        """Lee self.homologacion_path y prepara el conjunto de COD_SERV_FACT"""
+        try:
+            # Snapshot + journal: incluye los guardados del CRUD aún no compactados
+            self.df_homologacion = HomologacionService.leer_tabla_vigente(self.homologacion_path)
+            if self.df_homologacion is None:
+                raise FileNotFoundError(self.homologacion_path)
             
             print(f"📊 Columnas encontradas: {list(self.df_homologacion.columns)}")
             
@@ -100,6 +190,12 @@ class MutualserProcessor:
             print(f"❌ Error cargando homologación: {e}")
             self.df_homologacion = None
     
+    def _indice_homologacion(self) -> IndiceHomologacion:
+        """Índices de búsqueda del archivo de homologación cargado (se arman una vez)"""
+        if self._indice is None or self._indice.df_homologacion is not self.df_homologacion:
+            self._indice = IndiceHomologacion(self.df_homologacion, self._todos_cod_serv_fact)
+        return self._indice
+    
     def _buscar_codigo_homologado(self, codigo_tecnologia):
         """
         Busca código homologado:
@@ -107,56 +203,7 @@ class MutualserProcessor:
         2. Tomar 'Código producto en DGH' de esa fila
         3. Verificar si existe en COD_SERV_FACT
         """
-        if self.df_homologacion is None or pd.isna(codigo_tecnologia):
-            return ''
-        
-        try:
-            codigo_str = str(codigo_tecnologia).strip()
-            if not codigo_str or codigo_str == 'nan':
-                return ''
-            
-            col_erp = 'Código Servicio de la ERP'
-            col_producto = 'Código producto en DGH'
-            
-            # Verificar columnas
-            for col in [col_erp, col_producto, 'COD_SERV_FACT']:
-                if col not in self.df_homologacion.columns:
-                    return ''
-            
-            codigo_numerico = ''.join(filter(str.isdigit, codigo_str))
-            
-            # Buscar en Código Servicio de la ERP
-            mask = self.df_homologacion[col_erp].astype(str).str.strip() == codigo_str
-            resultado = self.df_homologacion[mask]
-            
-            if resultado.empty and codigo_numerico:
-                mask = self.df_homologacion[col_erp].astype(str).str.replace(r'\D', '', regex=True) == codigo_numerico
-                resultado = self.df_homologacion[mask]
-            
-            if not resultado.empty:
-                codigo_producto = resultado.iloc[0][col_producto]
-                
-                if pd.notna(codigo_producto):
-                    cod_str = str(codigo_producto).strip()
-                    
-                    if cod_str and cod_str != '0' and cod_str != 'nan':
-                        # Verificar si existe en COD_SERV_FACT
-                        if self._todos_cod_serv_fact and cod_str in self._todos_cod_serv_fact:
-                            return cod_str
-                        
-                        # Búsqueda flexible
-                        if self._todos_cod_serv_fact:
-                            cod_numerico = ''.join(filter(str.isdigit, cod_str))
-                            if cod_numerico:
-                                for cod in self._todos_cod_serv_fact:
-                                    if ''.join(filter(str.isdigit, cod)) == cod_numerico:
-                                        return cod
-            
-            return ''
-            
-        except Exception as e:
-            print(f"⚠️ Error homologando {codigo_tecnologia}: {e}")
-            return ''
+        return self._indice_homologacion().buscar(codigo_tecnologia)
     
     def _aplicar_homologacion(self):
         """Aplica homologación a todos los registros"""
@@ -169,21 +216,13 @@ class MutualserProcessor:
         
         print("\n🔄 Aplicando homologación...")
         
-        codigos = []
-        encontrados = 0
-        
-        for _, row in self.df_consolidado.iterrows(): # pyright: ignore[reportGeneralTypeIssues]
-            codigo = self._buscar_codigo_homologado(row.get('Tecnología'))
-            codigos.append(codigo)
-            if codigo:
-                encontrados += 1
+        tecnologias = self.df_consolidado['Tecnología']
+        codigos = self._indice_homologacion().homologar(tecnologias)
         
         self.df_consolidado['Codigo homologado DGH'] = codigos
-        self.df_consolidado['Tecnologia NO homologada'] = self.df_consolidado.apply(
-            lambda r: r['Tecnología'] if not r.get('Codigo homologado DGH') else '', axis=1
-        )
+        self.df_consolidado['Tecnologia NO homologada'] = tecnologias_no_homologadas(tecnologias, codigos)
         
-        print(f"✅ Homologados: {encontrados}/{len(self.df_consolidado)}")
+        print(f"✅ Homologados: {int((codigos != '').sum())}/{len(self.df_consolidado)}")
     
     # ==================== PROCESAMIENTO DE ARCHIVOS ====================
     
@@ -197,34 +236,16 @@ class MutualserProcessor:
             df_raw = pd.read_excel(file_path, header=None) if file_path.endswith(('.xlsx', '.xls')) else pd.read_csv(file_path, header=None)
             
             # Buscar fila de encabezados
-            header_row_idx: Optional[int] = None
-            fecha_documento: Optional[str] = None
-            
-            for idx, row in df_raw.iterrows():
-                # Convertir idx a int para evitar problemas de tipo
-                idx_int = int(idx) if isinstance(idx, (int, float)) else idx  # type: ignore
-                row_str = ' '.join([str(c) for c in row if pd.notna(c)]).upper()
-                
-                if 'FECHA' in row_str and fecha_documento is None:
-                    for cell in row:
-                        if pd.notna(cell) and ('/' in str(cell) or '-' in str(cell)):
-                            try:
-                                fecha_documento = pd.to_datetime(cell).strftime('%Y-%m-%d')
-                                break
-                            except:
-                                pass
-                
-                if 'NUMERO DE FACTURA' in row_str or 'NÚMERO DE FACTURA' in row_str:
-                    header_row_idx = idx_int  # type: ignore
-                    break
-                elif 'DETALLE DE GLOSA' in row_str:
-                    header_row_idx = idx_int + 1  # type: ignore
-                    break
+            header_row_idx, fecha_documento = self._detectar_encabezado(df_raw)
             
             if header_row_idx is None:
                 raise Exception("No se encontró tabla de detalles")
             
-            df = pd.read_excel(file_path, header=header_row_idx) if file_path.endswith(('.xlsx', '.xls')) else pd.read_csv(file_path, header=header_row_idx)
+            # Reusar la lectura cruda en lugar de volver a parsear el libro
+            if file_path.endswith(('.xlsx', '.xls')):
+                df = self._tabla_desde_crudo(df_raw, header_row_idx)
+            else:
+                df = pd.read_csv(file_path, header=header_row_idx)
             df.columns = df.columns.str.strip()
             
             # Mapear columnas (sin prints para velocidad)
@@ -245,6 +266,84 @@ class MutualserProcessor:
             # print(f"❌ Error: {file_path}: {e}")
             return None
     
+    def _detectar_encabezado(self, df_raw: pd.DataFrame) -> Tuple[Optional[int], Optional[str]]:
+        """
+        Ubica la fila de encabezados y la fecha del documento
+        
+        Revisa por bloques de ENCABEZADO_FILAS_BLOQUE filas: el texto de cada
+        fila se arma columna a columna para todo el bloque a la vez y solo se
+        recorren celda a celda las filas que mencionan 'FECHA'.
+        
+        Returns:
+            Tupla (índice de la fila de encabezados o None, fecha 'YYYY-MM-DD' o None)
+        """
+        fecha_documento: Optional[str] = None
+        
+        for inicio in range(0, len(df_raw), self.ENCABEZADO_FILAS_BLOQUE):
+            bloque = df_raw.iloc[inicio:inicio + self.ENCABEZADO_FILAS_BLOQUE]
+            texto = self._texto_filas(bloque)
+            
+            es_encabezado = texto.str.contains('NUMERO DE FACTURA|NÚMERO DE FACTURA', regex=True).to_numpy()
+            es_detalle = texto.str.contains('DETALLE DE GLOSA', regex=False).to_numpy()
+            marcadas = (es_encabezado | es_detalle).nonzero()[0]
+            fin = marcadas[0] + 1 if len(marcadas) else len(bloque)
+            
+            # La fecha se toma de la primera fila con 'FECHA' que tenga una fecha válida
+            if fecha_documento is None:
+                con_fecha = texto.iloc[:fin].str.contains('FECHA', regex=False).to_numpy().nonzero()[0]
+                for pos in con_fecha:
+                    fecha_documento = self._extraer_fecha(bloque.iloc[pos])
+                    if fecha_documento is not None:
+                        break
+            
+            if len(marcadas):
+                pos = marcadas[0]
+                return int(inicio + pos if es_encabezado[pos] else inicio + pos + 1), fecha_documento
+        
+        return None, fecha_documento
+    
+    @staticmethod
+    def _texto_filas(bloque: pd.DataFrame) -> pd.Series:
+        """Texto en mayúsculas de cada fila: celdas no vacías unidas por espacio"""
+        texto = np.full(len(bloque), '', dtype=object)
+        con_valor = np.zeros(len(bloque), dtype=bool)
+        
+        for col in bloque.columns:
+            valores = bloque[col]
+            presente = valores.notna().to_numpy()
+            if not presente.any():
+                continue
+            celdas = valores.map(str).to_numpy(dtype=object)
+            unir = presente & con_valor
+            texto = np.where(unir, texto + ' ' + celdas, np.where(presente, celdas, texto))
+            con_valor |= presente
+        
+        return pd.Series(texto, dtype=object).str.upper()
+    
+    @staticmethod
+    def _extraer_fecha(fila: pd.Series) -> Optional[str]:
+        """Primera celda de la fila que parezca y se pueda leer como fecha"""
+        for cell in fila:
+            if pd.notna(cell) and ('/' in str(cell) or '-' in str(cell)):
+                try:
+                    return pd.to_datetime(cell).strftime('%Y-%m-%d')
+                except:
+                    pass
+        return None
+    
+    @staticmethod
+    def _tabla_desde_crudo(df_raw: pd.DataFrame, header_row_idx: int) -> pd.DataFrame:
+        """
+        Construye la tabla de detalles a partir de la lectura sin encabezado
+        
+        Pasa las filas ya leídas por el mismo parser que usa ``pd.read_excel``,
+        por lo que el resultado (nombres 'Unnamed: i', duplicados '.1' y tipos)
+        es el de ``pd.read_excel(header=header_row_idx)`` sin reabrir el libro.
+        """
+        filas = df_raw.iloc[header_row_idx:].astype(object)
+        filas = filas.where(filas.notna(), '')  # Celdas vacías como las entrega el lector de Excel
+        return TextParser(filas.values.tolist(), header=0).read()
+    
     def _mapear_columnas(self, df, fecha_documento, verbose=True):
         """Mapea columnas del archivo a las requeridas"""
         if verbose:
@@ -252,9 +351,10 @@ class MutualserProcessor:
         
         df_extraido = pd.DataFrame()
         columnas_no_encontradas = []
+        mapeo = self._resolver_mapeo(df.columns)
         
         for col_req in self.COLUMNAS_REQUERIDAS:
-            col_encontrada = self._buscar_columna(df, col_req)
+            col_encontrada = mapeo[col_req]
             
             if col_encontrada:
                 df_extraido[col_req] = df[col_encontrada]
@@ -273,8 +373,10 @@ class MutualserProcessor:
         
         # Limpiar filas
         filas_antes = len(df_extraido)
-        df_extraido = df_extraido[df_extraido['Número de factura'].notna()].copy()
-        df_extraido = df_extraido[~df_extraido['Número de factura'].astype(str).str.upper().str.contains('TOTAL|SUMA', na=False)]
+        facturas = df_extraido['Número de factura']
+        df_extraido = df_extraido[
+            facturas.notna() & ~facturas.astype(str).str.upper().str.contains('TOTAL|SUMA', na=False)
+        ]
         filas_despues = len(df_extraido)
         
         if verbose:
@@ -282,18 +384,65 @@ class MutualserProcessor:
         
         return df_extraido
     
+    def _resolver_mapeo(self, columnas) -> Dict[str, Any]:
+        """
+        Columna del archivo que corresponde a cada columna requerida
+        
+        El resultado se guarda por firma de encabezados: los archivos con el
+        mismo formato reutilizan el mapeo sin volver a comparar nombres.
+        """
+        firma = (tuple(self.COLUMNAS_REQUERIDAS), tuple(columnas))
+        mapeo = self._mapeos_por_encabezado.get(firma)
+        if mapeo is not None:
+            return mapeo
+        
+        normalizadas = [(col, self._normalizar_nombre(col)) for col in columnas]
+        mapeo = {}
+        for col_req, alias in self._alias_columnas:
+            mapeo[col_req] = next(
+                (col for col, nombre in normalizadas if alias in nombre or nombre in alias), None
+            )
+        
+        if len(self._mapeos_por_encabezado) >= self._MAX_MAPEOS:
+            self._mapeos_por_encabezado.clear()
+        self._mapeos_por_encabezado[firma] = mapeo
+        return mapeo
+    
+    @staticmethod
+    def _normalizar_nombre(nombre) -> str:
+        """Nombre de columna en minúscula, sin espacios externos ni tildes"""
+        return str(nombre).lower().strip().translate(_SIN_TILDES)
+    
     def _buscar_columna(self, df, col_requerida):
         """Busca columna de forma flexible"""
-        col_clean = col_requerida.lower().replace('ó', 'o').replace('á', 'a').replace('é', 'e').replace('í', 'i').replace('ú', 'u')
+        col_clean = self._normalizar_nombre(col_requerida)
         
         for col_df in df.columns:
-            col_df_clean = str(col_df).lower().strip().replace('ó', 'o').replace('á', 'a').replace('é', 'e').replace('í', 'i').replace('ú', 'u')
+            col_df_clean = self._normalizar_nombre(col_df)
             if col_clean in col_df_clean or col_df_clean in col_clean:
                 return col_df
         return None
     
-    def procesar_multiples_archivos(self, file_paths):
-        """Procesa múltiples archivos"""
+    def procesar_multiples_archivos(self, file_paths, paralelo: Optional[bool] = None,
+                                    progress_callback: Optional[Callable[[int, int, str], None]] = None,
+                                    max_workers: Optional[int] = None):
+        """
+        Procesa múltiples archivos
+        
+        Args:
+            file_paths: Rutas de los archivos a procesar
+            paralelo: True para repartir la lectura en procesos, False para leer en
+                serie. None decide según PARALELO_MIN_ARCHIVOS y los núcleos disponibles
+            progress_callback: Función callback(completados, total, archivo) llamada
+                al terminar cada archivo
+            max_workers: Procesos del pool (por defecto, uno por núcleo)
+            
+        Con caché activa solo se parsean los archivos nuevos o modificados; el
+        resto se toma del resultado guardado para el mismo contenido.
+            
+        Returns:
+            DataFrame consolidado (en el orden de file_paths) o None
+        """
         total = len(file_paths)
         print(f"\n[PROC] Iniciando procesamiento de {total} archivos...")
         print(f"[PROC] Primeros 5 archivos:")
@@ -302,18 +451,32 @@ class MutualserProcessor:
         if total > 5:
             print(f"   ... y {total - 5} archivos mas")
         
-        dfs = []
+        resultados, claves = self._leer_desde_cache(file_paths)
+        pendientes = [i for i, df in enumerate(resultados) if df is None]
+        en_cache = total - len(pendientes)
         
-        for i, file_path in enumerate(file_paths):
-            # Mostrar progreso cada 10 archivos
-            if (i + 1) % 10 == 0 or i == 0:
-                print(f"\n[PROC] Progreso: {i+1}/{total} ({(i+1)/total*100:.1f}%)")
-            
-            # Solo mostrar detalles del archivo cada 50
-            if (i + 1) % 50 == 0 or i < 3:
-                print(f"  Procesando: {os.path.basename(file_path)}")
-            
-            df = self.procesar_archivo(file_path)
+        avance = progress_callback
+        if en_cache:
+            print(f"[CACHE] {en_cache}/{total} archivos recuperados de cache")
+            if progress_callback:
+                progress_callback(en_cache, total, file_paths[-1])
+                
+                # El avance de la lectura se cuenta después de los archivos en caché
+                def avance(completados, _total, archivo):
+                    progress_callback(en_cache + completados, total, archivo)
+        
+        if pendientes:
+            rutas_pendientes = [file_paths[i] for i in pendientes]
+            leidos = self._leer(rutas_pendientes, paralelo, avance, max_workers)
+            for i, df in zip(pendientes, leidos, strict=True):
+                resultados[i] = df
+                if self.cache is not None and df is not None and not df.empty:
+                    self.cache.guardar(claves[i], df)
+            if self.cache is not None:
+                self.cache.podar()
+        
+        dfs = []
+        for i, (file_path, df) in enumerate(zip(file_paths, resultados, strict=True)):
             if df is not None and not df.empty:
                 dfs.append(df)
             else:
@@ -322,7 +485,7 @@ class MutualserProcessor:
         
         if dfs:
             print(f"\n[PROC] Consolidando {len(dfs)} DataFrames...")
-            self.df_consolidado = pd.concat(dfs, ignore_index=True)
+            self.df_consolidado = self._normalizar_tipos(pd.concat(dfs, ignore_index=True))
             print(f"[OK] Consolidado final: {len(self.df_consolidado)} registros")
             facturas_totales = self.df_consolidado['Número de factura'].unique()
             print(f"[STATS] Total facturas unicas: {len(facturas_totales)}")
@@ -331,6 +494,202 @@ class MutualserProcessor:
         print(f"[!] No se pudo procesar ningun archivo")
         return None
     
+    def _leer_desde_cache(self, file_paths) -> Tuple[List[Optional[pd.DataFrame]], List[Optional[str]]]:
+        """
+        Resultados guardados en caché para cada archivo
+        
+        Returns:
+            Tupla (DataFrame o None por archivo, clave de caché por archivo)
+        """
+        resultados: List[Optional[pd.DataFrame]] = [None] * len(file_paths)
+        claves: List[Optional[str]] = [None] * len(file_paths)
+        if self.cache is None:
+            return resultados, claves
+        
+        for i, file_path in enumerate(file_paths):
+            claves[i] = self.cache.clave_archivo(file_path)
+            resultados[i] = self.cache.obtener(claves[i])
+            if resultados[i] is not None:
+                self.archivos_procesados.append(file_path)
+        return resultados, claves
+    
+    def _leer(self, file_paths, paralelo: Optional[bool], progress_callback=None,
+              max_workers: Optional[int] = None) -> List[Optional[pd.DataFrame]]:
+        """Parsea los archivos en serie o en paralelo según su cantidad"""
+        total = len(file_paths)
+        nucleos = os.cpu_count() or 1
+        if paralelo is None:
+            paralelo = total >= self.PARALELO_MIN_ARCHIVOS and nucleos > 1
+        
+        resultados: List[Optional[pd.DataFrame]] = [None] * total
+        sin_leer = list(range(total))
+        if paralelo and total > 1:
+            resultados, sin_leer = self._leer_en_paralelo(file_paths, max_workers or min(nucleos, total),
+                                                          progress_callback)
+        if sin_leer:
+            # Lo que el pool no alcanzó a leer se lee en serie, sin repetir lo ya leído
+            hechos = total - len(sin_leer)
+            avance = progress_callback
+            if hechos and progress_callback:
+                def avance(completados, _total, archivo):
+                    progress_callback(hechos + completados, total, archivo)
+            
+            en_serie = self._leer_en_serie([file_paths[i] for i in sin_leer], avance)
+            for i, df in zip(sin_leer, en_serie, strict=True):
+                resultados[i] = df
+        return resultados
+    
+    def _leer_en_serie(self, file_paths, progress_callback=None) -> List[Optional[pd.DataFrame]]:
+        """Lee los archivos uno a uno en este proceso"""
+        total = len(file_paths)
+        resultados = []
+        
+        for i, file_path in enumerate(file_paths):
+            # Mostrar progreso cada 10 archivos
+            if (i + 1) % 10 == 0 or i == 0:
+                print(f"\n[PROC] Progreso: {i+1}/{total} ({(i+1)/total*100:.1f}%)")
+            
+            # Solo mostrar detalles del archivo cada 50
+            if (i + 1) % 50 == 0 or i < 3:
+                print(f"  Procesando: {os.path.basename(file_path)}")
+            
+            resultados.append(self.procesar_archivo(file_path))
+            if progress_callback:
+                progress_callback(i + 1, total, file_path)
+        
+        return resultados
+    
+    def _leer_en_paralelo(self, file_paths, max_workers: int,
+                          progress_callback=None) -> Tuple[List[Optional[pd.DataFrame]], List[int]]:
+        """
+        Reparte la lectura en un ProcessPoolExecutor
+        
+        Los resultados y errores se reordenan según file_paths para que la
+        salida sea la misma que en serie. Si el pool no pudo crearse o se
+        rompió a mitad de la lectura, los archivos ya leídos se conservan.
+        
+        Returns:
+            Tupla (DataFrame o None por archivo, posiciones de los archivos
+            sin resultado que hay que leer en serie)
+        """
+        total = len(file_paths)
+        resultados: List[Optional[pd.DataFrame]] = [None] * total
+        errores_por_archivo: List[list] = [[] for _ in range(total)]
+        leidos = [False] * total
+        print(f"[PROC] Lectura en paralelo con {max_workers} procesos")
+        
+        try:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                futuros = {executor.submit(_procesar_archivo_worker, fp): i for i, fp in enumerate(file_paths)}
+                
+                completados = 0
+                for futuro in as_completed(futuros):
+                    i = futuros[futuro]
+                    try:
+                        resultados[i], errores_por_archivo[i] = futuro.result()
+                    except BrokenExecutor:
+                        continue  # El pool se rompió: el archivo queda para leerse en serie
+                    except Exception as e:
+                        errores_por_archivo[i] = [{'archivo': file_paths[i], 'error': str(e)}]
+                    leidos[i] = True
+                    
+                    completados += 1
+                    if completados % 10 == 0 or completados == total:
+                        print(f"[PROC] Progreso: {completados}/{total} ({completados/total*100:.1f}%)")
+                    if progress_callback:
+                        progress_callback(completados, total, file_paths[i])
+        except (OSError, RuntimeError) as e:
+            print(f"[!] No se pudo usar procesamiento paralelo ({e})")
+        
+        for file_path, df, errores in zip(file_paths, resultados, errores_por_archivo, strict=True):
+            self.errores.extend(errores)
+            if df is not None and not df.empty:
+                self.archivos_procesados.append(file_path)
+        
+        sin_leer = [i for i, leido in enumerate(leidos) if not leido]
+        if sin_leer:
+            print(f"[!] {len(sin_leer)}/{total} archivos sin leer en paralelo, se procesan en serie")
+        return resultados, sin_leer
+    
+    # ==================== TIPOS DEL CONSOLIDADO ====================
+    
+    def _normalizar_tipos(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Convierte las columnas del consolidado a tipos compactos
+        
+        - Códigos y conceptos de glosa repetidos: category
+        - Cantidades y valores numéricos: int64/Int64/float64
+        - Fecha: datetime64 (se exporta como texto, ver _fechas_como_texto)
+        - Texto: string[pyarrow] si está disponible
+        
+        Solo se convierte una columna si la conversión no pierde información:
+        montos escritos como texto ("$ 1.200") o fechas no interpretables se
+        dejan como están para que las reglas de objeciones los lean igual.
+        """
+        for col in self.COLUMNAS_NUMERICAS:
+            if col in df.columns:
+                df[col] = self._columna_numerica(df[col])
+        for col in self.COLUMNAS_FECHA:
+            if col in df.columns:
+                df[col] = self._columna_fecha(df[col])
+        for col in self.COLUMNAS_TEXTO:
+            if col in df.columns:
+                df[col] = self._columna_texto(df[col])
+        for col in self.COLUMNAS_CATEGORICAS:
+            if col in df.columns and df[col].nunique() <= len(df) * self.MAX_PROPORCION_CATEGORIAS:
+                df[col] = df[col].astype('category')
+        return df
+    
+    @staticmethod
+    def _columna_numerica(serie: pd.Series) -> pd.Series:
+        """Columna con solo números (y vacíos) a int64/Int64/float64"""
+        tipo = pd.api.types.infer_dtype(serie, skipna=True)
+        if tipo == 'integer':
+            return serie.astype('Int64' if serie.isna().any() else np.int64)
+        if tipo in ('floating', 'mixed-integer-float'):
+            return serie.astype(float)
+        return serie
+    
+    @staticmethod
+    def _columna_fecha(serie: pd.Series) -> pd.Series:
+        """Columna de fechas a datetime64, interpretando cada valor distinto una vez"""
+        if pd.api.types.is_datetime64_any_dtype(serie.dtype):
+            return serie
+        
+        codigos, unicos = pd.factorize(serie)
+        fechas = []
+        for valor in unicos:
+            if isinstance(valor, str) and not valor.strip():
+                fechas.append(pd.NaT)
+                continue
+            fecha = valor if isinstance(valor, datetime) else pd.to_datetime(str(valor), errors='coerce')
+            if pd.isna(fecha) or pd.Timestamp(fecha).tzinfo is not None:
+                return serie  # No todas son fechas sin zona horaria: se deja como está
+            fechas.append(fecha)
+        
+        fechas = pd.DatetimeIndex(fechas + [pd.NaT])
+        return pd.Series(fechas[codigos], index=serie.index, name=serie.name)
+    
+    def _fechas_como_texto(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Copia del consolidado con las fechas como texto 'YYYY-MM-DD'
+        
+        El cargador de DGH espera la fecha como texto, igual que se leyó del
+        archivo; en memoria se mantiene datetime64. NaT se exporta como ''.
+        """
+        df = df.copy(deep=False)
+        for col in self.COLUMNAS_FECHA:
+            if col in df.columns and pd.api.types.is_datetime64_any_dtype(df[col].dtype):
+                df[col] = df[col].dt.strftime('%Y-%m-%d').fillna('').astype(object)
+        return df
+    
+    @staticmethod
+    def _columna_texto(serie: pd.Series) -> pd.Series:
+        """Columna con solo texto al dtype compacto de texto"""
+        if _TIPO_TEXTO is None or pd.api.types.infer_dtype(serie, skipna=True) != 'string':
+            return serie
+        return serie.astype(_TIPO_TEXTO)
+    
     # ==================== GENERACIÓN DE OBJECIONES ====================
     
     def _generar_archivo_objeciones(self):
@@ -350,8 +709,8 @@ class MutualserProcessor:
             df_obj['CDCONSEC'] = facturas.map(factura_consecutivo)
             # Formato D/M/A (día/mes/año)
             df_obj['CDFECDOC'] = datetime.now().strftime('%#d/%#m/%Y') if os.name == 'nt' else datetime.now().strftime('%-d/%-m/%Y')
-            df_obj['CRNCXC'] = (self.df_consolidado['Número de factura'] if 'Número de factura' in self.df_consolidado.columns else pd.Series()).apply(self._formatear_crncxc)
-            df_obj['CROFECOBJ'] = (self.df_consolidado['Fecha'] if 'Fecha' in self.df_consolidado.columns else pd.Series()).apply(self._formatear_fecha_dmy)
+            df_obj['CRNCXC'] = objeciones.formatear_crncxc(facturas)
+            df_obj['CROFECOBJ'] = objeciones.formatear_fecha_dmy(self.df_consolidado['Fecha'] if 'Fecha' in self.df_consolidado.columns else pd.Series())
             df_obj['CROREFERE'] = ''
             df_obj['CROOBSERV'] = self.df_consolidado['REG GLOSA'] if 'REG GLOSA' in self.df_consolidado.columns else ''
             df_obj['CROCLAOBJ'] = 0
@@ -360,8 +719,8 @@ class MutualserProcessor:
             df_obj['SLNSERPRO'] = self.df_consolidado['Codigo homologado DGH'] if 'Codigo homologado DGH' in self.df_consolidado.columns else ''
             df_obj['CTNCENCOS'] = ''
             df_obj['IDRIPS'] = ''
-            df_obj['CROVALOBJ'] = (self.df_consolidado['Valor glosado'] if 'Valor glosado' in self.df_consolidado.columns else pd.Series(dtype=int)).apply(self._obtener_valor_numerico)
-            df_obj['CRDOBSERV'] = self.df_consolidado.apply(self._combinar_observaciones, axis=1)
+            df_obj['CROVALOBJ'] = objeciones.valor_numerico(self.df_consolidado['Valor glosado'] if 'Valor glosado' in self.df_consolidado.columns else pd.Series(dtype=int))
+            df_obj['CRDOBSERV'] = objeciones.combinar_observaciones(self.df_consolidado)
             
             # Procesar AU/TA
             df_obj = self._procesar_au_ta(df_obj)
@@ -370,8 +729,7 @@ class MutualserProcessor:
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
             output_path = os.path.join(self.output_dir, f"Objeciones_{timestamp}.xlsx")
             
-            with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
-                df_obj.to_excel(writer, sheet_name='OBJECIONES', index=False)
+            excel_writer.escribir_excel(output_path, {'OBJECIONES': df_obj})
             
             print(f"✅ Generado: {output_path} ({len(df_obj)} registros)")
             return output_path
@@ -384,74 +742,12 @@ class MutualserProcessor:
         """Procesa filas AU/TA: combina y elimina duplicados"""
         print("🔄 Procesando AU/TA...")
         
-        filas_eliminar = []
-        procesadas = 0
-        
-        for (factura, tec), grupo in df_obj.groupby(['CRNCXC', 'SLNSERPRO']):
-            if len(grupo) < 2:
-                continue
-            
-            filas_au = [i for i, r in grupo.iterrows() if str(r.get('CRNCONOBJ', '')).upper().startswith('AU')]
-            filas_ta = [i for i, r in grupo.iterrows() if str(r.get('CRNCONOBJ', '')).upper().startswith('TA')]
-            
-            if filas_au and filas_ta:
-                idx_au = filas_au[0]
-                
-                for idx_ta in filas_ta:
-                    obs_ta = str(df_obj.at[idx_ta, 'CRDOBSERV']).strip()
-                    if obs_ta:
-                        obs_au = str(df_obj.at[idx_au, 'CRDOBSERV']).strip()
-                        df_obj.at[idx_au, 'CRDOBSERV'] = f"{obs_au} \\\\ {obs_ta}" if obs_au else f"\\\\ {obs_ta}"
-                    
-                    filas_eliminar.append(idx_ta)
-                    procesadas += 1
-        
-        if filas_eliminar:
-            df_obj = df_obj.drop(filas_eliminar).reset_index(drop=True)
+        df_obj, procesadas = objeciones.combinar_au_ta(df_obj)
+        if procesadas:
             print(f"   ✅ {procesadas} filas TA procesadas")
         
         return df_obj
     
-    # ==================== UTILIDADES DE FORMATO ====================
-    
-    def _formatear_crncxc(self, valor):
-        if pd.isna(valor) or not valor:
-            return ''
-        valor_str = str(valor).strip()
-        if valor_str.upper().startswith('FC'):
-            return f"FC0000{valor_str[2:]}"
-        return f"FC0000{valor_str}"
-    
-    def _formatear_fecha_dmy(self, fecha):
-        if pd.isna(fecha) or not fecha:
-            return ''
-        try:
-            if isinstance(fecha, (pd.Timestamp, datetime)):
-                return fecha.strftime('%d/%m/%Y')
-            fecha_dt = pd.to_datetime(str(fecha), errors='coerce')
-            return fecha_dt.strftime('%d/%m/%Y') if pd.notna(fecha_dt) else ''
-        except:
-            return ''
-    
-    def _obtener_valor_numerico(self, valor):
-        if pd.isna(valor) or not valor:
-            return 0
-        try:
-            if isinstance(valor, (int, float)):
-                return int(valor)
-            valor_str = str(valor).replace('$', '').replace(' ', '').replace('.', '').replace(',', '').strip()
-            return int(float(valor_str)) if valor_str else 0
-        except:
-            return 0
-    
-    def _combinar_observaciones(self, row):
-        partes = []
-        for col in ['Concepto de glosa', 'Observacion']:
-            val = row.get(col, '')
-            if pd.notna(val) and str(val).strip():
-                partes.append(str(val).strip())
-        return ' - '.join(partes)
-    
     # ==================== EXPORTACIÓN ====================
     
     def exportar_consolidado(self, nombre_archivo=None):
@@ -463,10 +759,9 @@ class MutualserProcessor:
         try:
             # Filtrar filas vacías (sin Tecnología o sin Número de factura)
             filas_antes = len(self.df_consolidado)
-            self.df_consolidado = self.df_consolidado[
-                self.df_consolidado['Tecnología'].notna() & 
-                self.df_consolidado['Número de factura'].notna()
-            ].copy()
+            validas = self.df_consolidado['Tecnología'].notna() & self.df_consolidado['Número de factura'].notna()
+            if not validas.all():
+                self.df_consolidado = self.df_consolidado[validas].copy()
             filas_despues = len(self.df_consolidado)
             
             if filas_antes != filas_despues:
@@ -480,16 +775,14 @@ class MutualserProcessor:
             self._aplicar_homologacion()
             
             # Generar REG GLOSA
-            self.df_consolidado['REG GLOSA'] = self.df_consolidado['Número de glosa'].apply(
-                lambda x: f"REG, GLOSA SEGUN RAD N. {x}" if pd.notna(x) else ""
-            )
+            self.df_consolidado['REG GLOSA'] = objeciones.reg_glosa(self.df_consolidado['Número de glosa'])
             
             # Exportar consolidado
             if nombre_archivo is None:
                 nombre_archivo = f"MUTUALSER_consolidado_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
             
             output_path = os.path.join(self.output_dir, nombre_archivo)
-            self.df_consolidado.to_excel(output_path, index=False)
+            excel_writer.escribir_excel(output_path, self._fechas_como_texto(self.df_consolidado))
             print(f"\n✅ Consolidado: {output_path}")
             
             # Generar objeciones
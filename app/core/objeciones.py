@@ -0,0 +1,287 @@
+"""
+Transformaciones compartidas para generar archivos de objeciones
+Usadas por MutualserProcessor y CoosaludProcessor sobre columnas completas
+(sin recorrer filas con iterrows/apply)
+"""
+from datetime import datetime
+from typing import Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Separador entre observaciones combinadas de filas AU/TA
+SEPARADOR_AU_TA = " \\\\ "
+
+# Texto de CROOBSERV / REG GLOSA antes del número de glosa
+PREFIJO_REG_GLOSA = "REG, GLOSA SEGUN RAD N. "
+
+# Valores que float() convierte a NaN sin error
+_TEXTOS_NAN = ['nan', '+nan', '-nan']
+
+
+def combinar_au_ta(df_obj: pd.DataFrame) -> Tuple[pd.DataFrame, int]:
+    """
+    Combina filas AU/TA de la misma factura y servicio
+
+    En cada grupo (CRNCXC, SLNSERPRO) que tenga conceptos AU y TA, las
+    observaciones no vacías de las filas TA se agregan, en orden, a la
+    primera fila AU separadas por ``\\\\`` y las filas TA se eliminan.
+    Las filas con factura o servicio vacío (NaN) no forman grupo.
+
+    Args:
+        df_obj: DataFrame de objeciones con CRNCXC, SLNSERPRO, CRNCONOBJ y CRDOBSERV
+
+    Returns:
+        Tupla (DataFrame resultante, cantidad de filas TA eliminadas)
+    """
+    if df_obj.empty:
+        return df_obj, 0
+
+    concepto = df_obj['CRNCONOBJ'].map(str).str.upper()
+    es_au = concepto.str.startswith('AU').to_numpy()
+    es_ta = concepto.str.startswith('TA').to_numpy()
+    if not (es_au.any() and es_ta.any()):
+        return df_obj, 0
+
+    # Número de grupo por fila (-1 cuando la factura o el servicio son NaN)
+    grupo = df_obj.groupby(['CRNCXC', 'SLNSERPRO'], sort=False).ngroup().fillna(-1).to_numpy(dtype=np.int64)
+    posiciones = np.arange(len(df_obj))
+
+    # Primera fila AU de cada grupo
+    con_au = es_au & (grupo >= 0)
+    primer_au = pd.Series(posiciones[con_au]).groupby(grupo[con_au]).first()
+
+    # Filas TA de grupos que tienen AU: se eliminan todas
+    eliminar = es_ta & (grupo >= 0) & np.isin(grupo, primer_au.index)
+    if not eliminar.any():
+        return df_obj, 0
+
+    # Observaciones TA no vacías unidas por grupo, en el orden original
+    obs_ta = df_obj['CRDOBSERV'].iloc[posiciones[eliminar]].map(str).str.strip()
+    grupo_ta = grupo[eliminar]
+    no_vacias = (obs_ta != '').to_numpy()
+    unidas = obs_ta[no_vacias].groupby(grupo_ta[no_vacias], sort=False).agg(SEPARADOR_AU_TA.join)
+
+    resultado = df_obj.copy()
+    if len(unidas):
+        pos_au = primer_au.loc[unidas.index].to_numpy()
+        obs_au = resultado['CRDOBSERV'].iloc[pos_au].map(str).str.strip().to_numpy(dtype=object)
+        combinadas = np.where(
+            obs_au != '',
+            obs_au + SEPARADOR_AU_TA + unidas.to_numpy(dtype=object),
+            SEPARADOR_AU_TA.lstrip() + unidas.to_numpy(dtype=object)
+        )
+        col_obs = resultado.columns.get_loc('CRDOBSERV')
+        if resultado['CRDOBSERV'].dtype.kind in 'biufcmM':
+            resultado['CRDOBSERV'] = resultado['CRDOBSERV'].astype(object)
+        resultado.iloc[pos_au, col_obs] = combinadas
+
+    resultado = resultado[~eliminar].reset_index(drop=True)
+    return resultado, int(eliminar.sum())
+
+
+# ==================== FORMATEO DE COLUMNAS ====================
+
+def _es_texto(serie: pd.Series) -> np.ndarray:
+    """Máscara de celdas que son texto (el resto se trata como número)"""
+    if pd.api.types.is_string_dtype(serie.dtype) and serie.dtype != object:
+        return serie.notna().to_numpy()
+    if serie.dtype != object:
+        return np.zeros(len(serie), dtype=bool)
+    return serie.map(type).map(lambda t: issubclass(t, str)).to_numpy(dtype=bool)
+
+
+def _vacios(serie: pd.Series, es_texto: np.ndarray) -> np.ndarray:
+    """Equivalente vectorizado de ``pd.isna(v) or not v`` para texto y números"""
+    vacios = serie.isna().to_numpy().copy()
+    if es_texto.any():
+        vacios |= es_texto & (serie.where(es_texto, 'x').astype(str) == '').to_numpy()
+    numeros = ~es_texto & ~vacios
+    if numeros.any():
+        vacios |= numeros & (pd.to_numeric(serie.where(numeros, 1), errors='coerce') == 0).to_numpy()
+    return vacios
+
+
+def _como_texto(serie: pd.Series) -> pd.Series:
+    """str() de cada celda, como texto sin NaN"""
+    return serie.astype(object).map(str)
+
+
+def formatear_crncxc(serie: pd.Series, solo_digitos: bool = False) -> pd.Series:
+    """
+    Formatea números de factura al formato CRNCXC (``FC0000{numero}``)
+
+    Args:
+        serie: Números de factura ("12345", "FC12345", 12345...)
+        solo_digitos: Si True conserva solo los dígitos del número y deja vacío
+            el resultado cuando no hay ninguno (formato COOSALUD)
+
+    Returns:
+        Serie de texto con el mismo índice; vacío para facturas vacías
+    """
+    if serie.empty:
+        return pd.Series([], index=serie.index, dtype=object)
+
+    vacios = _vacios(serie, _es_texto(serie))
+    texto = _como_texto(serie).str.strip()
+    numeros = texto.where(~texto.str.upper().str.startswith('FC'), texto.str[2:])
+
+    if solo_digitos:
+        numeros = numeros.str.replace(r'\D', '', regex=True)
+        vacios = vacios | (numeros == '').to_numpy()
+
+    return pd.Series(np.where(vacios, '', 'FC0000' + numeros), index=serie.index)
+
+
+def _fecha_dmy(fecha) -> str:
+    """Convierte un valor a DD/MM/YYYY (misma regla que los procesadores)"""
+    if pd.isna(fecha) or not fecha:
+        return ''
+    try:
+        if isinstance(fecha, (pd.Timestamp, datetime)):
+            return fecha.strftime('%d/%m/%Y')
+        fecha_dt = pd.to_datetime(str(fecha), errors='coerce')
+        return fecha_dt.strftime('%d/%m/%Y') if pd.notna(fecha_dt) else ''
+    except:
+        return ''
+
+
+def formatear_fecha_dmy(serie: pd.Series) -> pd.Series:
+    """
+    Convierte una columna de fechas a texto DD/MM/YYYY
+
+    Las columnas datetime se formatean directamente con ``dt.strftime``. En
+    las demás cada valor distinto se interpreta una sola vez (una columna de
+    miles de filas suele tener pocas fechas distintas) y se expande con
+    ``factorize``, conservando la interpretación de ``pd.to_datetime`` por valor.
+
+    Returns:
+        Serie de texto con el mismo índice; vacío si no es una fecha válida
+    """
+    if serie.empty:
+        return pd.Series([], index=serie.index, dtype=object)
+
+    if pd.api.types.is_datetime64_any_dtype(serie.dtype):
+        return serie.dt.strftime('%d/%m/%Y').astype(object).where(serie.notna(), '')
+
+    codigos, unicos = pd.factorize(serie, use_na_sentinel=True)
+    formateados = np.array([_fecha_dmy(valor) for valor in unicos] + [''], dtype=object)
+    return pd.Series(formateados[codigos], index=serie.index)
+
+
+def _limpiar_monto(texto: pd.Series) -> pd.Series:
+    """Quita símbolo de moneda y espacios de montos en texto"""
+    return texto.str.strip().str.replace('$', '', regex=False).str.replace(' ', '', regex=False)
+
+
+def _texto_a_float(texto: pd.Series) -> pd.Series:
+    """float() vectorizado: texto vacío o inválido queda en 0, 'nan' queda NaN"""
+    numeros = pd.to_numeric(texto.where(texto != '', '0'), errors='coerce')
+    invalidos = numeros.isna() & ~texto.str.lower().isin(_TEXTOS_NAN)
+    return numeros.where(~invalidos, 0.0).astype(float)
+
+
+def valor_numerico(serie: pd.Series, decimales: bool = False) -> pd.Series:
+    """
+    Convierte montos a número
+
+    Args:
+        serie: Valores numéricos o texto con formato monetario ("$ 1.234.567,89")
+        decimales: False para enteros sin separadores (formato MUTUALSER: se
+            eliminan puntos y comas y se trunca). True para float que interpreta
+            separadores de miles/decimales colombianos o internacionales
+            (formato COOSALUD)
+
+    Returns:
+        Serie int64 (o float64 con decimales) con el mismo índice; 0 si vacío o inválido
+    """
+    if serie.empty:
+        return pd.Series([], index=serie.index, dtype=float if decimales else np.int64)
+
+    es_texto = _es_texto(serie)
+    vacios = _vacios(serie, es_texto)
+    resultado = np.zeros(len(serie), dtype=float)
+
+    # Valores ya numéricos
+    numeros = ~es_texto & ~vacios
+    if numeros.any():
+        resultado[numeros] = pd.to_numeric(serie[numeros], errors='coerce').astype(float).to_numpy()
+
+    # Montos en texto
+    textos = es_texto & ~vacios
+    if textos.any():
+        texto = _limpiar_monto(serie[textos].astype(str))
+        if decimales:
+            texto = _normalizar_separadores(texto)
+        else:
+            texto = texto.str.replace('.', '', regex=False).str.replace(',', '', regex=False)
+        resultado[textos] = _texto_a_float(texto).to_numpy()
+
+    if decimales:
+        return pd.Series(resultado, index=serie.index)
+
+    # int(): trunca; NaN e infinito no son convertibles y quedan en 0
+    resultado[~np.isfinite(resultado)] = 0
+    return pd.Series(np.trunc(resultado).astype(np.int64), index=serie.index)
+
+
+def _normalizar_separadores(texto: pd.Series) -> pd.Series:
+    """
+    Deja un monto con punto decimal y sin separador de miles
+
+    - Coma y punto: el último separador es el decimal (1.234,56 / 1,234.56)
+    - Solo comas: varias son miles; una sola es decimal si le siguen <= 2 dígitos
+    - Solo puntos: varios son miles; uno solo es decimal
+    """
+    pos_coma = texto.str.rfind(',')
+    pos_punto = texto.str.rfind('.')
+    tiene_coma = pos_coma >= 0
+    tiene_punto = pos_punto >= 0
+
+    sin_puntos = texto.str.replace('.', '', regex=False)
+    sin_comas = texto.str.replace(',', '', regex=False)
+    coma_decimal = sin_puntos.str.replace(',', '.', regex=False)
+
+    ambos = tiene_coma & tiene_punto
+    una_coma = tiene_coma & ~tiene_punto & (texto.str.count(',') == 1)
+    coma_es_decimal = una_coma & ((texto.str.len() - pos_coma - 1) <= 2)
+    varios_puntos = tiene_punto & ~tiene_coma & (texto.str.count(r'\.') > 1)
+
+    resultado = texto.copy()
+    resultado[ambos & (pos_coma > pos_punto)] = coma_decimal
+    resultado[ambos & (pos_punto > pos_coma)] = sin_comas
+    resultado[tiene_coma & ~tiene_punto] = sin_comas
+    resultado[coma_es_decimal] = coma_decimal
+    resultado[varios_puntos] = sin_puntos
+    return resultado
+
+
+def reg_glosa(numeros_glosa: pd.Series) -> pd.Series:
+    """
+    Texto REG GLOSA (``REG, GLOSA SEGUN RAD N. {numero}``) por fila
+
+    Returns:
+        Serie de texto con el mismo índice; vacío si no hay número de glosa
+    """
+    texto = PREFIJO_REG_GLOSA + _como_texto(numeros_glosa)
+    return texto.where(numeros_glosa.notna().to_numpy(), '')
+
+
+def combinar_observaciones(df: pd.DataFrame,
+                           columnas: Sequence[str] = ('Concepto de glosa', 'Observacion')) -> pd.Series:
+    """
+    Une con ' - ' los textos no vacíos de varias columnas por fila
+
+    Returns:
+        Serie de texto con el índice de ``df``
+    """
+    resultado = pd.Series('', index=df.index, dtype=object)
+    for col in columnas:
+        if col not in df.columns:
+            continue
+        texto = _como_texto(df[col]).str.strip().where(df[col].notna(), '')
+        unir = (resultado != '') & (texto != '')
+        resultado = pd.Series(
+            np.where(unir, resultado + ' - ' + texto, resultado + texto), index=df.index
+        )
+    return resultado
@@ -6,6 +6,7 @@ import os
 from app.core.imap_client import ImapClient
 from app.service.attachment_service import AttachmentService
 from app.core.mutualser_processor import MutualserProcessor
+from app.config.settings import TEMP_DIR
 
 
 class EmailService:
@@ -22,7 +23,10 @@ class EmailService:
         
         # Procesadores por EPS - usar ruta de red MINERVA
         mutualser_output = self._get_output_path(self.MUTUALSER_OUTPUT_RED, "outputs/mutualser")
-        self.mutualser_processor = MutualserProcessor(output_dir=mutualser_output)
+        self.mutualser_processor = MutualserProcessor(
+            output_dir=mutualser_output,
+            cache_dir=str(TEMP_DIR / "cache" / "mutualser")
+        )
         print(f"📁 MUTUALSER guardará en: {mutualser_output}")
     
     def _get_output_path(self, network_path, fallback_path):
@@ -308,7 +312,7 @@ class EmailService:
 
     # Métodos específicos para procesamiento de EPS
     
-    def procesar_mutualser(self, archivos=None):
+    def procesar_mutualser(self, archivos=None, on_progress=None):
         """
         Procesa archivos de respuesta de glosas de MUTUALSER y genera Excel consolidado
         con objeciones separadas por tipo.
@@ -316,6 +320,8 @@ class EmailService:
         Args:
             archivos (list, optional): Lista de rutas de archivos Excel a procesar.
                                      Si None, usa archivos Excel descargados en la sesión actual.
+            on_progress (callable, optional): Función callback(completados, total, archivo)
+                                     llamada al terminar de leer cada archivo
                                      
         Returns:
             dict: Resultado del procesamiento con las siguientes claves:
@@ -378,7 +384,7 @@ class EmailService:
             }
         
         # Procesar archivos
-        df = self.mutualser_processor.procesar_multiples_archivos(archivos)
+        df = self.mutualser_processor.procesar_multiples_archivos(archivos, progress_callback=on_progress)
         
         if df is None or df.empty:
             return {
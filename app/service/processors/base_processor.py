@@ -39,6 +39,8 @@ import pandas as pd
 from datetime import datetime
 from abc import ABC, abstractmethod
 from typing import List, Dict, Tuple, Optional
+
+from app.core.homologacion_service import HomologacionService
     
 
 class BaseProcessor(ABC):
@@ -123,7 +125,10 @@ class BaseProcessor(ABC):
             return False
             
         try:
-            self.homologador_df = pd.read_excel(self.homologador_path)
+            # Snapshot + journal: incluye los guardados del CRUD aún no compactados
+            self.homologador_df = HomologacionService.leer_tabla_vigente(self.homologador_path)
+            if self.homologador_df is None:
+                raise FileNotFoundError(self.homologador_path)
             print(f"✓ Homologador cargado: {len(self.homologador_df)} registros")
             return True
         except Exception as e:
@@ -14,13 +14,51 @@ El resultado se guarda en un Excel con 2 hojas: "Detalles" y "Glosa"
 """
 import os
 import re
+import threading
+import numpy as np
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, BrokenExecutor, as_completed
 from datetime import datetime
-from typing import List, Dict, Tuple, Optional, Any
+from functools import lru_cache
+from typing import List, Dict, Tuple, Optional, Any, Callable, Union
 
+from app.core import excel_writer, objeciones
+from app.core.cache_resultados import CacheResultados
+from app.core.encabezado_excel import EXTENSIONES_OPENPYXL, leer_encabezado, nombres_normalizados
+from app.core.homologacion_service import HomologacionService
 from .base_processor import BaseProcessor
 
 
+# Códigos de glosa distintos memorizados (un lote trae unas pocas decenas)
+_MAX_CODIGOS_GLOSA_CACHE = 4096
+
+# Tipo de archivo según su encabezado, por hash del contenido (None = no reconocido)
+_TIPOS_POR_CONTENIDO: Dict[str, Optional[str]] = {}
+_MAX_TIPOS_POR_CONTENIDO = 20000
+
+# Resultado de cargar un par: (detalle, glosa, error)
+ParCargado = Tuple[Optional[pd.DataFrame], Optional[pd.DataFrame], Optional[str]]
+
+
+def _cargar_par(pair: Dict[str, str], factura: str) -> ParCargado:
+    """
+    Lee los archivos DETALLE y GLOSAS de un par y los marca con _FACTURA
+    
+    Vive a nivel de módulo para poder ejecutarse en otro proceso (spawn en
+    Windows). Los errores se devuelven como texto en lugar de propagarse.
+    """
+    try:
+        detalle_df = pd.read_excel(pair["detalle"])
+        glosa_df = pd.read_excel(pair["glosa"])
+    except Exception as e:
+        return None, None, str(e)
+    
+    # Agregar columna de factura para tracking
+    detalle_df["_FACTURA"] = factura
+    glosa_df["_FACTURA"] = factura
+    return detalle_df, glosa_df, None
+
+
 class CoosaludProcessor(BaseProcessor):
     """Procesador de archivos de Coosalud EPS"""
     
@@ -33,6 +71,13 @@ class CoosaludProcessor(BaseProcessor):
     DETALLE_CODE_COLUMN = "codigo_servicio"  # Código del servicio a homologar
     GLOSA_CODE_COLUMN = "codigo_glosa"  # Código resolución 2284
     
+    # Tipos de archivo y columnas que los identifican en el encabezado
+    TIPO_DETALLE = "detalle"
+    TIPO_GLOSA = "glosa"
+    TIPO_DEVOLUCION = "devolucion"
+    FIRMA_GLOSA = ["codigo_glosa", "justificacion_glosa"]
+    FIRMA_DETALLE = ["codigo_servicio"]
+    
     # Mapeo de primer dígito a prefijo de código de glosa
     CODIGO_GLOSA_PREFIJOS = {
         "1": "FA",
@@ -48,11 +93,40 @@ class CoosaludProcessor(BaseProcessor):
         "430": "AU2103"
     }
     
-    def __init__(self, homologador_path: Optional[str] = None):
+    # Prioridad de prefijos de codigo_glosa (de mayor a menor); TA y el resto van después
+    PRIORIDAD_GLOSA = ["FA", "SO", "AU", "CO", "CL"]
+    PRIORIDAD_GLOSA_OTROS = 999
+    
+    # Desde cuántos pares conviene repartir la lectura en varios procesos
+    PARALELO_MIN_PARES = 20
+    
+    # Desde cuántos pares se procesa por lotes (memoria acotada) y pares por lote
+    LOTE_MIN_PARES = 200
+    PARES_POR_LOTE = 50
+    
+    # Versión de los DataFrames leídos por par: cambiarla invalida la caché de pares
+    VERSION_LECTURA = 1
+    
+    # Registro de homologadores compartido por todas las instancias del proceso
+    # Por ruta: {'firma': snapshot + journal, 'df': DataFrame, 'dict': código -> DGH, 'warnings': [...]}
+    _registro_homologadores: Dict[str, Dict[str, Any]] = {}
+    _registro_lock = threading.Lock()
+    _refrescos_en_curso: Dict[str, threading.Thread] = {}
+    
+    def __init__(self, homologador_path: Optional[str] = None, cache_dir: Optional[str] = None):
         
         super().__init__(homologador_path or "")
         self.detalle_df: Optional[pd.DataFrame] = None
         self.glosa_df: Optional[pd.DataFrame] = None
+        
+        # Caché de pares leídos por contenido (None = siempre leer los Excel)
+        self.cache: Optional[CacheResultados] = None
+        if cache_dir:
+            self.cache = CacheResultados(cache_dir, f"coosalud-{self.VERSION_LECTURA}")
+        
+        # Diccionario de homologación y el homologador del que se armó
+        self._homolog_dict: Optional[Dict[str, str]] = None
+        self._homolog_dict_origen: Optional[pd.DataFrame] = None
     
     def _homologar_codigo_glosa(self, codigo: str) -> str:
         """
@@ -117,11 +191,18 @@ class CoosaludProcessor(BaseProcessor):
             - Los códigos vacíos, None o NaN se convierten en string vacío
             - Si el primer dígito no está en el mapeo, retorna el código original
             - Es case-insensitive y elimina espacios automáticamente
+            - El resultado se memoriza por texto del código (ver _homologar_texto_glosa)
         """
         if not codigo:
             return ""
         
-        codigo_str = str(codigo).strip().upper()
+        return self._homologar_texto_glosa(str(codigo))
+    
+    @classmethod
+    @lru_cache(maxsize=_MAX_CODIGOS_GLOSA_CACHE)
+    def _homologar_texto_glosa(cls, codigo: str) -> str:
+        """Regla de _homologar_codigo_glosa sobre el texto del código (memorizada)"""
+        codigo_str = codigo.strip().upper()
         
         # Si está vacío o es NaN
         if not codigo_str or codigo_str in ['NAN', 'NONE', '']:
@@ -132,14 +213,14 @@ class CoosaludProcessor(BaseProcessor):
             return codigo_str
         
         # Verificar casos especiales primero
-        if codigo_str in self.CODIGO_GLOSA_ESPECIALES:
-            return self.CODIGO_GLOSA_ESPECIALES[codigo_str]
+        if codigo_str in cls.CODIGO_GLOSA_ESPECIALES:
+            return cls.CODIGO_GLOSA_ESPECIALES[codigo_str]
         
         # Si comienza con número, aplicar regla de homologación
         primer_digito = codigo_str[0]
         
-        if primer_digito in self.CODIGO_GLOSA_PREFIJOS:
-            prefijo = self.CODIGO_GLOSA_PREFIJOS[primer_digito]
+        if primer_digito in cls.CODIGO_GLOSA_PREFIJOS:
+            prefijo = cls.CODIGO_GLOSA_PREFIJOS[primer_digito]
             resto = codigo_str[1:]  # Dígitos después del primero
             
             # Asegurar que resto tenga al menos 2 dígitos
@@ -152,7 +233,7 @@ class CoosaludProcessor(BaseProcessor):
         
         # Si el primer dígito no está en el mapeo, retornar original
         return codigo_str
-            
+    
     def _extract_factura_number(self, filename: str) -> Optional[str]:
         """
         Extrae el número de factura del nombre del archivo.
@@ -165,7 +246,7 @@ class CoosaludProcessor(BaseProcessor):
             return match.group(1).upper()
         return None
         
-    def identify_file_pairs(self, file_paths: List[str]) -> List[Dict[str, str]]:
+    def identify_file_pairs(self, file_paths: List[str], por_contenido: bool = True) -> List[Dict[str, str]]:
         """
         Identifica y empareja archivos de Coosalud por número de factura para procesamiento masivo.
         
@@ -182,6 +263,9 @@ class CoosaludProcessor(BaseProcessor):
         
         Args:
             file_paths (List[str]): Lista completa de rutas de archivos a clasificar
+            por_contenido (bool): Si True, revisa el encabezado de cada archivo y
+                corrige la clasificación del nombre cuando las columnas indican
+                otro tipo (ver _tipo_por_contenido)
             
         Returns:
             List[Dict[str, str]]: Lista de pares identificados, cada uno con:
@@ -232,6 +316,8 @@ class CoosaludProcessor(BaseProcessor):
             - Se muestra progreso cada 100 archivos para grandes volúmenes
             - Los warnings se almacenan en self.warnings para revisión posterior
             - Case-insensitive para palabras clave (DETALLE, GLOSA, DEVOLUCION)
+            - Archivos renombrados o reenviados se clasifican por sus columnas;
+              cada corrección queda en self.warnings
         """
         excel_files = [f for f in file_paths if f.endswith(('.xlsx', '.xls', '.xlsm', '.csv'))]
         
@@ -242,6 +328,7 @@ class CoosaludProcessor(BaseProcessor):
         glosa_files = {}    # {factura_num: path}
         archivos_devolucion_count = 0
         archivos_otros_count = 0
+        reclasificados = 0
         
         for i, f in enumerate(excel_files):
             fname = os.path.basename(f).lower()
@@ -250,8 +337,25 @@ class CoosaludProcessor(BaseProcessor):
             if (i + 1) % 100 == 0:
                 print(f"  ... clasificando {i + 1}/{len(excel_files)} archivos")
             
+            tipo = self._tipo_por_nombre(fname)
+            
             # Si tiene "devolucion" en el nombre, ignorar
-            if any(kw in fname for kw in self.DEVOLUCION_KEYWORDS):
+            if tipo == self.TIPO_DEVOLUCION:
+                archivos_devolucion_count += 1
+                continue
+            
+            # El encabezado manda cuando identifica otro tipo (archivo renombrado o reenviado)
+            if por_contenido:
+                tipo_contenido = self._tipo_por_contenido(f)
+                if tipo_contenido and tipo_contenido != tipo:
+                    reclasificados += 1
+                    self.warnings.append(
+                        f"{os.path.basename(f)}: clasificado como {tipo_contenido.upper()} por su contenido "
+                        f"(por el nombre: {tipo.upper() if tipo else 'sin tipo'})"
+                    )
+                    tipo = tipo_contenido
+            
+            if tipo == self.TIPO_DEVOLUCION:
                 archivos_devolucion_count += 1
                 continue
             
@@ -259,13 +363,13 @@ class CoosaludProcessor(BaseProcessor):
             factura_num = self._extract_factura_number(fname)
             
             # Clasificar por tipo
-            if any(kw in fname for kw in self.DETALLE_KEYWORDS):
+            if tipo == self.TIPO_DETALLE:
                 if factura_num:
                     detalle_files[factura_num] = f
                 else:
                     # Sin número de factura, usar nombre completo como clave
                     detalle_files[fname] = f
-            elif any(kw in fname for kw in self.GLOSA_KEYWORDS):
+            elif tipo == self.TIPO_GLOSA:
                 if factura_num:
                     glosa_files[factura_num] = f
                 else:
@@ -274,6 +378,8 @@ class CoosaludProcessor(BaseProcessor):
                 archivos_otros_count += 1
         
         print(f"  [!] Ignorados: {archivos_devolucion_count} devoluciones, {archivos_otros_count} otros")
+        if reclasificados:
+            print(f"  [!] Clasificados por contenido (nombre no coincide): {reclasificados}")
         print(f"  [OK] Archivos DETALLE: {len(detalle_files)}")
         print(f"  [OK] Archivos GLOSA: {len(glosa_files)}")
         
@@ -304,6 +410,63 @@ class CoosaludProcessor(BaseProcessor):
         
         return pairs
     
+    # ==================== CLASIFICACIÓN DE ARCHIVOS ====================
+    
+    def _tipo_por_nombre(self, fname: str) -> Optional[str]:
+        """Tipo de archivo según palabras clave del nombre (en minúsculas)"""
+        if any(kw in fname for kw in self.DEVOLUCION_KEYWORDS):
+            return self.TIPO_DEVOLUCION
+        if any(kw in fname for kw in self.DETALLE_KEYWORDS):
+            return self.TIPO_DETALLE
+        if any(kw in fname for kw in self.GLOSA_KEYWORDS):
+            return self.TIPO_GLOSA
+        return None
+    
+    def _tipo_por_encabezado(self, encabezado: Optional[List[object]]) -> Optional[str]:
+        """
+        Tipo de archivo según las columnas de su encabezado
+        
+        - GLOSA: tiene codigo_glosa o justificacion_glosa
+        - DETALLE: tiene codigo_servicio (y ninguna columna de glosa)
+        - DEVOLUCION: sin firma de glosa ni detalle, alguna columna menciona
+          devolución (los reportes "Glosas y Devoluciones" traen columnas como
+          valor_devolucion también en GLOSAS y DETALLE)
+        
+        Returns:
+            Tipo o None si las columnas no son de ningún archivo conocido
+        """
+        columnas = nombres_normalizados(encabezado)
+        if any(col in columnas for col in self.FIRMA_GLOSA):
+            return self.TIPO_GLOSA
+        if any(col in columnas for col in self.FIRMA_DETALLE):
+            return self.TIPO_DETALLE
+        if any(kw in col for col in columnas for kw in self.DEVOLUCION_KEYWORDS):
+            return self.TIPO_DEVOLUCION
+        return None
+    
+    def _tipo_por_contenido(self, ruta: str) -> Optional[str]:
+        """
+        Tipo de archivo leyendo solo la primera fila (openpyxl read_only)
+        
+        El resultado se memoriza por hash del contenido: el mismo adjunto
+        descargado otra vez o con otro nombre no se vuelve a abrir.
+        
+        Returns:
+            Tipo o None si el archivo no se pudo leer o no se reconoce
+        """
+        if os.path.splitext(ruta)[1].lower() not in EXTENSIONES_OPENPYXL:
+            return None
+        try:
+            clave = CacheResultados.hash_archivo(ruta)
+        except OSError:
+            return None
+        
+        if clave not in _TIPOS_POR_CONTENIDO:
+            if len(_TIPOS_POR_CONTENIDO) >= _MAX_TIPOS_POR_CONTENIDO:
+                _TIPOS_POR_CONTENIDO.clear()
+            _TIPOS_POR_CONTENIDO[clave] = self._tipo_por_encabezado(leer_encabezado(ruta))
+        return _TIPOS_POR_CONTENIDO[clave]
+    
     def identify_files(self, file_paths: List[str]) -> Dict[str, str]:
         """
         Método legacy - identifica solo UN par (para compatibilidad)
@@ -432,6 +595,131 @@ class CoosaludProcessor(BaseProcessor):
                 return col
         return None
     
+    # ==================== AGREGACIÓN DE GLOSAS ====================
+    
+    def _homologar_codigos_glosa(self, codigos: pd.Series) -> pd.Series:
+        """
+        Homologa una columna de codigo_glosa según resolución 2284
+        
+        Arma la tabla de traducción solo para los valores distintos del lote
+        (con _homologar_codigo_glosa, memorizado) y la aplica a todas las filas.
+        
+        Returns:
+            Serie de texto con el mismo índice ('' para vacíos y NaN)
+        """
+        valores = codigos.astype(object)
+        posiciones, unicos = pd.factorize(valores)  # NaN queda como -1
+        homologados = np.array(
+            [self._homologar_codigo_glosa(str(codigo)) for codigo in unicos] + [""], dtype=object
+        )
+        return pd.Series(homologados[posiciones], index=codigos.index)
+    
+    def _prioridad_glosa(self, codigos: pd.Series, ta: Optional[int] = None) -> np.ndarray:
+        """
+        Rango de prioridad por prefijo de codigo_glosa (menor = mayor prioridad)
+        
+        FA=0, SO=1, AU=2, CO=3, CL=4. Si se indica ``ta``, los TA toman ese
+        rango; el resto (y TA sin ``ta``) queda en PRIORIDAD_GLOSA_OTROS.
+        """
+        prefijos = codigos.str[:2].str.upper()
+        rangos = {prefijo: i for i, prefijo in enumerate(self.PRIORIDAD_GLOSA)}
+        if ta is not None:
+            rangos["TA"] = ta
+        return prefijos.map(rangos).fillna(self.PRIORIDAD_GLOSA_OTROS).to_numpy(dtype=np.int64)
+    
+    def _agregar_glosas(self, glosa_df: pd.DataFrame, claves: List[str], orden: str,
+                        filas: Optional[pd.Series] = None) -> pd.DataFrame:
+        """
+        Una fila por grupo de ``claves`` con el codigo_glosa prioritario y las
+        justificaciones unidas con " // "
+        
+        codigo_glosa: entre los códigos homologados no vacíos del grupo se toma
+        el de mayor prioridad FA > SO > AU > CO > CL > TA > otros (a igual
+        prioridad, el primero en aparecer).
+        
+        justificacion_glosa (textos no vacíos, sin repetir) según ``orden``:
+        - "ta_al_final": ordena por (es TA, código) y luego quita repetidas
+        - "prioridad": quita repetidas y luego ordena por FA > SO > AU > CO > CL > resto
+        En ambos casos el orden original se conserva a igualdad de criterio.
+        
+        Args:
+            glosa_df: DataFrame de glosa
+            claves: Columnas de agrupación (las filas con clave NaN se descartan)
+            orden: "ta_al_final" o "prioridad"
+            filas: Máscara de filas que aportan códigos y justificaciones. Los
+                grupos sin filas marcadas quedan con ambas columnas en ""
+            
+        Returns:
+            DataFrame ordenado por claves, o vacío si no hay grupos
+        """
+        validas = glosa_df[claves].notna().all(axis=1)
+        df = glosa_df[validas]
+        if df.empty:
+            return pd.DataFrame()
+        
+        grupo = df.groupby(claves, sort=True).ngroup().to_numpy()
+        total_grupos = int(grupo.max()) + 1
+        posiciones = np.arange(len(df))
+        
+        # Valores de las claves: primera fila de cada grupo, en el orden de groupby
+        primera = np.full(total_grupos, len(df))
+        np.minimum.at(primera, grupo, posiciones)
+        resultado: Dict[str, Any] = {col: df[col].iloc[primera].tolist() for col in claves}
+        
+        aporta = np.ones(len(df), dtype=bool) if filas is None else filas[validas].to_numpy(dtype=bool)
+        has_codigo = "codigo_glosa" in df.columns
+        has_justif = "justificacion_glosa" in df.columns
+        
+        codigos = self._homologar_codigos_glosa(df["codigo_glosa"]) if has_codigo else pd.Series("", index=df.index, dtype=object)
+        
+        if has_codigo:
+            # Mejor código por grupo: menor (prioridad, posición) entre los no vacíos
+            candidatos = aporta & (codigos != "").to_numpy()
+            rango = self._prioridad_glosa(codigos, ta=len(self.PRIORIDAD_GLOSA))
+            idx = posiciones[candidatos]
+            idx = idx[np.lexsort((idx, rango[idx], grupo[idx]))]
+            mejores = pd.Series(codigos.to_numpy()[idx], index=grupo[idx])
+            mejores = mejores[~mejores.index.duplicated()]
+            resultado["codigo_glosa"] = mejores.reindex(range(total_grupos), fill_value="").tolist()
+        
+        if has_justif:
+            justif = df["justificacion_glosa"]
+            presentes = justif.notna().to_numpy()
+            textos = np.array([str(v).strip() if presente else "" for v, presente in
+                               zip(justif.to_numpy(dtype=object), presentes, strict=True)], dtype=object)
+            con_texto = aporta & presentes & (textos != "")
+            
+            idx = posiciones[con_texto]
+            texto_idx = textos[idx]
+            codigo_idx = codigos.to_numpy()[idx]
+            if orden == "ta_al_final":
+                es_ta = np.array([c[:2].upper() == "TA" for c in codigo_idx], dtype=bool)
+                orden_idx = np.lexsort((idx, codigo_idx.astype(str), es_ta, grupo[idx]))
+                items = pd.DataFrame({"grupo": grupo[idx][orden_idx], "texto": texto_idx[orden_idx]})
+                items = items[~items.duplicated()]
+            else:
+                items = pd.DataFrame({"grupo": grupo[idx], "texto": texto_idx, "pos": idx,
+                                      "rango": self._prioridad_glosa(pd.Series(codigo_idx, dtype=object))})
+                items = items[~items.duplicated(["grupo", "texto"])]
+                items = items.sort_values(["grupo", "rango", "pos"], kind="stable")
+            
+            unidas = items.groupby("grupo", sort=False)["texto"].agg(" // ".join)
+            resultado["justificacion_glosa"] = unidas.reindex(range(total_grupos), fill_value="").tolist()
+        
+        # Grupos sin filas que aporten: codigo_glosa y justificacion_glosa en "" aunque
+        # la glosa no tenga esa columna (en el resto de grupos queda NaN)
+        if filas is not None:
+            sin_filas = np.bincount(grupo[aporta], minlength=total_grupos) == 0
+            if sin_filas.any():
+                for col in ("codigo_glosa", "justificacion_glosa"):
+                    if col not in resultado:
+                        resultado[col] = ["" if vacio else np.nan for vacio in sin_filas]
+                if sin_filas[0]:
+                    orden_columnas = claves + ["codigo_glosa", "justificacion_glosa"]
+                    resultado = {col: resultado[col] for col in orden_columnas}
+        
+        return pd.DataFrame(resultado)
+    
     def _prepare_glosa_merge(self, glosa_df: pd.DataFrame) -> pd.DataFrame:
         """
         Prepara el DataFrame de glosa para el merge, manejando duplicados:
@@ -454,82 +742,8 @@ class CoosaludProcessor(BaseProcessor):
         if not has_codigo and not has_justif:
             return pd.DataFrame()
         
-        # Agrupar por id_detalle
-        result_rows = []
-        
-        for id_det, group in glosa_df.groupby("id_detalle"):
-            row = {"id_detalle": id_det}
-            
-            # Procesar codigo_glosa con homologación y priorización
-            if has_codigo:
-                codigos_raw = group["codigo_glosa"].dropna().astype(str).tolist()
-                
-                # Homologar todos los códigos
-                codigos_homologados = []
-                for codigo in codigos_raw:
-                    codigo_homolog = self._homologar_codigo_glosa(codigo)
-                    if codigo_homolog and codigo_homolog not in codigos_homologados:
-                        codigos_homologados.append(codigo_homolog)
-                
-                # Priorización: FA, SO, AU, CO, CL primero, TA al final
-                # Orden de prioridad (mayor a menor): FA > SO > AU > CO > CL > TA
-                prioritarios = ["FA", "SO", "AU", "CO", "CL"]
-                codigo_final = None
-                
-                # Buscar primer código que NO sea TA
-                for prefijo in prioritarios:
-                    for codigo in codigos_homologados:
-                        if codigo.upper().startswith(prefijo):
-                            codigo_final = codigo
-                            break
-                    if codigo_final:
-                        break
-                
-                # Si no hay prioritarios, buscar TA
-                if not codigo_final:
-                    for codigo in codigos_homologados:
-                        if codigo.upper().startswith("TA"):
-                            codigo_final = codigo
-                            break
-                
-                # Si aún no hay nada, tomar el primero disponible
-                if not codigo_final and codigos_homologados:
-                    codigo_final = codigos_homologados[0]
-                
-                row["codigo_glosa"] = codigo_final if codigo_final else ""
-            
-            # Procesar justificacion_glosa concatenando con //
-            # Orden: primero observaciones de códigos NO-TA, luego las de TA
-            if has_justif:
-                # Obtener justificaciones con sus códigos para ordenar
-                justif_con_codigo = []
-                for _, row_glosa in group.iterrows():
-                    justif = row_glosa.get("justificacion_glosa")
-                    codigo_raw = row_glosa.get("codigo_glosa", "")
-                    
-                    if pd.notna(justif) and str(justif).strip():
-                        codigo_homolog = self._homologar_codigo_glosa(str(codigo_raw)) if pd.notna(codigo_raw) else ""
-                        es_ta = codigo_homolog.upper().startswith("TA") if codigo_homolog else False
-                        justif_con_codigo.append({
-                            "justificacion": str(justif).strip(),
-                            "es_ta": es_ta,
-                            "codigo": codigo_homolog
-                        })
-                
-                # Ordenar: primero NO-TA, luego TA
-                justif_ordenadas = sorted(justif_con_codigo, key=lambda x: (x["es_ta"], x["codigo"]))
-                
-                # Eliminar duplicados manteniendo orden
-                justif_unicas = []
-                for item in justif_ordenadas:
-                    if item["justificacion"] not in justif_unicas:
-                        justif_unicas.append(item["justificacion"])
-                
-                row["justificacion_glosa"] = " // ".join(justif_unicas) if justif_unicas else ""
-            
-            result_rows.append(row)
-        
-        return pd.DataFrame(result_rows)
+        # Justificaciones: primero las de códigos NO-TA, luego las de TA
+        return self._agregar_glosas(glosa_df, ["id_detalle"], orden="ta_al_final")
     
     def _prepare_glosa_merge_multi(self, glosa_df: pd.DataFrame, merge_columns: List[str]) -> pd.DataFrame:
         """
@@ -559,106 +773,20 @@ class CoosaludProcessor(BaseProcessor):
         print(f"   [DEBUG] Agrupando glosa por: {merge_columns}")
         print(f"   [DEBUG] Total filas en glosa: {len(glosa_df)}")
         
-        # Agrupar por las columnas de merge
-        result_rows = []
+        # Justificaciones: primero las de códigos NO-TA, luego las de TA
+        result = self._agregar_glosas(glosa_df, list(merge_columns), orden="ta_al_final")
         
-        for keys, group in glosa_df.groupby(merge_columns):
-            # Crear diccionario base con las columnas de merge
-            row: Dict[str, Any] = {}
-            if isinstance(keys, tuple):
-                row = dict(zip(merge_columns, keys))
-            else:
-                row = {merge_columns[0]: keys}
-            
-            print(f"   [DEBUG] Procesando grupo {keys} con {len(group)} filas")
-            
-            # Si hay más de 3 filas en el grupo, mostrar advertencia
-            if len(group) > 3:
-                print(f"   [WARN] Grupo con {len(group)} observaciones - esto puede resultar en texto muy largo")
-            
-            # Procesar codigo_glosa con homologación y priorización
-            if has_codigo:
-                codigos_raw = group["codigo_glosa"].dropna().astype(str).tolist()
-                print(f"     [DEBUG] Códigos raw: {codigos_raw}")
-                
-                # Homologar todos los códigos
-                codigos_homologados = []
-                for codigo in codigos_raw:
-                    codigo_homolog = self._homologar_codigo_glosa(codigo)
-                    if codigo_homolog and codigo_homolog not in codigos_homologados:
-                        codigos_homologados.append(codigo_homolog)
-                
-                print(f"     [DEBUG] Códigos homologados: {codigos_homologados}")
-                
-                # Priorización: FA, SO, AU, CO, CL primero, TA al final
-                prioritarios = ["FA", "SO", "AU", "CO", "CL"]
-                codigo_final = None
-                
-                for prefijo in prioritarios:
-                    for codigo in codigos_homologados:
-                        if codigo.upper().startswith(prefijo):
-                            codigo_final = codigo
-                            break
-                    if codigo_final:
-                        break
-                
-                if not codigo_final:
-                    for codigo in codigos_homologados:
-                        if codigo.upper().startswith("TA"):
-                            codigo_final = codigo
-                            break
-                
-                if not codigo_final and codigos_homologados:
-                    codigo_final = codigos_homologados[0]
-                
-                row["codigo_glosa"] = codigo_final if codigo_final else ""
-                print(f"     [DEBUG] Código final seleccionado: {codigo_final}")
-            
-            # Procesar justificacion_glosa concatenando correctamente
-            if has_justif:
-                # Obtener todas las justificaciones válidas
-                justificaciones_raw = []
-                for _, row_glosa in group.iterrows():
-                    justif = row_glosa.get("justificacion_glosa")
-                    codigo_raw = row_glosa.get("codigo_glosa", "")
-                    
-                    if pd.notna(justif) and str(justif).strip():
-                        justif_text = str(justif).strip()
-                        codigo_homolog = self._homologar_codigo_glosa(str(codigo_raw)) if pd.notna(codigo_raw) else ""
-                        es_ta = codigo_homolog.upper().startswith("TA") if codigo_homolog else False
-                        justificaciones_raw.append({
-                            "justificacion": justif_text,
-                            "es_ta": es_ta,
-                            "codigo": codigo_homolog
-                        })
-                
-                print(f"     [DEBUG] Justificaciones encontradas: {len(justificaciones_raw)}")
-                
-                # Ordenar: primero NO-TA, luego TA
-                justif_ordenadas = sorted(justificaciones_raw, key=lambda x: (x["es_ta"], x["codigo"]))
-                
-                # Eliminar duplicados manteniendo orden
-                justif_unicas = []
-                for item in justif_ordenadas:
-                    justif_text = item["justificacion"]
-                    if justif_text not in justif_unicas:
-                        justif_unicas.append(justif_text)
-                
-                # Concatenar con " // "
-                justificacion_final = " // ".join(justif_unicas) if justif_unicas else ""
-                row["justificacion_glosa"] = justificacion_final
-                
-                # Advertir sobre justificaciones muy largas
-                if len(justificacion_final) > 2000:
-                    print(f"     [WARN] Justificación muy larga ({len(justificacion_final)} caracteres) para grupo {keys}")
-                    print(f"     [HINT] Considere revisar si el merge debe ser más específico (incluir código de servicio)")
-                
-                print(f"     [DEBUG] Justificación final (longitud: {len(justificacion_final)}): {justificacion_final[:150]}...")
-            
-            result_rows.append(row)
+        # Advertir sobre justificaciones muy largas
+        if has_justif and not result.empty:
+            largas = result[result["justificacion_glosa"].str.len() > 2000]
+            for _, row in largas.iterrows():
+                keys = tuple(row[c] for c in merge_columns)
+                print(f"     [WARN] Justificación muy larga ({len(row['justificacion_glosa'])} caracteres) para grupo {keys}")
+            if not largas.empty:
+                print(f"     [HINT] Considere revisar si el merge debe ser más específico (incluir código de servicio)")
         
-        print(f"   [DEBUG] Grupos procesados: {len(result_rows)}")
-        return pd.DataFrame(result_rows)
+        print(f"   [DEBUG] Grupos procesados: {len(result)}")
+        return result
     
     def _prepare_glosa_merge_by_id_detalle(self, glosa_df: pd.DataFrame, merge_columns: List[str]) -> pd.DataFrame:
         """
@@ -690,143 +818,23 @@ class CoosaludProcessor(BaseProcessor):
         
         # Analizar frecuencia de id_detalle
         id_detalle_counts = glosa_df['id_detalle'].value_counts()
-        id_repetidos = id_detalle_counts[id_detalle_counts >= 2].index.tolist()
-        id_unicos = id_detalle_counts[id_detalle_counts == 1].index.tolist()
+        repetido = glosa_df['id_detalle'].map(id_detalle_counts).fillna(0).to_numpy() >= 2
         
-        print(f"   [INFO] ID_detalle repetidos (2+): {len(id_repetidos)}")
-        print(f"   [INFO] ID_detalle únicos: {len(id_unicos)}")
+        print(f"   [INFO] ID_detalle repetidos (2+): {int((id_detalle_counts >= 2).sum())}")
+        print(f"   [INFO] ID_detalle únicos: {int((id_detalle_counts == 1).sum())}")
         
-        result_rows = []
+        # Por grupo: las filas de IDs repetidos; si no hay, solo las del ID de la primera fila
+        grupo = glosa_df.groupby(merge_columns, sort=False).ngroup().fillna(-1).to_numpy(dtype=np.int64)
+        ids = glosa_df['id_detalle'].to_numpy(dtype=object)
+        primera_fila = pd.Series(np.arange(len(glosa_df))).groupby(grupo).transform('min').to_numpy()
+        con_repetidos = pd.Series(repetido).groupby(grupo).transform('any').to_numpy(dtype=bool)
+        es_primer_id = ids == ids[primera_fila]  # Un primer ID NaN no selecciona filas
+        filas = pd.Series(np.where(con_repetidos, repetido, es_primer_id), index=glosa_df.index)
         
-        # Agrupar por las columnas de merge
-        for keys, group in glosa_df.groupby(merge_columns):
-            # Crear diccionario base con las columnas de merge
-            row: Dict[str, Any] = {}
-            if isinstance(keys, tuple):
-                row = dict(zip(merge_columns, keys))
-            else:
-                row = {merge_columns[0]: keys}
-            
-            # Obtener todos los id_detalle en este grupo
-            ids_en_grupo = group['id_detalle'].unique()
-            
-            # Separar según la regla
-            ids_para_pegar = []  # IDs que aparecen 2+ veces
-            ids_individuales = []  # IDs que aparecen solo 1 vez
-            
-            for id_det in ids_en_grupo:
-                if id_det in id_repetidos:
-                    ids_para_pegar.append(id_det)
-                else:
-                    ids_individuales.append(id_det)
-            
-            print(f"   [DEBUG] Grupo {keys}: IDs a pegar: {len(ids_para_pegar)}, IDs individuales: {len(ids_individuales)}")
-            
-            # Filtrar observaciones según la regla
-            filas_a_procesar = pd.DataFrame()
-            
-            if ids_para_pegar:
-                # Solo incluir observaciones de IDs repetidos
-                filas_a_procesar = group[group['id_detalle'].isin(ids_para_pegar)]
-                print(f"     [RULE] Usando {len(filas_a_procesar)} observaciones de IDs repetidos")
-            elif ids_individuales:
-                # Si no hay IDs repetidos, tomar solo uno de los individuales
-                primer_id = ids_individuales[0]
-                filas_a_procesar = group[group['id_detalle'] == primer_id]
-                print(f"     [RULE] Usando 1 observación del ID individual: {primer_id}")
-            
-            if filas_a_procesar.empty:
-                print(f"     [WARN] No hay observaciones para procesar en grupo {keys}")
-                row["codigo_glosa"] = ""
-                row["justificacion_glosa"] = ""
-            else:
-                # Procesar codigo_glosa con homologación y priorización
-                if has_codigo:
-                    codigos_raw = filas_a_procesar["codigo_glosa"].dropna().astype(str).tolist()
-                    
-                    # Homologar códigos
-                    codigos_homologados = []
-                    for codigo in codigos_raw:
-                        codigo_homolog = self._homologar_codigo_glosa(codigo)
-                        if codigo_homolog and codigo_homolog not in codigos_homologados:
-                            codigos_homologados.append(codigo_homolog)
-                    
-                    # Priorización: FA, SO, AU, CO, CL primero, TA al final
-                    prioritarios = ["FA", "SO", "AU", "CO", "CL"]
-                    codigo_final = None
-                    
-                    for prefijo in prioritarios:
-                        for codigo in codigos_homologados:
-                            if codigo.upper().startswith(prefijo):
-                                codigo_final = codigo
-                                break
-                        if codigo_final:
-                            break
-                    
-                    if not codigo_final:
-                        for codigo in codigos_homologados:
-                            if codigo.upper().startswith("TA"):
-                                codigo_final = codigo
-                                break
-                    
-                    if not codigo_final and codigos_homologados:
-                        codigo_final = codigos_homologados[0]
-                    
-                    row["codigo_glosa"] = codigo_final if codigo_final else ""
-                
-                # Procesar justificacion_glosa - ORDENAR por prioridad de códigos
-                if has_justif:
-                    # Crear lista de justificaciones con sus códigos asociados
-                    justif_con_codigo = []
-                    for _, row_glosa in filas_a_procesar.iterrows():
-                        justif = row_glosa.get("justificacion_glosa")
-                        codigo_raw = row_glosa.get("codigo_glosa", "")
-                        
-                        if pd.notna(justif) and str(justif).strip():
-                            justif_text = str(justif).strip()
-                            codigo_homolog = self._homologar_codigo_glosa(str(codigo_raw)) if pd.notna(codigo_raw) else ""
-                            
-                            # Solo agregar si no existe (evitar duplicados)
-                            ya_existe = any(item["justificacion"] == justif_text for item in justif_con_codigo)
-                            if not ya_existe:
-                                justif_con_codigo.append({
-                                    "justificacion": justif_text,
-                                    "codigo": codigo_homolog,
-                                    "es_ta": codigo_homolog.upper().startswith("TA") if codigo_homolog else True
-                                })
-                    
-                    # ORDENAR según prioridad: FA > SO > AU > CO > CL > TA
-                    prioritarios = ["FA", "SO", "AU", "CO", "CL"]
-                    
-                    def get_priority(item):
-                        codigo = item["codigo"].upper() if item["codigo"] else ""
-                        
-                        # Asignar prioridad numérica (menor = mayor prioridad)
-                        for i, prefijo in enumerate(prioritarios):
-                            if codigo.startswith(prefijo):
-                                return i  # FA=0, SO=1, AU=2, CO=3, CL=4
-                        
-                        # TA o desconocido = menor prioridad
-                        return 999
-                    
-                    # Ordenar justificaciones por prioridad
-                    justif_ordenadas = sorted(justif_con_codigo, key=get_priority)
-                    
-                    # Extraer solo los textos de justificación ordenados
-                    justificaciones_finales = [item["justificacion"] for item in justif_ordenadas]
-                    
-                    # Concatenar con " // "
-                    justificacion_final = " // ".join(justificaciones_finales) if justificaciones_finales else ""
-                    row["justificacion_glosa"] = justificacion_final
-                    
-                    print(f"     [DEBUG] Justificaciones procesadas: {len(justificaciones_finales)}")
-                    if justificaciones_finales:
-                        print(f"     [DEBUG] Orden aplicado: {[item['codigo'] for item in justif_ordenadas]}")
-            
-            result_rows.append(row)
+        result = self._agregar_glosas(glosa_df, list(merge_columns), orden="prioridad", filas=filas)
         
-        print(f"   [DEBUG] Grupos procesados con nueva regla: {len(result_rows)}")
-        return pd.DataFrame(result_rows)
+        print(f"   [DEBUG] Grupos procesados con nueva regla: {len(result)}")
+        return result
     
     def _prepare_glosa_merge_by_id_detalle_direct(self, glosa_df: pd.DataFrame) -> pd.DataFrame:
         """
@@ -858,95 +866,11 @@ class CoosaludProcessor(BaseProcessor):
             print(f"   [ERROR] No existen columnas de observaciones")
             return pd.DataFrame()
         
-        result_rows = []
-        
-        # Agrupar por id_detalle (columna directa de conexión)
-        for id_detalle, group in glosa_df.groupby("id_detalle"):
-            row = {"id_detalle": id_detalle}
-            
-            # Procesar codigo_glosa con homologación y priorización
-            if has_codigo:
-                codigos_raw = group["codigo_glosa"].dropna().astype(str).tolist()
-                
-                # Homologar todos los códigos
-                codigos_homologados = []
-                for codigo in codigos_raw:
-                    codigo_homolog = self._homologar_codigo_glosa(codigo)
-                    if codigo_homolog and codigo_homolog not in codigos_homologados:
-                        codigos_homologados.append(codigo_homolog)
-                
-                # Priorización: FA, SO, AU, CO, CL primero, TA al final
-                prioritarios = ["FA", "SO", "AU", "CO", "CL"]
-                codigo_final = None
-                
-                for prefijo in prioritarios:
-                    for codigo in codigos_homologados:
-                        if codigo.upper().startswith(prefijo):
-                            codigo_final = codigo
-                            break
-                    if codigo_final:
-                        break
-                
-                if not codigo_final:
-                    for codigo in codigos_homologados:
-                        if codigo.upper().startswith("TA"):
-                            codigo_final = codigo
-                            break
-                
-                if not codigo_final and codigos_homologados:
-                    codigo_final = codigos_homologados[0]
-                
-                row["codigo_glosa"] = codigo_final if codigo_final else ""
-            
-            # Procesar justificacion_glosa - ORDENAR por prioridad de códigos
-            if has_justif:
-                # Crear lista de justificaciones con sus códigos asociados
-                justif_con_codigo = []
-                for _, row_glosa in group.iterrows():
-                    justif = row_glosa.get("justificacion_glosa")
-                    codigo_raw = row_glosa.get("codigo_glosa", "")
-                    
-                    if pd.notna(justif) and str(justif).strip():
-                        justif_text = str(justif).strip()
-                        codigo_homolog = self._homologar_codigo_glosa(str(codigo_raw)) if pd.notna(codigo_raw) else ""
-                        
-                        # Solo agregar si no existe (evitar duplicados)
-                        ya_existe = any(item["justificacion"] == justif_text for item in justif_con_codigo)
-                        if not ya_existe:
-                            justif_con_codigo.append({
-                                "justificacion": justif_text,
-                                "codigo": codigo_homolog,
-                                "es_ta": codigo_homolog.upper().startswith("TA") if codigo_homolog else True
-                            })
-                
-                # ORDENAR según prioridad: FA > SO > AU > CO > CL > TA
-                prioritarios = ["FA", "SO", "AU", "CO", "CL"]
-                
-                def get_priority(item):
-                    codigo = item["codigo"].upper() if item["codigo"] else ""
-                    
-                    # Asignar prioridad numérica (menor = mayor prioridad)
-                    for i, prefijo in enumerate(prioritarios):
-                        if codigo.startswith(prefijo):
-                            return i  # FA=0, SO=1, AU=2, CO=3, CL=4
-                    
-                    # TA o desconocido = menor prioridad
-                    return 999
-                
-                # Ordenar justificaciones por prioridad
-                justif_ordenadas = sorted(justif_con_codigo, key=get_priority)
-                
-                # Extraer solo los textos de justificación ordenados
-                justificaciones_finales = [item["justificacion"] for item in justif_ordenadas]
-                
-                # Concatenar SOLO las justificaciones de este id_detalle específico
-                justificacion_final = " // ".join(justificaciones_finales) if justificaciones_finales else ""
-                row["justificacion_glosa"] = justificacion_final
-            
-            result_rows.append(row)
+        # Justificaciones sin repetir, ordenadas por prioridad: FA > SO > AU > CO > CL > TA
+        result = self._agregar_glosas(glosa_df, ["id_detalle"], orden="prioridad")
         
-        print(f"   [INFO] Procesados {len(result_rows)} id_detalle únicos")
-        return pd.DataFrame(result_rows)
+        print(f"   [INFO] Procesados {len(result)} id_detalle únicos")
+        return result
     
     def homologate(self, data: Dict[str, pd.DataFrame]) -> Dict[str, pd.DataFrame]:
         """
@@ -1066,8 +990,8 @@ class CoosaludProcessor(BaseProcessor):
             result_df["Codigo no homologado"] = result_df[code_column]
             return result_df
         
-        # 3. Crear diccionario de homologación
-        homolog_dict = self._build_homologation_dict()
+        # 3. Diccionario de homologación (se arma una vez por homologador)
+        homolog_dict = self._diccionario_homologacion()
         if not homolog_dict:
             result_df["Codigo homologado DGH"] = ""
             result_df["Codigo no homologado"] = result_df[code_column]
@@ -1152,25 +1076,172 @@ class CoosaludProcessor(BaseProcessor):
         
         print(f"   Columna en homologador (destino): {homolog_dgh_col}")
         
-        # Crear diccionario
-        homolog_dict = {}
-        if self.homologador_df is not None:
-            for _, row in self.homologador_df.iterrows():
-                codigo_erp = self._normalize_code(row[homolog_code_col])
-                codigo_dgh = self._normalize_code(row[homolog_dgh_col])
-                
-                # Validar código origen
-                if not codigo_erp or codigo_erp in ['NAN', 'NONE', '']:
-                    continue
-                
-                # Si el código destino es "0" o inválido, NO agregarlo al diccionario
-                # Esto hará que estos códigos vayan a "Codigo no homologado"
-                if codigo_dgh and codigo_dgh not in ['0', 'NAN', 'NONE', '']:
-                    homolog_dict[codigo_erp] = codigo_dgh
-                # Si no hay código destino válido, no agregar al diccionario
-                # (no hacer autoasignación)
+        # Crear diccionario (normalizando cada columna completa)
+        codigos_erp = self._normalizar_codigos(self.homologador_df[homolog_code_col])
+        codigos_dgh = self._normalizar_codigos(self.homologador_df[homolog_dgh_col])
+        
+        # Validar código origen y destino: si el destino es "0" o inválido NO se agrega,
+        # así esos códigos van a "Codigo no homologado" (no hay autoasignación)
+        validos = (
+            ~codigos_erp.isin(['NAN', 'NONE', ''])
+            & ~codigos_dgh.isin(['0', 'NAN', 'NONE', ''])
+        )
+        
+        # Si un código se repite prevalece la última fila
+        return dict(zip(codigos_erp[validos], codigos_dgh[validos], strict=True))
+    
+    def _diccionario_homologacion(self) -> Dict[str, str]:
+        """
+        Diccionario de homologación del homologador cargado (se arma una vez)
+        
+        Se reconstruye solo si homologador_df cambia (otro archivo cargado).
+        """
+        if self.homologador_df is None:
+            return {}
+        if self._homolog_dict is None or self._homolog_dict_origen is not self.homologador_df:
+            self._homolog_dict = self._build_homologation_dict()
+            self._homolog_dict_origen = self.homologador_df
+        return self._homolog_dict
+    
+    # ==================== REGISTRO DE HOMOLOGADORES ====================
+    
+    @staticmethod
+    def _firma_homologador(ruta: str) -> Optional[str]:
+        """
+        Firma barata del homologador o None si no existe el XLSX
+        
+        Combina (mtime, tamaño) del snapshot y de su journal: un guardado del
+        CRUD solo agrega al journal y también debe invalidar la entrada.
+        """
+        firma = HomologacionService.firma_tabla(ruta)
+        # Sin snapshot la firma empieza vacía ("|<journal>")
+        return None if firma.startswith("|") else firma
+    
+    @classmethod
+    def _leer_entrada_homologador(cls, ruta: str, firma: str) -> Dict[str, Any]:
+        """
+        Lee el homologador y arma su diccionario normalizado
+        
+        La firma se toma antes de leer: si el archivo cambia durante la lectura
+        la entrada queda vencida y se vuelve a leer en la siguiente carga.
+        """
+        # Snapshot + journal: incluye los guardados del CRUD aún no compactados
+        df = HomologacionService.leer_tabla_vigente(ruta)
+        if df is None:
+            raise FileNotFoundError(ruta)
+        constructor = cls()
+        constructor.homologador_df = df
+        diccionario = constructor._diccionario_homologacion()
+        return {
+            'firma': firma,
+            'df': df,
+            'dict': diccionario,
+            'warnings': list(constructor.warnings),
+        }
+    
+    @classmethod
+    def obtener_homologador(cls, ruta: str) -> Dict[str, Any]:
+        """
+        Entrada del registro para un homologador, leyéndolo solo si cambió
+        
+        Si hay un refresco en segundo plano de la misma ruta se espera a que
+        termine en lugar de leer el archivo dos veces.
+        
+        Returns:
+            Dict con 'firma', 'df', 'dict' (código ERP -> código DGH) y 'warnings'
+            
+        Raises:
+            FileNotFoundError: Si el archivo no existe
+        """
+        with cls._registro_lock:
+            refresco = cls._refrescos_en_curso.get(ruta)
+        if refresco is not None and refresco is not threading.current_thread():
+            refresco.join()
+        
+        firma = cls._firma_homologador(ruta)
+        if firma is None:
+            raise FileNotFoundError(ruta)
+        
+        with cls._registro_lock:
+            entrada = cls._registro_homologadores.get(ruta)
+        if entrada is not None and entrada['firma'] == firma:
+            return entrada
+        
+        entrada = cls._leer_entrada_homologador(ruta, firma)
+        with cls._registro_lock:
+            cls._registro_homologadores[ruta] = entrada
+        return entrada
+    
+    @classmethod
+    def precargar_homologador(cls, ruta: str) -> Optional[threading.Thread]:
+        """
+        Refresca en segundo plano la entrada del registro si falta o cambió
+        
+        Pensado para llamarse al elegir la EPS, mientras se buscan los correos,
+        de modo que el procesamiento encuentre el homologador ya armado.
+        
+        La firma se revisa dentro del hilo (consultar la red puede tardar): si
+        la entrada está vigente el hilo termina sin leer el archivo.
+        
+        Returns:
+            Hilo del refresco, o None si ya hay uno en curso para esa ruta
+        """
+        with cls._registro_lock:
+            if ruta in cls._refrescos_en_curso:
+                return None
+            
+            def refrescar():
+                try:
+                    entrada = cls.obtener_homologador(ruta)
+                    print(f"[COOSALUD] Homologador listo: {len(entrada['df'])} registros")
+                except Exception as e:
+                    print(f"[COOSALUD] [!] No se pudo precargar el homologador: {e}")
+                finally:
+                    with cls._registro_lock:
+                        cls._refrescos_en_curso.pop(ruta, None)
+            
+            hilo = threading.Thread(target=refrescar, daemon=True)
+            cls._refrescos_en_curso[ruta] = hilo
+            hilo.start()
+        return hilo
+    
+    @classmethod
+    def limpiar_registro_homologadores(cls):
+        """Limpia el registro de homologadores (útil para testing o reinicios)"""
+        with cls._registro_lock:
+            cls._registro_homologadores.clear()
+    
+    def load_homologador(self) -> bool:
+        """
+        Carga el homologador desde el registro compartido entre instancias
+        
+        El archivo solo se lee la primera vez o cuando cambia su firma
+        (mtime y tamaño del XLSX y de su journal); las demás instancias
+        reciben el DataFrame y el diccionario de homologación ya armados.
+        
+        Returns:
+            bool: True si se cargó correctamente, False si hubo error.
+        """
+        if not self.homologador_path:
+            self.errors.append("No se especificó ruta de homologador")
+            return False
+        
+        if not os.path.exists(self.homologador_path):
+            self.errors.append(f"Archivo de homologador no encontrado: {self.homologador_path}")
+            return False
+        
+        try:
+            entrada = self.obtener_homologador(self.homologador_path)
+        except Exception as e:
+            self.errors.append(f"Error al cargar homologador: {str(e)}")
+            return False
         
-        return homolog_dict
+        self.homologador_df = entrada['df']
+        self._homolog_dict = entrada['dict']
+        self._homolog_dict_origen = entrada['df']
+        self.warnings.extend(entrada['warnings'])
+        print(f"✓ Homologador cargado: {len(self.homologador_df)} registros")
+        return True
     
     def _normalize_code(self, code) -> str:
         """
@@ -1195,6 +1266,35 @@ class CoosaludProcessor(BaseProcessor):
         # Si es string, limpiar y normalizar
         return str(code).strip().upper()
     
+    def _normalizar_codigos(self, codigos: pd.Series) -> pd.Series:
+        """
+        _normalize_code sobre una columna completa (cada valor distinto una sola vez)
+        
+        Returns:
+            Serie de texto con el mismo índice ('' para NaN)
+        """
+        posiciones, unicos = pd.factorize(codigos.astype(object))  # NaN queda como -1
+        normalizados = np.array([self._normalize_code(codigo) for codigo in unicos] + [""], dtype=object)
+        return pd.Series(normalizados[posiciones], index=codigos.index, dtype=object)
+    
+    def _homologar_codigos(self, df: pd.DataFrame, code_column: str,
+                           homolog_dict: Dict[str, str]) -> Tuple[List[str], List[str]]:
+        """
+        Homologa la columna de códigos con un solo map sobre los códigos normalizados
+        
+        Returns:
+            Tupla de listas (Codigo homologado DGH, Codigo no homologado): el código
+            DGH o '' y, para los no homologados, el código original como texto
+        """
+        codigos = df[code_column]
+        homologados = self._normalizar_codigos(codigos).map(homolog_dict)
+        encontrados = homologados.notna().to_numpy()
+        
+        originales = codigos.astype(object).where(codigos.notna(), "").map(str).to_numpy(dtype=object)
+        no_homologados = np.where(encontrados, "", originales)
+        
+        return homologados.where(encontrados, "").tolist(), no_homologados.tolist()
+    
     def _apply_homologation(self, df: pd.DataFrame, code_column: str, homolog_dict: Dict[str, str]) -> pd.DataFrame:
         """
         Aplica la homologación al DataFrame.
@@ -1204,20 +1304,8 @@ class CoosaludProcessor(BaseProcessor):
             code_column: Nombre de la columna con códigos
             homolog_dict: Diccionario de homologación
         """
-        codigos_homologados = []
-        codigos_no_homologados = []
-        
-        for codigo in df[code_column]:
-            codigo_norm = self._normalize_code(codigo)
-            
-            # Si el código normalizado es válido y existe en el diccionario
-            if codigo_norm and codigo_norm in homolog_dict:
-                codigos_homologados.append(homolog_dict[codigo_norm])
-                codigos_no_homologados.append("")
-            else:
-                # No homologado: dejar vacío el homologado y poner el original en no_homologado
-                codigos_homologados.append("")
-                codigos_no_homologados.append(str(codigo) if not pd.isna(codigo) else "")
+        # No homologado: vacío en el homologado y el original en no_homologado
+        codigos_homologados, codigos_no_homologados = self._homologar_codigos(df, code_column, homolog_dict)
         
         df["Codigo homologado DGH"] = codigos_homologados
         df["Codigo no homologado"] = codigos_no_homologados
@@ -1278,16 +1366,17 @@ class CoosaludProcessor(BaseProcessor):
             True si se guardó correctamente
         """
         try:
-            with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
-                # Hoja 1: Detalles
-                if "detalle" in data:
-                    data["detalle"].to_excel(writer, sheet_name="Detalles", index=False)
-                    print(f"   [OK] Hoja 'Detalles' guardada ({len(data['detalle'])} filas)")
-                
-                # Hoja 2: Glosa
-                if "glosa" in data:
-                    data["glosa"].to_excel(writer, sheet_name="Glosa", index=False)
-                    print(f"   [OK] Hoja 'Glosa' guardada ({len(data['glosa'])} filas)")
+            hojas = {}
+            # Hoja 1: Detalles
+            if "detalle" in data:
+                hojas["Detalles"] = data["detalle"]
+            # Hoja 2: Glosa
+            if "glosa" in data:
+                hojas["Glosa"] = data["glosa"]
+            
+            excel_writer.escribir_excel(output_path, hojas)
+            for nombre, df in hojas.items():
+                print(f"   [OK] Hoja '{nombre}' guardada ({len(df)} filas)")
             
             print(f"\n[SAVE] Archivo guardado: {output_path}")
             return True
@@ -1296,7 +1385,11 @@ class CoosaludProcessor(BaseProcessor):
             self.errors.append(f"Error al guardar archivo: {str(e)}")
             return False
     
-    def process_glosas(self, file_paths: List[str], output_dir: Optional[str] = None, email_date: Optional[str] = None, attachment_service=None) -> Tuple[Optional[Dict[str, pd.DataFrame]], str]:
+    def process_glosas(self, file_paths: List[str], output_dir: Optional[str] = None, email_date: Optional[str] = None, attachment_service=None,
+                       paralelo: Optional[bool] = None,
+                       progress_callback: Optional[Callable[[int, int, str], None]] = None,
+                       max_workers: Optional[int] = None, por_lotes: Optional[bool] = None,
+                       pares_por_lote: Optional[int] = None) -> Tuple[Optional[Dict[str, object]], str]:
         """
         Método principal para procesar archivos de GLOSAS de Coosalud
         Procesa TODOS los pares de archivos (DETALLE + GLOSA) y los combina
@@ -1306,9 +1399,19 @@ class CoosaludProcessor(BaseProcessor):
             output_dir: Directorio de salida (opcional)
             email_date: Fecha del correo recibido (formato string) - DEPRECATED, usar attachment_service
             attachment_service: Servicio de adjuntos con metadatos de fechas por archivo
+            paralelo: True para leer los pares en procesos, False para leer en serie.
+                None decide según PARALELO_MIN_PARES y los núcleos disponibles
+            progress_callback: Función callback(completados, total, factura) llamada
+                al terminar de leer cada par
+            max_workers: Procesos del pool (por defecto, uno por núcleo)
+            por_lotes: True para procesar por lotes escribiendo las salidas a medida
+                que avanza (requiere output_dir), False para combinar todo en memoria.
+                None decide según LOTE_MIN_PARES
+            pares_por_lote: Pares por lote (por defecto PARES_POR_LOTE)
             
         Returns:
-            Tupla con (Diccionario de DataFrames combinados, mensaje de estado)
+            Tupla con (Diccionario de DataFrames combinados, mensaje de estado).
+            Por lotes, el diccionario es un resumen con filas escritas y archivos
         """
         self.errors = []
         self.warnings = []
@@ -1335,41 +1438,24 @@ class CoosaludProcessor(BaseProcessor):
         
         print(f"\n[PROC] Procesando {len(pairs)} pares de archivos...")
         
-        # 3. Procesar cada par y acumular resultados
-        all_detalles = []
-        all_glosas = []
-        pares_procesados = 0
-        pares_error = 0
+        if por_lotes is None:
+            por_lotes = len(pairs) >= self.LOTE_MIN_PARES
+        if por_lotes and not output_dir:
+            print("  [!] El procesamiento por lotes requiere directorio de salida, se procesa completo")
+            por_lotes = False
         
-        for i, pair in enumerate(pairs):
-            factura = pair.get("factura", f"Par {i+1}")
-            
-            # Mostrar progreso
-            if (i + 1) % 10 == 0 or i == 0:
-                print(f"  ... procesando par {i + 1}/{len(pairs)} ({factura})")
-            
-            try:
-                # Cargar archivos del par
-                detalle_df = pd.read_excel(pair["detalle"])
-                glosa_df = pd.read_excel(pair["glosa"])
-                
-                # Agregar columna de factura para tracking
-                detalle_df["_FACTURA"] = factura
-                glosa_df["_FACTURA"] = factura
-                
-                # Homologar el detalle
-                detalle_result = self._homologate_detalle_silent(detalle_df)
-                
-                # Agregar fecha de proceso a glosa
-                glosa_df["FECHA_PROCESO"] = self.processing_date
-                
-                all_detalles.append(detalle_result)
-                all_glosas.append(glosa_df)
-                pares_procesados += 1
-                
-            except Exception as e:
-                pares_error += 1
-                self.warnings.append(f"Error en {factura}: {str(e)}")
+        # Fecha del correo por factura (o una sola fecha para todos los registros)
+        fechas_correo = self._preparar_fechas_correo(pairs, email_date, attachment_service)
+        
+        if por_lotes:
+            return self._process_glosas_por_lotes(
+                pairs, output_dir, email_date, fechas_correo,
+                pares_por_lote or self.PARES_POR_LOTE, paralelo, progress_callback, max_workers
+            )
+        
+        # 3. Leer los pares (en serie o en paralelo) y acumular resultados en orden
+        cargados = self._cargar_pares(pairs, paralelo, progress_callback, max_workers)
+        all_detalles, all_glosas, pares_procesados, pares_error = self._reunir_pares(pairs, cargados)
         
         print(f"\n[STATS] Pares procesados: {pares_procesados}/{len(pairs)}")
         if pares_error > 0:
@@ -1384,134 +1470,8 @@ class CoosaludProcessor(BaseProcessor):
         combined_detalle = pd.concat(all_detalles, ignore_index=True)
         combined_glosa = pd.concat(all_glosas, ignore_index=True)
         
-        # Agregar fecha del correo INDIVIDUAL por archivo
-        if attachment_service:
-            print(f"\n{'='*60}")
-            print(f"[INFO] ASIGNANDO FECHAS DE CORREOS A ARCHIVOS")
-            print(f"{'='*60}")
-            print(f"[DEBUG] Total metadatos disponibles: {len(attachment_service.file_metadata)}")
-            
-            # Mostrar muestra de metadatos disponibles
-            if attachment_service.file_metadata:
-                print(f"[DEBUG] Muestra de metadatos (primeros 5):")
-                for idx, (path, meta) in enumerate(list(attachment_service.file_metadata.items())[:5]):
-                    import os
-                    print(f"   {idx+1}. {os.path.basename(path)}")
-                    print(f"      Fecha: {meta.get('email_date', 'SIN FECHA')}")
-            else:
-                print(f"[WARN] ⚠️ NO HAY METADATOS - Los archivos no tienen fecha asociada")
-                print(f"[WARN] Esto ocurre cuando los archivos fueron descargados antes de implementar el sistema de metadatos")
-            
-            # Crear columna de fecha vacía
-            combined_detalle["fecha_correo"] = ""
-            
-            archivos_con_fecha = 0
-            archivos_sin_fecha = 0
-            
-            # Asignar fecha según el archivo de origen (_FACTURA)
-            print(f"\n[PROC] Procesando {len(pairs)} pares de archivos...")
-            for i, pair in enumerate(pairs):
-                factura = pair.get("factura", f"Par {i+1}")
-                detalle_path = pair["detalle"]
-                
-                # Debug para primeros 3
-                if i < 3:
-                    import os
-                    print(f"\n[{i+1}] Factura: {factura}")
-                    print(f"    Archivo: {os.path.basename(detalle_path)}")
-                
-                # Buscar metadatos del archivo DETALLE
-                metadata = None
-                if attachment_service:  # type: ignore
-                    metadata = attachment_service.get_file_metadata(detalle_path)
-                
-                if i < 3:
-                    print(f"    Metadata: {'✅ ENCONTRADO' if metadata else '❌ NO ENCONTRADO'}")
-                    if metadata:
-                        print(f"    Fecha: {metadata.get('email_date', 'SIN CAMPO email_date')}")
-                
-                if metadata and "email_date" in metadata:
-                    file_date = metadata["email_date"]
-                    # Asignar fecha a todos los registros de esta factura
-                    mask = combined_detalle["_FACTURA"] == factura
-                    combined_detalle.loc[mask, "fecha_correo"] = file_date
-                    archivos_con_fecha += 1
-                else:
-                    # Fallback a fecha actual para este archivo
-                    fallback_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                    mask = combined_detalle["_FACTURA"] == factura
-                    combined_detalle.loc[mask, "fecha_correo"] = fallback_date
-                    archivos_sin_fecha += 1
-            
-            print(f"\n[RESULTADO] Archivos procesados:")
-            print(f"   ✅ Con fecha del correo: {archivos_con_fecha}/{len(pairs)}")
-            print(f"   ⚠️ Sin fecha (usando actual): {archivos_sin_fecha}/{len(pairs)}")
-            
-            if archivos_sin_fecha > 0:
-                print(f"\n[AYUDA] Para que las fechas funcionen correctamente:")
-                print(f"   1. Los archivos antiguos NO tienen metadatos")
-                print(f"   2. Haz una nueva búsqueda de correos para descargar archivos con metadatos")
-                print(f"   3. Los archivos antiguos se limpian automáticamente al buscar correos")
-            print(f"{'='*60}\n")
-        elif email_date:
-            # Fallback antiguo: usar fecha global (menos preciso)
-            combined_detalle["fecha_correo"] = email_date
-            print(f"[INFO] ✅ Fecha global agregada: {email_date}")
-        else:
-            # Fallback a fecha actual
-            combined_detalle["fecha_correo"] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            print(f"[WARN] ⚠️ No se recibió fecha del correo, usando fecha actual")
-        
-        # Merge usando columnas comunes para traer codigo_glosa y justificacion_glosa a Detalles
-        print(f"\n[PROC] Agregando codigo_glosa y justificacion_glosa a Detalles...")
-        
-        # DEBUG: Mostrar columnas disponibles
-        print(f"   [DEBUG] Columnas en DETALLE combinado: {list(combined_detalle.columns)}")
-        print(f"   [DEBUG] Columnas en GLOSA combinado: {list(combined_glosa.columns)}")
-        
-        # Buscar columnas comunes para merge
-        detalle_cols = set(col.lower() for col in combined_detalle.columns)
-        glosa_cols = set(col.lower() for col in combined_glosa.columns)
-        
-        # Mapeo para preservar case original
-        detalle_col_map = {c.lower(): c for c in combined_detalle.columns}
-        glosa_col_map = {c.lower(): c for c in combined_glosa.columns}
-        
-        # PRIORIDAD: usar id_detalle si existe en ambos (conexión directa)
-        if 'id_detalle' in detalle_cols and 'id_detalle' in glosa_cols:
-            print(f"   [INFO] Usando id_detalle para merge directo (conexión específica)")
-            
-            if "codigo_glosa" in combined_glosa.columns or "justificacion_glosa" in combined_glosa.columns:
-                # Preparar glosa para merge por id_detalle
-                glosa_merge = self._prepare_glosa_merge_by_id_detalle_direct(combined_glosa)
-                
-                if not glosa_merge.empty:
-                    # Hacer merge directo por id_detalle
-                    combined_detalle = combined_detalle.merge(
-                        glosa_merge, 
-                        on='id_detalle', 
-                        how='left'
-                    )
-                    
-                    cols_added = []
-                    if "codigo_glosa" in glosa_merge.columns:
-                        cols_added.append("codigo_glosa")
-                    if "justificacion_glosa" in glosa_merge.columns:
-                        cols_added.append("justificacion_glosa")
-                        
-                    print(f"   [OK] Columnas agregadas por id_detalle: {cols_added}")
-                else:
-                    print(f"   [!] No se pudo preparar datos de glosa para merge")
-                    combined_detalle["codigo_glosa"] = ""
-                    combined_detalle["justificacion_glosa"] = ""
-            else:
-                print(f"   [!] No se encontraron columnas codigo_glosa o justificacion_glosa")
-                combined_detalle["codigo_glosa"] = ""
-                combined_detalle["justificacion_glosa"] = ""
-        else:
-            print(f"   [WARN] No existe id_detalle en ambos archivos, no se puede hacer merge específico")
-            combined_detalle["codigo_glosa"] = ""
-            combined_detalle["justificacion_glosa"] = ""
+        self._asignar_fecha_correo(combined_detalle, fechas_correo)
+        combined_detalle = self._agregar_justificaciones(combined_detalle, combined_glosa)
         
         result_data = {
             "detalle": combined_detalle,
@@ -1547,12 +1507,490 @@ class CoosaludProcessor(BaseProcessor):
                 return result_data, f"[WARNING] Procesado pero error al guardar: {'; '.join(self.errors)}"
         
         return result_data, f"[OK] Procesados {pares_procesados} pares de archivos"
+    
+    def _reunir_pares(self, pairs: List[Dict[str, str]],
+                      cargados: List[ParCargado]) -> Tuple[List[pd.DataFrame], List[pd.DataFrame], int, int]:
+        """
+        Homologa el detalle de cada par leído y marca la glosa con FECHA_PROCESO
+        
+        Los pares con error quedan en warnings.
+        
+        Returns:
+            Tupla (detalles, glosas, pares procesados, pares con error)
+        """
+        detalles = []
+        glosas = []
+        pares_procesados = 0
+        pares_error = 0
+        
+        for i, (pair, (detalle_df, glosa_df, error)) in enumerate(zip(pairs, cargados, strict=True)):
+            factura = pair.get("factura", f"Par {i+1}")
+            
+            if error is not None:
+                pares_error += 1
+                self.warnings.append(f"Error en {factura}: {error}")
+                continue
+            
+            try:
+                # Homologar el detalle
+                detalle_result = self._homologate_detalle_silent(detalle_df)
+                
+                # Agregar fecha de proceso a glosa
+                glosa_df["FECHA_PROCESO"] = self.processing_date
+                
+                detalles.append(detalle_result)
+                glosas.append(glosa_df)
+                pares_procesados += 1
+                
+            except Exception as e:
+                pares_error += 1
+                self.warnings.append(f"Error en {factura}: {str(e)}")
+        
+        return detalles, glosas, pares_procesados, pares_error
+    
+    def _agregar_justificaciones(self, detalle: pd.DataFrame, glosa: pd.DataFrame,
+                                 detallado: bool = True) -> pd.DataFrame:
+        """
+        Trae codigo_glosa y justificacion_glosa de GLOSA a Detalles por id_detalle
+        
+        Args:
+            detalle: Detalles (con fecha_correo)
+            glosa: Glosas de los mismos pares
+            detallado: False para omitir los mensajes de depuración (lotes siguientes)
+            
+        Returns:
+            Detalles con codigo_glosa y justificacion_glosa
+        """
+        # Merge usando columnas comunes para traer codigo_glosa y justificacion_glosa a Detalles
+        if detallado:
+            print(f"\n[PROC] Agregando codigo_glosa y justificacion_glosa a Detalles...")
+            
+            # DEBUG: Mostrar columnas disponibles
+            print(f"   [DEBUG] Columnas en DETALLE combinado: {list(detalle.columns)}")
+            print(f"   [DEBUG] Columnas en GLOSA combinado: {list(glosa.columns)}")
+        
+        # Buscar columnas comunes para merge
+        detalle_cols = set(col.lower() for col in detalle.columns)
+        glosa_cols = set(col.lower() for col in glosa.columns)
+        
+        # PRIORIDAD: usar id_detalle si existe en ambos (conexión directa)
+        if 'id_detalle' in detalle_cols and 'id_detalle' in glosa_cols:
+            if detallado:
+                print(f"   [INFO] Usando id_detalle para merge directo (conexión específica)")
+            
+            if "codigo_glosa" in glosa.columns or "justificacion_glosa" in glosa.columns:
+                # Preparar glosa para merge por id_detalle
+                glosa_merge = self._prepare_glosa_merge_by_id_detalle_direct(glosa)
+                
+                if not glosa_merge.empty:
+                    # Hacer merge directo por id_detalle
+                    detalle = detalle.merge(
+                        glosa_merge, 
+                        on='id_detalle', 
+                        how='left'
+                    )
+                    
+                    cols_added = []
+                    if "codigo_glosa" in glosa_merge.columns:
+                        cols_added.append("codigo_glosa")
+                    if "justificacion_glosa" in glosa_merge.columns:
+                        cols_added.append("justificacion_glosa")
+                    
+                    if detallado:
+                        print(f"   [OK] Columnas agregadas por id_detalle: {cols_added}")
+                else:
+                    print(f"   [!] No se pudo preparar datos de glosa para merge")
+                    detalle["codigo_glosa"] = ""
+                    detalle["justificacion_glosa"] = ""
+            else:
+                print(f"   [!] No se encontraron columnas codigo_glosa o justificacion_glosa")
+                detalle["codigo_glosa"] = ""
+                detalle["justificacion_glosa"] = ""
+        else:
+            print(f"   [WARN] No existe id_detalle en ambos archivos, no se puede hacer merge específico")
+            detalle["codigo_glosa"] = ""
+            detalle["justificacion_glosa"] = ""
+        
+        return detalle
+    
+    # ==================== PROCESAMIENTO POR LOTES ====================
+    
+    def _process_glosas_por_lotes(self, pairs: List[Dict[str, str]], output_dir: str, email_date: Optional[str],
+                                  fechas_correo: Union[Dict[str, str], str], pares_por_lote: int,
+                                  paralelo: Optional[bool] = None, progress_callback=None,
+                                  max_workers: Optional[int] = None) -> Tuple[Optional[Dict[str, object]], str]:
+        """
+        Procesa los pares por lotes y vuelca cada lote a los archivos de salida
+        
+        Cada lote se lee, homologa y une con sus justificaciones (id_detalle es
+        propio de cada par) y sus filas se agregan a las hojas "Detalles" y
+        "Glosa" del consolidado y "OBJECIONES" del archivo de objeciones. Solo
+        un lote está en memoria a la vez. Cada par es una factura, así que la
+        combinación AU/TA por factura no cruza lotes; CDCONSEC sigue numerando
+        las facturas de todo el proceso.
+        
+        Las hojas toman las columnas del primer lote (los archivos de Coosalud
+        tienen estructura fija); columnas nuevas en lotes posteriores se omiten
+        y quedan en warnings.
+        
+        Returns:
+            Tupla (resumen con filas escritas y rutas de salida, mensaje de estado)
+        """
+        total = len(pairs)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output_path = os.path.join(output_dir, f"COOSALUD_GLOSAS_{timestamp}.xlsx")
+        objeciones_path = os.path.join(output_dir, f"Objeciones_COOSALUD_{timestamp}.xlsx")
+        
+        print(f"\n[PROC] Procesamiento por lotes de {pares_por_lote} pares")
+        
+        consolidado = None
+        archivo_objeciones = None
+        consecutivos: Dict[str, Any] = {}
+        omitidas: Dict[str, set] = {"Detalles": set(), "Glosa": set()}
+        pares_procesados = 0
+        pares_error = 0
+        
+        try:
+            for inicio in range(0, total, pares_por_lote):
+                lote = pairs[inicio:inicio + pares_por_lote]
+                
+                progreso = None
+                if progress_callback:
+                    def progreso(completados, _total, factura, inicio=inicio):
+                        progress_callback(inicio + completados, total, factura)
+                
+                cargados = self._cargar_pares(lote, paralelo, progreso, max_workers)
+                detalles, glosas, procesados, errores = self._reunir_pares(lote, cargados)
+                pares_procesados += procesados
+                pares_error += errores
+                del cargados
+                
+                if not detalles:
+                    continue
+                
+                detalle = pd.concat(detalles, ignore_index=True)
+                glosa = pd.concat(glosas, ignore_index=True)
+                del detalles, glosas
+                
+                self._asignar_fecha_correo(detalle, fechas_correo)
+                detalle = self._agregar_justificaciones(detalle, glosa, detallado=consolidado is None)
+                df_obj = self._construir_objeciones(detalle, email_date, consecutivos, detallado=consolidado is None)
+                
+                if consolidado is None:
+                    consolidado = excel_writer.EscritorExcel(output_path)
+                    archivo_objeciones = excel_writer.EscritorExcel(objeciones_path)
+                
+                for hoja, df in (("Detalles", detalle), ("Glosa", glosa)):
+                    columnas = consolidado.columnas(hoja)
+                    if columnas:
+                        omitidas[hoja].update(c for c in df.columns if c not in columnas)
+                    consolidado.agregar(hoja, df)
+                archivo_objeciones.agregar("OBJECIONES", df_obj)
+                
+                print(f"  [OK] Lote {inicio // pares_por_lote + 1}: pares {inicio + 1}-{inicio + len(lote)} de {total}")
+        except Exception as e:
+            self.errors.append(f"Error procesando por lotes: {str(e)}")
+            return None, f"[ERROR] Error: {'; '.join(self.errors)}"
+        finally:
+            for escritor in (consolidado, archivo_objeciones):
+                if escritor is not None:
+                    escritor.cerrar()
+        
+        print(f"\n[STATS] Pares procesados: {pares_procesados}/{total}")
+        if pares_error > 0:
+            print(f"  [!] Pares con error: {pares_error}")
+        
+        if consolidado is None:
+            self.errors.append("No se pudo procesar ningún par de archivos")
+            return None, f"[ERROR] Error: {'; '.join(self.errors)}"
+        
+        for hoja, columnas in omitidas.items():
+            if columnas:
+                self.warnings.append(f"Columnas omitidas en hoja '{hoja}': {', '.join(map(str, sorted(columnas, key=str)))}")
+        
+        resumen = {
+            "detalle_filas": consolidado.filas("Detalles"),
+            "glosa_filas": consolidado.filas("Glosa"),
+            "objeciones_filas": archivo_objeciones.filas("OBJECIONES"),
+            "archivos": [output_path, objeciones_path],
+        }
+        for nombre, filas in (("Detalles", resumen["detalle_filas"]), ("Glosa", resumen["glosa_filas"])):
+            print(f"   [OK] Hoja '{nombre}' guardada ({filas} filas)")
+        print(f"\n[SAVE] Archivo guardado: {output_path}")
+        print(f"✅ Objeciones generadas: {objeciones_path} ({resumen['objeciones_filas']} registros)")
+        
+        files_str = ", ".join(os.path.basename(ruta) for ruta in resumen["archivos"])
+        return resumen, f"[OK] Procesado exitosamente. Archivos: {files_str}"
+    
+    # ==================== FECHAS DE CORREO ====================
+    
+    def _preparar_fechas_correo(self, pairs: List[Dict[str, str]], email_date: Optional[str] = None,
+                                attachment_service=None) -> Union[Dict[str, str], str]:
+        """
+        Determina la fecha del correo de los registros de cada par
+        
+        Returns:
+            Diccionario factura -> fecha si hay attachment_service; si no, la
+            fecha única para todos los registros (email_date o la actual)
+        """
+        if not attachment_service:
+            if email_date:
+                # Fallback antiguo: usar fecha global (menos preciso)
+                print(f"[INFO] ✅ Fecha global agregada: {email_date}")
+                return email_date
+            # Fallback a fecha actual
+            print(f"[WARN] ⚠️ No se recibió fecha del correo, usando fecha actual")
+            return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        
+        # Fecha del correo INDIVIDUAL por archivo
+        print(f"\n{'='*60}")
+        print(f"[INFO] ASIGNANDO FECHAS DE CORREOS A ARCHIVOS")
+        print(f"{'='*60}")
+        print(f"[DEBUG] Total metadatos disponibles: {len(attachment_service.file_metadata)}")
+        
+        # Mostrar muestra de metadatos disponibles
+        if attachment_service.file_metadata:
+            print(f"[DEBUG] Muestra de metadatos (primeros 5):")
+            for idx, (path, meta) in enumerate(list(attachment_service.file_metadata.items())[:5]):
+                print(f"   {idx+1}. {os.path.basename(path)}")
+                print(f"      Fecha: {meta.get('email_date', 'SIN FECHA')}")
+        else:
+            print(f"[WARN] ⚠️ NO HAY METADATOS - Los archivos no tienen fecha asociada")
+            print(f"[WARN] Esto ocurre cuando los archivos fueron descargados antes de implementar el sistema de metadatos")
+        
+        fechas, archivos_con_fecha, archivos_sin_fecha = self._fechas_correo_por_factura(pairs, attachment_service)
+        
+        print(f"\n[RESULTADO] Archivos procesados:")
+        print(f"   ✅ Con fecha del correo: {archivos_con_fecha}/{len(pairs)}")
+        print(f"   ⚠️ Sin fecha (usando actual): {archivos_sin_fecha}/{len(pairs)}")
         
+        if archivos_sin_fecha > 0:
+            print(f"\n[AYUDA] Para que las fechas funcionen correctamente:")
+            print(f"   1. Los archivos antiguos NO tienen metadatos")
+            print(f"   2. Haz una nueva búsqueda de correos para descargar archivos con metadatos")
+            print(f"   3. Los archivos antiguos se limpian automáticamente al buscar correos")
+        print(f"{'='*60}\n")
+        
+        return fechas
+    
+    def _asignar_fecha_correo(self, detalle: pd.DataFrame, fechas_correo: Union[Dict[str, str], str]) -> None:
+        """Agrega la columna fecha_correo al detalle (por _FACTURA o fecha única)"""
+        if isinstance(fechas_correo, dict):
+            # Una sola asignación por columna según el archivo de origen (_FACTURA)
+            detalle["fecha_correo"] = detalle["_FACTURA"].map(fechas_correo).fillna("")
+        else:
+            detalle["fecha_correo"] = fechas_correo
+    
+    def _fechas_correo_por_factura(self, pairs: List[Dict[str, str]],
+                                   attachment_service) -> Tuple[Dict[str, str], int, int]:
+        """
+        Arma el mapa factura -> fecha del correo a partir de los metadatos de adjuntos
+        
+        La fecha de cada par sale del archivo DETALLE en attachment_service.file_metadata.
+        Los pares sin fecha usan la fecha actual. Si dos pares comparten factura
+        prevalece el último, como al asignar por par.
+        
+        Returns:
+            Tupla (fechas por factura, pares con fecha, pares sin fecha)
+        """
+        metadatos = attachment_service.file_metadata or {}
+        fecha_actual = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        
+        fechas: Dict[str, str] = {}
+        con_fecha = 0
+        sin_fecha = 0
+        
+        print(f"\n[PROC] Procesando {len(pairs)} pares de archivos...")
+        for i, pair in enumerate(pairs):
+            factura = pair.get("factura", f"Par {i+1}")
+            metadata = metadatos.get(pair["detalle"])
+            
+            # Debug para primeros 3
+            if i < 3:
+                print(f"\n[{i+1}] Factura: {factura}")
+                print(f"    Archivo: {os.path.basename(pair['detalle'])}")
+                print(f"    Metadata: {'✅ ENCONTRADO' if metadata else '❌ NO ENCONTRADO'}")
+                if metadata:
+                    print(f"    Fecha: {metadata.get('email_date', 'SIN CAMPO email_date')}")
+            
+            if metadata and "email_date" in metadata:
+                fechas[factura] = metadata["email_date"]
+                con_fecha += 1
+            else:
+                fechas[factura] = fecha_actual
+                sin_fecha += 1
+        
+        return fechas, con_fecha, sin_fecha
+    
+    # ==================== LECTURA DE PARES ====================
+    
+    def _cargar_pares(self, pairs: List[Dict[str, str]], paralelo: Optional[bool] = None,
+                      progress_callback=None, max_workers: Optional[int] = None) -> List[ParCargado]:
+        """
+        Lee todos los pares en serie o en paralelo según su cantidad
+        
+        Con caché activa solo se leen los pares nuevos o modificados; el
+        resto se toma de lo guardado para el mismo contenido de DETALLE y
+        GLOSAS.
+        
+        Returns:
+            Lista (detalle, glosa, error) en el mismo orden de pairs
+        """
+        total = len(pairs)
+        facturas = [pair.get("factura", f"Par {i+1}") for i, pair in enumerate(pairs)]
+        
+        cargados, claves = self._cargar_pares_desde_cache(pairs, facturas)
+        pendientes = [i for i, cargado in enumerate(cargados) if cargado is None]
+        en_cache = total - len(pendientes)
+        
+        avance = progress_callback
+        if en_cache:
+            print(f"  [CACHE] {en_cache}/{total} pares recuperados de cache")
+            if progress_callback:
+                progress_callback(en_cache, total, facturas[-1])
+                
+                # El avance de la lectura se cuenta después de los pares en caché
+                def avance(completados, _total, factura):
+                    progress_callback(en_cache + completados, total, factura)
+        
+        if not pendientes:
+            return cargados
+        
+        pares_pendientes = [pairs[i] for i in pendientes]
+        facturas_pendientes = [facturas[i] for i in pendientes]
+        nucleos = os.cpu_count() or 1
+        if paralelo is None:
+            paralelo = len(pendientes) >= self.PARALELO_MIN_PARES and nucleos > 1
+        
+        leidos: List[Optional[ParCargado]] = [None] * len(pendientes)
+        sin_leer = list(range(len(pendientes)))
+        if paralelo and len(pendientes) > 1:
+            leidos, sin_leer = self._cargar_pares_en_paralelo(pares_pendientes, facturas_pendientes,
+                                                              max_workers or min(nucleos, len(pendientes)),
+                                                              avance)
+        if sin_leer:
+            # Lo que el pool no alcanzó a leer se lee en serie, sin repetir lo ya leído
+            hechos = len(pendientes) - len(sin_leer)
+            avance_serie = avance
+            if hechos and avance:
+                def avance_serie(completados, _total, factura):
+                    avance(hechos + completados, len(pendientes), factura)
+            
+            en_serie = self._cargar_pares_en_serie([pares_pendientes[j] for j in sin_leer],
+                                                   [facturas_pendientes[j] for j in sin_leer], avance_serie)
+            for j, cargado in zip(sin_leer, en_serie, strict=True):
+                leidos[j] = cargado
+        
+        for i, cargado in zip(pendientes, leidos, strict=True):
+            cargados[i] = cargado
+            detalle_df, glosa_df, error = cargado
+            if self.cache is not None and error is None:
+                self.cache.guardar(self._clave_hoja(claves[i], "detalle"), detalle_df)
+                self.cache.guardar(self._clave_hoja(claves[i], "glosa"), glosa_df)
+        if self.cache is not None:
+            self.cache.podar()
+        return cargados
+    
+    def _cargar_pares_desde_cache(self, pairs: List[Dict[str, str]],
+                                  facturas: List[str]) -> Tuple[List[Optional[ParCargado]], List[Optional[str]]]:
+        """
+        Pares guardados en caché (DETALLE y GLOSAS tal como se leyeron)
+        
+        La clave combina el contenido de ambos archivos y la factura
+        (_FACTURA). Un par solo sale de la caché si están sus dos hojas.
+        
+        Returns:
+            Tupla (par cargado o None por par, clave de caché por par)
+        """
+        cargados: List[Optional[ParCargado]] = [None] * len(pairs)
+        claves: List[Optional[str]] = [None] * len(pairs)
+        if self.cache is None:
+            return cargados, claves
+        
+        for i, (pair, factura) in enumerate(zip(pairs, facturas, strict=True)):
+            claves[i] = self.cache.clave_archivos([pair["detalle"], pair["glosa"]], factura)
+            if claves[i] is None:
+                continue
+            detalle_df = self.cache.obtener(self._clave_hoja(claves[i], "detalle"))
+            glosa_df = self.cache.obtener(self._clave_hoja(claves[i], "glosa")) if detalle_df is not None else None
+            if detalle_df is not None and glosa_df is not None:
+                cargados[i] = (detalle_df, glosa_df, None)
+        return cargados, claves
+    
+    @staticmethod
+    def _clave_hoja(clave: Optional[str], hoja: str) -> Optional[str]:
+        """Clave de caché de una de las hojas de un par"""
+        return f"{clave}-{hoja}" if clave else None
+    
+    def _cargar_pares_en_serie(self, pairs: List[Dict[str, str]], facturas: List[str],
+                               progress_callback=None) -> List[ParCargado]:
+        """Lee los pares uno a uno en este proceso"""
+        total = len(pairs)
+        cargados = []
+        
+        for i, (pair, factura) in enumerate(zip(pairs, facturas, strict=True)):
+            # Mostrar progreso
+            if (i + 1) % 10 == 0 or i == 0:
+                print(f"  ... procesando par {i + 1}/{total} ({factura})")
             
+            cargados.append(_cargar_par(pair, factura))
+            if progress_callback:
+                progress_callback(i + 1, total, factura)
+        
+        return cargados
+    
+    def _cargar_pares_en_paralelo(self, pairs: List[Dict[str, str]], facturas: List[str], max_workers: int,
+                                  progress_callback=None) -> Tuple[List[Optional[ParCargado]], List[int]]:
+        """
+        Reparte la lectura de los pares en un ProcessPoolExecutor
+        
+        Los resultados se reordenan según pairs para que la salida sea la
+        misma que en serie. Si el pool no pudo crearse o se rompió a mitad
+        de la lectura, los pares ya leídos se conservan.
+        
+        Returns:
+            Tupla (par cargado o None por par, posiciones de los pares sin
+            resultado que hay que leer en serie)
+        """
+        total = len(pairs)
+        cargados: List[Optional[ParCargado]] = [None] * total
+        print(f"  [PROC] Lectura en paralelo con {max_workers} procesos")
+        
+        try:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                futuros = {
+                    executor.submit(_cargar_par, pair, factura): i
+                    for i, (pair, factura) in enumerate(zip(pairs, facturas, strict=True))
+                }
+                
+                completados = 0
+                for futuro in as_completed(futuros):
+                    i = futuros[futuro]
+                    try:
+                        cargados[i] = futuro.result()
+                    except BrokenExecutor:
+                        continue  # El pool se rompió: el par queda para leerse en serie
+                    except Exception as e:
+                        cargados[i] = (None, None, str(e))
+                    
+                    completados += 1
+                    if completados % 10 == 0 or completados == total:
+                        print(f"  ... pares leídos {completados}/{total}")
+                    if progress_callback:
+                        progress_callback(completados, total, facturas[i])
+        except (OSError, RuntimeError) as e:
+            print(f"  [!] No se pudo usar procesamiento paralelo ({e})")
+        
+        sin_leer = [i for i, cargado in enumerate(cargados) if cargado is None]
+        if sin_leer:
+            print(f"  [!] {len(sin_leer)}/{total} pares sin leer en paralelo, se leen en serie")
+        return cargados, sin_leer
+    
     def _homologate_detalle_silent(self, df: pd.DataFrame) -> pd.DataFrame:
         """
-        Versión silenciosa de _homologate_detalle (sin prints)
-        Para uso en procesamiento masivo
+        Versión silenciosa de _homologate_detalle (sin prints por archivo)
+        Para uso en procesamiento masivo: el diccionario se arma una sola vez
+        por homologador y cada detalle se homologa con un map de columna
         """
         result_df = df.copy()
         result_df["FECHA_PROCESO"] = self.processing_date
@@ -1560,7 +1998,7 @@ class CoosaludProcessor(BaseProcessor):
         code_column = self.DETALLE_CODE_COLUMN
         if code_column not in result_df.columns:
             for col in result_df.columns:
-                if "codigo" in col.lower() and "servicio" in col.lower():
+                if "codigo" in str(col).lower() and "servicio" in str(col).lower():
                     code_column = col
                     break
             else:
@@ -1573,53 +2011,11 @@ class CoosaludProcessor(BaseProcessor):
             result_df["Codigo no homologado"] = result_df[code_column]
             return result_df
         
-        # Buscar columnas del homologador
-        homolog_code_col = None
-        homolog_dgh_col = None
-        
-        for col in self.homologador_df.columns:
-            col_str = str(col).strip()
-            if col_str == "Código Servicio de la ERP":
-                homolog_code_col = col
-            elif col_str == "Código producto en DGH":
-                homolog_dgh_col = col
-        
-        if homolog_code_col is None:
-            homolog_code_col = self.homologador_df.columns[0]
-        if homolog_dgh_col is None:
-            homolog_dgh_col = self.homologador_df.columns[1] if len(self.homologador_df.columns) > 1 else self.homologador_df.columns[0]
-        
-        # Crear diccionario de homologación
-        homolog_dict = {}
-        for _, row in self.homologador_df.iterrows():
-            codigo_erp = self._normalize_code(row[homolog_code_col])
-            codigo_dgh = self._normalize_code(row[homolog_dgh_col])
-            
-            # Validar código origen
-            if not codigo_erp or codigo_erp in ['NAN', 'NONE', '']:
-                continue
-            
-            # Solo agregar si el código destino es válido (no "0")
-            if codigo_dgh and codigo_dgh not in ['0', 'NAN', 'NONE', '']:
-                homolog_dict[codigo_erp] = codigo_dgh
-        
-        # Homologar
-        codigos_homologados = []
-        codigos_no_homologados = []
-        
-        for codigo in result_df[code_column]:
-            codigo_norm = self._normalize_code(codigo)
-            
-            # Si el código normalizado es válido y existe en el diccionario
-            if codigo_norm and codigo_norm in homolog_dict:
-                codigos_homologados.append(homolog_dict[codigo_norm])
-                codigos_no_homologados.append("")
-            else:
-                codigos_homologados.append("")
-                codigos_no_homologados.append(str(codigo) if not pd.isna(codigo) else "")
-        
-        result_df["Codigo homologado DGH"] = codigos_homologados
-        result_df["Codigo no homologado"] = codigos_no_homologados
+        homologados, no_homologados = self._homologar_codigos(
+            result_df, code_column, self._diccionario_homologacion()
+        )
+        result_df["Codigo homologado DGH"] = homologados
+        result_df["Codigo no homologado"] = no_homologados
         
         return result_df
     
@@ -1651,126 +2047,130 @@ class CoosaludProcessor(BaseProcessor):
         
         return None
     
-    def _formatear_crncxc(self, valor) -> str:
+    def _procesar_au_ta(self, df_obj: pd.DataFrame) -> pd.DataFrame:
         """
-        Formatea el número de factura al formato CRNCXC.
-        Ej: "12345" -> "FC000012345", "FC12345" -> "FC000012345"
+        Procesa filas AU/TA: Si hay AU y TA para la misma factura+servicio,
+        combina las observaciones en la fila AU y elimina las filas TA.
+        """
+        print("🔄 Procesando AU/TA...")
+        
+        df_obj, procesadas = objeciones.combinar_au_ta(df_obj)
+        if procesadas:
+            print(f"   ✅ {procesadas} filas TA procesadas")
+        
+        return df_obj
+    
+    def _construir_objeciones(self, detalle_df: pd.DataFrame, email_date: Optional[str] = None,
+                              consecutivos: Optional[Dict[str, Any]] = None, detallado: bool = True) -> pd.DataFrame:
+        """
+        Arma las filas de OBJECIONES de un detalle procesado (ver _generar_archivo_objeciones)
+        
+        Args:
+            detalle_df: DataFrame de detalle con homologación aplicada
+            email_date: Fecha del correo (para CROFECOBJ si no hay fecha_correo)
+            consecutivos: Estado de CDCONSEC para continuar la numeración entre
+                lotes ('facturas': consecutivo de cada factura, 'filas': filas ya
+                numeradas cuando no hay columna de factura); se actualiza
+            detallado: False para omitir los mensajes de columnas encontradas
+            
+        Returns:
+            DataFrame de objeciones con AU/TA combinadas
         """
-        if pd.isna(valor) or not valor:
-            return ''
+        df_obj = pd.DataFrame()
+        
+        # Buscar columnas en el detalle
+        col_factura = self._find_column(detalle_df, ['numero', 'factura'], 'numero_factura')
+        col_glosa_num = self._find_column(detalle_df, ['numero', 'glosa'], 'numero_glosa') or self._find_column(detalle_df, ['id', 'glosa'])
+        col_valor_glosado = self._find_column(detalle_df, ['valor', 'glosado'], 'valor_glosado')
         
-        valor_str = str(valor).strip()
+        if detallado:
+            print(f"   Columna factura: {col_factura}")
+            print(f"   Columna número glosa: {col_glosa_num}")
+            print(f"   Columna valor glosado: {col_valor_glosado}")
         
-        # Si ya tiene FC, extraer solo los números
-        if valor_str.upper().startswith('FC'):
-            numeros = valor_str[2:]
+        # CDCONSEC - Consecutivo por factura
+        estado = {} if consecutivos is None else consecutivos
+        if col_factura:
+            facturas = detalle_df[col_factura]
+            factura_consecutivo = estado.setdefault("facturas", {})
+            for f in facturas.unique():
+                f = np.nan if pd.isna(f) else f
+                if f not in factura_consecutivo:
+                    factura_consecutivo[f] = len(factura_consecutivo) + 1
+            df_obj['CDCONSEC'] = facturas.map(factura_consecutivo)
         else:
-            numeros = valor_str
+            inicio = estado.get("filas", 0)
+            df_obj['CDCONSEC'] = range(inicio + 1, inicio + len(detalle_df) + 1)
+        estado["filas"] = estado.get("filas", 0) + len(detalle_df)
         
-        # Limpiar caracteres no numéricos
-        numeros = ''.join(filter(str.isdigit, numeros))
+        # CDFECDOC - Fecha del documento (hoy)
+        df_obj['CDFECDOC'] = datetime.now().strftime('%#d/%#m/%Y') if os.name == 'nt' else datetime.now().strftime('%-d/%-m/%Y')
         
-        if not numeros:
-            return ''
+        # CRNCXC - Número de factura formateado
+        if col_factura:
+            df_obj['CRNCXC'] = objeciones.formatear_crncxc(detalle_df[col_factura], solo_digitos=True)
+        else:
+            df_obj['CRNCXC'] = ''
         
-        return f"FC0000{numeros}"
-    
-    def _formatear_fecha_dmy(self, fecha) -> str:
-        """Convierte fecha a formato DD/MM/YYYY"""
-        if pd.isna(fecha) or not fecha:
-            return ''
-        try:
-            if isinstance(fecha, (pd.Timestamp, datetime)):
-                return fecha.strftime('%d/%m/%Y')
-            fecha_dt = pd.to_datetime(str(fecha), errors='coerce')
-            return fecha_dt.strftime('%d/%m/%Y') if pd.notna(fecha_dt) else ''
-        except:
-            return ''
-    
-    def _obtener_valor_numerico(self, valor) -> float:
-        """Convierte un valor a float, manejando formatos con $ y separadores, manteniendo decimales"""
-        if pd.isna(valor) or not valor:
-            return 0.0
-        try:
-            if isinstance(valor, (int, float)):
-                return float(valor)
-            
-            # Limpiar formato monetario
-            valor_str = str(valor).strip()
-            valor_str = valor_str.replace('$', '').replace(' ', '')
-            
-            # Manejar separadores: punto para miles, coma para decimales (formato colombiano)
-            # o coma para miles, punto para decimales (formato internacional)
-            if ',' in valor_str and '.' in valor_str:
-                # Determinar cuál es decimal
-                pos_coma = valor_str.rfind(',')
-                pos_punto = valor_str.rfind('.')
-                if pos_punto > pos_coma:
-                    # Formato: 1.234.567,89 -> punto es miles, coma es decimal
-                    valor_str = valor_str.replace('.', '').replace(',', '.')
-                else:
-                    # Formato: 1,234,567.89 -> coma es miles, punto es decimal
-                    valor_str = valor_str.replace(',', '')
-            elif ',' in valor_str:
-                # Solo coma: puede ser miles o decimal
-                # Si hay más de una coma, es separador de miles
-                if valor_str.count(',') > 1:
-                    valor_str = valor_str.replace(',', '')
-                else:
-                    # Una sola coma: verificar posición
-                    partes = valor_str.split(',')
-                    if len(partes[1]) <= 2:
-                        # Probablemente decimal
-                        valor_str = valor_str.replace(',', '.')
-                    else:
-                        # Probablemente miles
-                        valor_str = valor_str.replace(',', '')
-            elif '.' in valor_str:
-                # Solo punto: puede ser miles o decimal
-                if valor_str.count('.') > 1:
-                    valor_str = valor_str.replace('.', '')
-                # Si es un solo punto, asumir que es decimal
-            
-            return float(valor_str) if valor_str else 0.0
-        except:
-            return 0.0
-    
-    def _procesar_au_ta(self, df_obj: pd.DataFrame) -> pd.DataFrame:
-        """
-        Procesa filas AU/TA: Si hay AU y TA para la misma factura+servicio,
-        combina las observaciones en la fila AU y elimina las filas TA.
-        """
-        print("🔄 Procesando AU/TA...")
+        # CROFECOBJ - Fecha de objeción (fecha del correo individual por registro)
+        # Usar la columna fecha_correo que tiene la fecha específica de cada archivo
+        if 'fecha_correo' in detalle_df.columns:
+            df_obj['CROFECOBJ'] = objeciones.formatear_fecha_dmy(detalle_df['fecha_correo'])
+        elif email_date:
+            # Fallback a fecha global si no hay fecha_correo
+            try:
+                fecha_correo = pd.to_datetime(email_date)
+                df_obj['CROFECOBJ'] = fecha_correo.strftime('%d/%m/%Y')
+            except:
+                df_obj['CROFECOBJ'] = email_date
+        else:
+            df_obj['CROFECOBJ'] = ''
         
-        filas_eliminar: List[Any] = []  # Cambiar a List[Any] para aceptar cualquier tipo de índice
-        procesadas = 0
+        # CROREFERE - Vacío
+        df_obj['CROREFERE'] = ''
         
-        for (factura, tec), grupo in df_obj.groupby(['CRNCXC', 'SLNSERPRO']):
-            if len(grupo) < 2:
-                continue
-            
-            # Convertir índices de forma segura (el índice puede ser int, str, o cualquier hashable)
-            filas_au = [i for i, r in grupo.iterrows() if str(r.get('CRNCONOBJ', '')).upper().startswith('AU')]
-            filas_ta = [i for i, r in grupo.iterrows() if str(r.get('CRNCONOBJ', '')).upper().startswith('TA')]
-            
-            if filas_au and filas_ta:
-                idx_au = filas_au[0]
-                
-                for idx_ta in filas_ta:
-                    # Usar .at para acceso a celda individual (más rápido y sin problemas de tipo)
-                    obs_ta = str(df_obj.at[idx_ta, 'CRDOBSERV']).strip()  # type: ignore
-                    if obs_ta:
-                        obs_au = str(df_obj.at[idx_au, 'CRDOBSERV']).strip()  # type: ignore
-                        df_obj.at[idx_au, 'CRDOBSERV'] = f"{obs_au} \\\\ {obs_ta}" if obs_au else f"\\\\ {obs_ta}"  # type: ignore
-                    
-                    filas_eliminar.append(idx_ta)
-                    procesadas += 1
+        # CROOBSERV - REG, GLOSA SEGUN RAD N. + fecha CROFECOBJ
+        fechas_obj = df_obj['CROFECOBJ'].fillna('').astype(str)
+        df_obj['CROOBSERV'] = ("REG, GLOSA SEGUN RAD N. " + fechas_obj).where(fechas_obj != '', '')
         
-        if filas_eliminar:
-            df_obj = df_obj.drop(filas_eliminar).reset_index(drop=True)
-            print(f"   ✅ {procesadas} filas TA procesadas")
+        # CROCLAOBJ - Siempre 0
+        df_obj['CROCLAOBJ'] = 0
         
-        return df_obj
+        # GENUSUARIO4 - ID fijo
+        df_obj['GENUSUARIO4'] = 1103858268
+        
+        # CRNCONOBJ - Código de glosa (ya homologado)
+        if 'codigo_glosa' in detalle_df.columns:
+            df_obj['CRNCONOBJ'] = detalle_df['codigo_glosa']
+        else:
+            df_obj['CRNCONOBJ'] = ''
+        
+        # SLNSERPRO - Código servicio homologado DGH
+        if 'Codigo homologado DGH' in detalle_df.columns:
+            df_obj['SLNSERPRO'] = detalle_df['Codigo homologado DGH']
+        else:
+            df_obj['SLNSERPRO'] = ''
+        
+        # CTNCENCOS - Vacío
+        df_obj['CTNCENCOS'] = ''
+        
+        # IDRIPS - Vacío
+        df_obj['IDRIPS'] = ''
+        
+        # CROVALOBJ - Valor glosado (mantener decimales para centavos)
+        if col_valor_glosado and col_valor_glosado in detalle_df.columns:
+            df_obj['CROVALOBJ'] = objeciones.valor_numerico(detalle_df[col_valor_glosado], decimales=True)
+        else:
+            df_obj['CROVALOBJ'] = 0.0
+        
+        # CRDOBSERV - Justificación/observaciones
+        if 'justificacion_glosa' in detalle_df.columns:
+            df_obj['CRDOBSERV'] = detalle_df['justificacion_glosa'].fillna('')
+        else:
+            df_obj['CRDOBSERV'] = ''
+        
+        # Procesar AU/TA (combinar observaciones)
+        return self._procesar_au_ta(df_obj)
     
     def _generar_archivo_objeciones(self, detalle_df: pd.DataFrame, output_dir: str, email_date: Optional[str] = None) -> Optional[str]:
         """
@@ -1807,111 +2207,13 @@ class CoosaludProcessor(BaseProcessor):
         try:
             print("\n📄 Generando Objeciones.xlsx...")
             
-            df_obj = pd.DataFrame()
-            
-            # Buscar columnas en el detalle
-            col_factura = self._find_column(detalle_df, ['numero', 'factura'], 'numero_factura')
-            col_glosa_num = self._find_column(detalle_df, ['numero', 'glosa'], 'numero_glosa') or self._find_column(detalle_df, ['id', 'glosa'])
-            col_valor_glosado = self._find_column(detalle_df, ['valor', 'glosado'], 'valor_glosado')
-            
-            print(f"   Columna factura: {col_factura}")
-            print(f"   Columna número glosa: {col_glosa_num}")
-            print(f"   Columna valor glosado: {col_valor_glosado}")
-            
-            # CDCONSEC - Consecutivo por factura
-            if col_factura:
-                facturas = detalle_df[col_factura]
-                factura_consecutivo = {f: i+1 for i, f in enumerate(facturas.unique())}
-                df_obj['CDCONSEC'] = facturas.map(factura_consecutivo)
-            else:
-                df_obj['CDCONSEC'] = range(1, len(detalle_df) + 1)
-            
-            # CDFECDOC - Fecha del documento (hoy)
-            df_obj['CDFECDOC'] = datetime.now().strftime('%#d/%#m/%Y') if os.name == 'nt' else datetime.now().strftime('%-d/%-m/%Y')
-            
-            # CRNCXC - Número de factura formateado
-            if col_factura:
-                df_obj['CRNCXC'] = detalle_df[col_factura].apply(self._formatear_crncxc)
-            else:
-                df_obj['CRNCXC'] = ''
-            
-            # CROFECOBJ - Fecha de objeción (fecha del correo individual por registro)
-            # Usar la columna fecha_correo que tiene la fecha específica de cada archivo
-            if 'fecha_correo' in detalle_df.columns:
-                def format_fecha_correo(fecha_str):
-                    if pd.isna(fecha_str) or not fecha_str:
-                        return ''
-                    try:
-                        # Parsear y formatear solo la fecha (sin hora)
-                        fecha_dt = pd.to_datetime(fecha_str)
-                        return fecha_dt.strftime('%d/%m/%Y')
-                    except:
-                        return ''
-                
-                df_obj['CROFECOBJ'] = detalle_df['fecha_correo'].apply(format_fecha_correo)
-            elif email_date:
-                # Fallback a fecha global si no hay fecha_correo
-                try:
-                    fecha_correo = pd.to_datetime(email_date)
-                    df_obj['CROFECOBJ'] = fecha_correo.strftime('%d/%m/%Y')
-                except:
-                    df_obj['CROFECOBJ'] = email_date
-            else:
-                df_obj['CROFECOBJ'] = ''
-            
-            # CROREFERE - Vacío
-            df_obj['CROREFERE'] = ''
-            
-            # CROOBSERV - REG, GLOSA SEGUN RAD N. + fecha CROFECOBJ
-            df_obj['CROOBSERV'] = df_obj['CROFECOBJ'].apply(
-                lambda fecha: f"REG, GLOSA SEGUN RAD N. {fecha}" if fecha else ""
-            )
-            
-            # CROCLAOBJ - Siempre 0
-            df_obj['CROCLAOBJ'] = 0
-            
-            # GENUSUARIO4 - ID fijo
-            df_obj['GENUSUARIO4'] = 1103858268
-            
-            # CRNCONOBJ - Código de glosa (ya homologado)
-            if 'codigo_glosa' in detalle_df.columns:
-                df_obj['CRNCONOBJ'] = detalle_df['codigo_glosa']
-            else:
-                df_obj['CRNCONOBJ'] = ''
-            
-            # SLNSERPRO - Código servicio homologado DGH
-            if 'Codigo homologado DGH' in detalle_df.columns:
-                df_obj['SLNSERPRO'] = detalle_df['Codigo homologado DGH']
-            else:
-                df_obj['SLNSERPRO'] = ''
-            
-            # CTNCENCOS - Vacío
-            df_obj['CTNCENCOS'] = ''
-            
-            # IDRIPS - Vacío
-            df_obj['IDRIPS'] = ''
-            
-            # CROVALOBJ - Valor glosado (mantener decimales para centavos)
-            if col_valor_glosado and col_valor_glosado in detalle_df.columns:
-                df_obj['CROVALOBJ'] = detalle_df[col_valor_glosado].apply(self._obtener_valor_numerico)
-            else:
-                df_obj['CROVALOBJ'] = 0.0
-            
-            # CRDOBSERV - Justificación/observaciones
-            if 'justificacion_glosa' in detalle_df.columns:
-                df_obj['CRDOBSERV'] = detalle_df['justificacion_glosa'].fillna('')
-            else:
-                df_obj['CRDOBSERV'] = ''
-            
-            # Procesar AU/TA (combinar observaciones)
-            df_obj = self._procesar_au_ta(df_obj)
+            df_obj = self._construir_objeciones(detalle_df, email_date)
             
             # Exportar
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
             output_path = os.path.join(output_dir, f"Objeciones_COOSALUD_{timestamp}.xlsx")
             
-            with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
-                df_obj.to_excel(writer, sheet_name='OBJECIONES', index=False)
+            excel_writer.escribir_excel(output_path, {'OBJECIONES': df_obj})
             
             print(f"✅ Objeciones generadas: {output_path} ({len(df_obj)} registros)")
             return output_path
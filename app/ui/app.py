@@ -29,11 +29,14 @@ from app.ui.components.alert_dialog import AlertDialog
 from app.ui.components.update_dialog import UpdateChecker
 from app.ui.navigation import NavigationController
 from app.ui.app_state import AppState
-from app.config.settings import APP_VERSION, GITHUB_REPO, AUTO_UPDATE_CONFIG, logger
+from app.config.settings import APP_VERSION, GITHUB_REPO, AUTO_UPDATE_CONFIG, TEMP_DIR, logger
 
 # Ruta de assets (carpeta con imágenes)
 ASSETS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "assets"))
 
+# Homologador de COOSALUD (se precarga al elegir la EPS)
+COOSALUD_HOMOLOGADOR_PATH = r"\\MINERVA\Cartera\GLOSAAP\HOMOLOGADOR\coosalud_homologacion.xlsx"
+
 
 def main(page: ft.Page):
     """Función principal de la aplicación"""
@@ -356,6 +359,9 @@ def main(page: ft.Page):
                 bgcolor="#4488ee",  # Verde vibrante
             )
             messages_view.process_eps_btn.data = "coosalud"
+            # Leer el homologador mientras se buscan los correos
+            from app.service.processors import CoosaludProcessor
+            CoosaludProcessor.precargar_homologador(COOSALUD_HOMOLOGADOR_PATH)
         else:
             messages_view.show_process_button(False)
         
@@ -640,7 +646,12 @@ def main(page: ft.Page):
                     print(f"✅ Procesando TODOS los {len(excel_files)} archivos Excel automáticamente")
                     messages_view.set_processing(True, f"📊 Procesando {len(excel_files)} archivo(s) Excel...")
                     
-                    resultado = email_service.procesar_mutualser()
+                    def on_progress(completados, total, _archivo):
+                        messages_view.set_processing(
+                            True, f"📊 Leyendo archivos MUTUALSER {completados}/{total}...", completados / total
+                        )
+                    
+                    resultado = email_service.procesar_mutualser(on_progress=on_progress)
                     
                     if resultado['success']:
                         resumen = resultado['resumen']
@@ -704,7 +715,7 @@ def main(page: ft.Page):
                     messages_view.set_processing(True, f"📊 Procesando {len(excel_files)} archivo(s) Excel...")
 
                     # Configurar procesador con homologador de Coosalud
-                    homologador_path = r"\\MINERVA\Cartera\GLOSAAP\HOMOLOGADOR\coosalud_homologacion.xlsx"
+                    homologador_path = COOSALUD_HOMOLOGADOR_PATH
                     output_dir = r"\\MINERVA\Cartera\GLOSAAP\REPOSITORIO DE RESULTADOS\COOSALUD"
                     
                     # Verificar que el directorio de salida existe
@@ -771,7 +782,10 @@ def main(page: ft.Page):
                     else:
                         print(f"[COOSALUD] ⚠️ No hay mensajes en app_state['found_messages']")
                     
-                    processor = CoosaludProcessor(homologador_path=homologador_path)
+                    processor = CoosaludProcessor(
+                        homologador_path=homologador_path,
+                        cache_dir=str(TEMP_DIR / "cache" / "coosalud")
+                    )
                     result_data, message = processor.process_glosas(
                         excel_files, 
                         output_dir=output_dir, 
@@ -786,9 +800,9 @@ def main(page: ft.Page):
                         messages_view.set_processing(False, f"✅ {message}")
                         messages_view.processing_status.color = ft.Colors.GREEN
                         
-                        # Preparar estadísticas desde los DataFrames
-                        total_detalles = len(result_data.get('detalle', [])) if isinstance(result_data, dict) else 0
-                        total_glosas = len(result_data.get('glosa', [])) if isinstance(result_data, dict) else 0
+                        # Preparar estadísticas desde los DataFrames (o el resumen si se procesó por lotes)
+                        total_detalles = result_data.get('detalle_filas', len(result_data.get('detalle', []))) if isinstance(result_data, dict) else 0
+                        total_glosas = result_data.get('glosa_filas', len(result_data.get('glosa', []))) if isinstance(result_data, dict) else 0
                         
                         stats = {
                             'archivos_procesados': len(excel_files),
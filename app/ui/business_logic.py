@@ -272,7 +272,12 @@ class EPSProcessor:
         logger.info(f"Procesando {len(excel_files)} archivos Excel de MUTUALSER")
         self.messages_view.set_processing(True, f"📊 Procesando {len(excel_files)} archivo(s) Excel...")
         
-        resultado = self.email_service.procesar_mutualser()
+        def on_progress(completados, total, _archivo):
+            self.messages_view.set_processing(
+                True, f"📊 Leyendo archivos MUTUALSER {completados}/{total}...", completados / total
+            )
+        
+        resultado = self.email_service.procesar_mutualser(on_progress=on_progress)
         
         if resultado['success']:
             self._show_mutualser_success(resultado)
@@ -283,6 +288,7 @@ class EPSProcessor:
     
     def _process_coosalud(self):
         """Procesa archivos de COOSALUD"""
+        from app.config.settings import TEMP_DIR
         from app.service.processors import CoosaludProcessor
         
         self.messages_view.set_processing(True, "🔄 Procesando COOSALUD...")
@@ -313,7 +319,10 @@ class EPSProcessor:
             except Exception as e:
                 logger.warning(f"No se pudo crear directorio: {e}")
         
-        processor = CoosaludProcessor(homologador_path=homologador_path)
+        processor = CoosaludProcessor(
+            homologador_path=homologador_path,
+            cache_dir=str(TEMP_DIR / "cache" / "coosalud")
+        )
         
         # Obtener fecha del correo más reciente
         email_date = None
@@ -348,12 +357,18 @@ class EPSProcessor:
                 email_date = latest_date.strftime('%Y-%m-%d %H:%M:%S')
                 logger.info(f"Usando fecha del correo: {email_date}")
         
+        def on_progress(completados, total, _factura):
+            self.messages_view.set_processing(
+                True, f"📊 Leyendo pares COOSALUD {completados}/{total}...", completados / total
+            )
+        
         # Pasar attachment_service para fechas individuales por archivo
         result_data, message = processor.process_glosas(
             excel_files, 
             output_dir=output_dir, 
             email_date=email_date,
-            attachment_service=self.email_service.attachment_service
+            attachment_service=self.email_service.attachment_service,
+            progress_callback=on_progress
         )
         
         if result_data:
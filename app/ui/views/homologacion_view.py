@@ -354,7 +354,7 @@ class HomologacionView:
                                     icon_color=ft.Colors.ON_SURFACE_VARIANT,
                                     icon_size=20,
                                     tooltip="Actualizar",
-                                    on_click=lambda e: self._cargar_tabla()
+                                    on_click=self._on_actualizar
                                 )
                             ], spacing=8),
                             ft.Container(height=16),
@@ -518,11 +518,28 @@ class HomologacionView:
         """Callback de búsqueda"""
         self._cargar_tabla(filtro=e.control.value)
     
-    def _cargar_tabla(self, filtro=None):
-        """Carga datos en la tabla"""
+    def _on_actualizar(self, e):
+        """Callback del botón Actualizar: trae los cambios de otros usuarios"""
+        self._cargar_tabla(filtro=self.buscar_field.value, refrescar=True)  # type: ignore
+        self._actualizar_estadisticas()
+    
+    def _cargar_tabla(self, filtro=None, refrescar=False):
+        """
+        Carga datos en la tabla
+        
+        Args:
+            filtro: Texto de búsqueda
+            refrescar: True para traer antes los cambios de otros usuarios.
+                Solo lo pide el botón Actualizar: la búsqueda no consulta el
+                recurso de red en cada tecla (la tabla se lee al abrir la EPS
+                y los guardados propios ya fusionan lo que haya en disco)
+        """
         if not self.service or self.tabla is None:  # type: ignore
             return
-            
+        
+        if refrescar:
+            self.service.refrescar()
+        
         self.tabla.rows.clear()  # type: ignore
         df = self.service.listar(filtro=filtro, limite=100)
         
@@ -556,7 +573,11 @@ class HomologacionView:
             self.tabla.rows.append(ft.DataRow(cells=celdas))  # type: ignore
         
         if filtro:
-            self.status_text.value = f"{len(df)} resultados"  # type: ignore
+            total = self.service.total_coincidencias
+            if total > len(df):
+                self.status_text.value = f"{len(df)} de {total} resultados"  # type: ignore
+            else:
+                self.status_text.value = f"{total} resultados"  # type: ignore
             self.status_text.color = ft.Colors.ON_SURFACE_VARIANT  # type: ignore
         else:
             self.status_text.value = ""  # type: ignore
@@ -584,6 +605,10 @@ class HomologacionView:
             self.codigo_dgh_field.value = ""  # type: ignore
             self._cargar_tabla()
             self._actualizar_estadisticas()
+        elif self.service.conflictos:
+            self.status_text.value = f"⚠️ {codigo_erp}: {self.service.conflictos[0]['motivo']}"  # type: ignore
+            self.status_text.color = ft.Colors.ORANGE  # type: ignore
+            self._cargar_tabla()
         else:
             self.status_text.value = f"⚠️ El código {codigo_erp} ya existe"  # type: ignore
             self.status_text.color = ft.Colors.ORANGE  # type: ignore
@@ -604,6 +629,10 @@ class HomologacionView:
                 self.status_text.color = ft.Colors.GREEN  # type: ignore
                 self._cargar_tabla()
                 self._actualizar_estadisticas()
+            elif self.service.conflictos:  # type: ignore
+                self.status_text.value = f"⚠️ {codigo}: {self.service.conflictos[0]['motivo']}"  # type: ignore
+                self.status_text.color = ft.Colors.ORANGE  # type: ignore
+                self._cargar_tabla()
             else:
                 self.status_text.value = f"❌ Error eliminando {codigo}"  # type: ignore
                 self.status_text.color = ft.Colors.RED  # type: ignore
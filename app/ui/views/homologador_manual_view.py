@@ -10,6 +10,8 @@ import threading
 from datetime import datetime
 from typing import Optional, List, Tuple
 
+from app.core.homologacion_service import HomologacionService
+
 class HomologadorManualView:
     """Vista para homologar archivos Excel manualmente"""
     
@@ -305,8 +307,8 @@ class HomologadorManualView:
             return
         
         try:
-            self.df_homologacion = pd.read_excel(path)
-            self.df_homologacion.columns = self.df_homologacion.columns.str.strip()
+            # Snapshot + journal: incluye los guardados del CRUD aún no compactados
+            self.df_homologacion = HomologacionService.leer_tabla_vigente(path)
             
             # Pre-calcular COD_SERV_FACT solo para MUTUALSER
             if self.selected_eps == "MUTUALSER" and 'COD_SERV_FACT' in self.df_homologacion.columns:
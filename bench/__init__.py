@@ -0,0 +1,6 @@
+"""
+Benchmarks de rendimiento de Glosaap
+
+Ejecutar desde la raíz del repositorio:
+    python -m bench.bench_mutualser --archivos 200 --filas 150 --salida resultados.json
+"""
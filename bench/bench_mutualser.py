@@ -0,0 +1,405 @@
+"""
+Benchmark del pipeline MUTUALSER
+
+Genera (o reutiliza) un lote sintético de respuestas MUTUALSER y mide, por
+etapa, el tiempo y el pico de memoria residente (RSS) del flujo real de
+MutualserProcessor:
+
+    lectura                       procesar_multiples_archivos
+    carga_homologacion            lectura del archivo de homologación
+    exportar                      exportar_consolidado (incluye las siguientes)
+    exportar/homologacion         _aplicar_homologacion
+    exportar/consolidado          escritura del consolidado
+    exportar/objeciones           _generar_archivo_objeciones
+    exportar/objeciones/au_ta     combinación AU/TA
+
+Los resultados se guardan en JSON para comparar versiones:
+
+    python -m bench.bench_mutualser --archivos 200 --filas 150 --salida base.json
+    python -m bench.bench_mutualser --archivos 200 --filas 150 --comparar base.json
+
+El pico de RSS por etapa es exacto en Linux (se reinicia el pico del proceso
+al comenzar cada etapa). En otros sistemas es el pico acumulado del proceso
+hasta el final de la etapa.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from functools import wraps
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+from app.core import excel_writer
+from app.core.mutualser_processor import MutualserProcessor
+from bench.generador_mutualser import generar_lote
+
+# Cambiarla si cambia la estructura del JSON de resultados
+VERSION_FORMATO = 1
+
+# Aumento relativo de tiempo a partir del cual una etapa se considera regresión
+UMBRAL_REGRESION = 0.10
+
+
+# ==================== MEMORIA ====================
+
+_PROC_STATUS = '/proc/self/status'
+_PROC_CLEAR_REFS = '/proc/self/clear_refs'
+
+
+def pico_rss_mb() -> Optional[float]:
+    """Pico de memoria residente del proceso en MB (None si no se puede medir)"""
+    try:
+        with open(_PROC_STATUS, encoding='ascii') as f:
+            for linea in f:
+                if linea.startswith('VmHWM:'):
+                    return int(linea.split()[1]) / 1024
+    except OSError:
+        pass
+
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        return getattr(info, 'peak_wset', info.rss) / (1024 * 1024)
+
+    if resource is not None:
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss está en bytes en macOS y en KB en Linux
+        return pico / (1024 * 1024) if sys.platform == 'darwin' else pico / 1024
+    return None
+
+
+def pico_rss_hijos_mb() -> Optional[float]:
+    """Mayor pico de RSS entre los procesos hijos terminados (pool de lectura)"""
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    if not pico:
+        return None
+    return pico / (1024 * 1024) if sys.platform == 'darwin' else pico / 1024
+
+
+def reiniciar_pico_rss() -> bool:
+    """Reinicia el pico de RSS del proceso (solo Linux). True si se pudo"""
+    try:
+        with open(_PROC_CLEAR_REFS, 'w', encoding='ascii') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+# ==================== MEDICIÓN ====================
+
+class Cronometro:
+    """
+    Mide tiempo y pico de RSS de etapas que pueden anidarse
+
+    Las etapas anidadas se nombran 'padre/hija'. Como reiniciar el pico de
+    RSS en una etapa hija borraría el de la etapa padre, el pico de cada
+    etapa es el máximo entre lo medido al cerrarla y los picos de sus hijas.
+    """
+
+    def __init__(self):
+        self.etapas: Dict[str, dict] = {}
+        self._pila: List[dict] = []
+        self.pico_por_etapa = reiniciar_pico_rss()
+
+    @contextlib.contextmanager
+    def medir(self, nombre: str):
+        """Context manager que registra la etapa al salir"""
+        ruta = '/'.join([e['nombre'] for e in self._pila] + [nombre])
+        etapa = {'nombre': nombre, 'pico_hijas': None}
+        self._pila.append(etapa)
+        if self.pico_por_etapa:
+            reiniciar_pico_rss()
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            segundos = time.perf_counter() - inicio
+            pico = _maximo(pico_rss_mb(), etapa['pico_hijas'])
+            self._pila.pop()
+            if self._pila:
+                self._pila[-1]['pico_hijas'] = _maximo(self._pila[-1]['pico_hijas'], pico)
+
+            registro = self.etapas.setdefault(ruta, {'segundos': 0.0, 'rss_pico_mb': None})
+            registro['segundos'] += segundos
+            registro['rss_pico_mb'] = _maximo(registro['rss_pico_mb'], pico)
+
+    def etapa_actual(self) -> Optional[str]:
+        """Nombre de la etapa abierta más interna"""
+        return self._pila[-1]['nombre'] if self._pila else None
+
+    def envolver(self, objeto, metodo: str, nombre: str):
+        """Reemplaza objeto.metodo por una versión que mide cada llamada"""
+        original = getattr(objeto, metodo)
+
+        @wraps(original)
+        def medido(*args, **kwargs):
+            with self.medir(nombre):
+                return original(*args, **kwargs)
+
+        setattr(objeto, metodo, medido)
+
+
+def _maximo(a: Optional[float], b: Optional[float]) -> Optional[float]:
+    valores = [v for v in (a, b) if v is not None]
+    return max(valores) if valores else None
+
+
+@contextlib.contextmanager
+def _silencio(activo: bool):
+    """Descarta los print del procesador mientras se mide"""
+    if not activo:
+        yield
+        return
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+# ==================== EJECUCIÓN ====================
+
+def ejecutar_repeticion(manifiesto: dict, salida_dir: str, paralelo: Optional[bool] = False,
+                        max_workers: Optional[int] = None, silencioso: bool = True) -> dict:
+    """
+    Ejecuta una vez el pipeline completo sobre el lote generado
+
+    Returns:
+        Diccionario {etapas: {ruta: {segundos, rss_pico_mb}}, registros, errores, exportado}
+    """
+    # Sin estado compartido de corridas anteriores
+    MutualserProcessor._mapeos_por_encabezado.clear()
+    cronometro = Cronometro()
+
+    with _silencio(silencioso):
+        processor = MutualserProcessor(output_dir=salida_dir, cargar_homologacion=False)
+        processor.homologacion_path = manifiesto['homologacion']
+
+        with cronometro.medir('lectura'):
+            processor.procesar_multiples_archivos(manifiesto['archivos'], paralelo=paralelo,
+                                                  max_workers=max_workers)
+        registros = 0 if processor.df_consolidado is None else len(processor.df_consolidado)
+
+        with cronometro.medir('carga_homologacion'):
+            processor._leer_homologacion()
+
+        cronometro.envolver(processor, '_aplicar_homologacion', 'homologacion')
+        cronometro.envolver(processor, '_generar_archivo_objeciones', 'objeciones')
+        cronometro.envolver(processor, '_procesar_au_ta', 'au_ta')
+
+        # El consolidado es la única escritura que ocurre fuera de objeciones
+        escribir_original = excel_writer.escribir_excel
+
+        def escribir_medido(ruta, datos, motor=None):
+            if cronometro.etapa_actual() == 'exportar':
+                with cronometro.medir('consolidado'):
+                    return escribir_original(ruta, datos, motor)
+            return escribir_original(ruta, datos, motor)
+
+        excel_writer.escribir_excel = escribir_medido
+        try:
+            with cronometro.medir('exportar'):
+                resultado = processor.exportar_consolidado()
+        finally:
+            excel_writer.escribir_excel = escribir_original
+
+    return {
+        'etapas': cronometro.etapas,
+        'registros': registros,
+        'errores': len(processor.errores),
+        'exportado': resultado is not None,
+        'rss_pico_por_etapa': cronometro.pico_por_etapa,
+    }
+
+
+def resumir(repeticiones: List[dict]) -> Dict[str, dict]:
+    """Mínimo, mediana y pico de RSS por etapa entre repeticiones"""
+    resumen: Dict[str, dict] = {}
+    for nombre in repeticiones[0]['etapas']:
+        tiempos = [r['etapas'][nombre]['segundos'] for r in repeticiones if nombre in r['etapas']]
+        picos = [r['etapas'][nombre]['rss_pico_mb'] for r in repeticiones
+                 if nombre in r['etapas'] and r['etapas'][nombre]['rss_pico_mb'] is not None]
+        resumen[nombre] = {
+            'segundos_min': round(min(tiempos), 4),
+            'segundos_mediana': round(statistics.median(tiempos), 4),
+            'rss_pico_mb': round(max(picos), 1) if picos else None,
+        }
+    return resumen
+
+
+def _commit_git() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=10,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _version_app() -> Optional[str]:
+    try:
+        from app.config.settings import APP_VERSION
+        return APP_VERSION
+    except Exception:
+        return None
+
+
+def ejecutar_benchmark(archivos: int, filas: int, repeticiones: int = 3, semilla: int = 0,
+                       tecnologias: int = 2000, datos_dir: Optional[str] = None,
+                       paralelo: Optional[bool] = False, max_workers: Optional[int] = None,
+                       silencioso: bool = True) -> dict:
+    """
+    Genera el lote (si hace falta) y ejecuta las repeticiones del benchmark
+
+    Returns:
+        Resultados listos para guardar en JSON
+    """
+    datos_dir = datos_dir or os.path.join(tempfile.gettempdir(), 'glosaap_bench', f"mutualser_{archivos}x{filas}_s{semilla}")
+    print(f"[BENCH] Lote sintético: {archivos} archivos x ~{filas} filas en {datos_dir}")
+    inicio = time.perf_counter()
+    manifiesto = generar_lote(datos_dir, archivos, filas, semilla=semilla, tecnologias=tecnologias)
+    print(f"[BENCH] {manifiesto['filas']} filas de detalle listas ({time.perf_counter() - inicio:.1f}s)")
+
+    corridas = []
+    for i in range(repeticiones):
+        salida_dir = tempfile.mkdtemp(prefix='glosaap_bench_salida_')
+        try:
+            corrida = ejecutar_repeticion(manifiesto, salida_dir, paralelo, max_workers, silencioso)
+        finally:
+            shutil.rmtree(salida_dir, ignore_errors=True)
+        corridas.append(corrida)
+        total = sum(e['segundos'] for n, e in corrida['etapas'].items() if '/' not in n)
+        print(f"[BENCH] Repetición {i + 1}/{repeticiones}: {total:.2f}s, {corrida['registros']} registros")
+
+    return {
+        'version_formato': VERSION_FORMATO,
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'entorno': {
+            'app': _version_app(),
+            'commit': _commit_git(),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'plataforma': platform.platform(),
+            'nucleos': os.cpu_count(),
+            'motor_excel': excel_writer.motor_por_defecto(),
+        },
+        'parametros': {
+            **manifiesto['parametros'],
+            'filas_totales': manifiesto['filas'],
+            'repeticiones': repeticiones,
+            'paralelo': paralelo,
+            'max_workers': max_workers,
+        },
+        'rss_pico_por_etapa': all(c['rss_pico_por_etapa'] for c in corridas),
+        'rss_hijos_pico_mb': pico_rss_hijos_mb(),
+        'etapas': resumir(corridas),
+        'repeticiones': corridas,
+    }
+
+
+# ==================== COMPARACIÓN ====================
+
+def comparar(actual: dict, base: dict, umbral: float = UMBRAL_REGRESION) -> List[str]:
+    """
+    Compara la mediana de tiempo de cada etapa contra una corrida base
+
+    Returns:
+        Nombres de las etapas cuyo tiempo aumentó más que el umbral
+    """
+    if actual.get('parametros', {}).get('filas_totales') != base.get('parametros', {}).get('filas_totales'):
+        print("[BENCH] ⚠️ Las corridas usan lotes distintos: la comparación es orientativa")
+
+    regresiones = []
+    print(f"\n{'Etapa':<28}{'Base (s)':>10}{'Actual (s)':>12}{'Cambio':>10}{'RSS base':>11}{'RSS actual':>12}")
+    for nombre, etapa in actual['etapas'].items():
+        previa = base.get('etapas', {}).get(nombre)
+        if previa is None:
+            print(f"{nombre:<28}{'-':>10}{etapa['segundos_mediana']:>12.3f}{'nueva':>10}")
+            continue
+
+        antes, ahora = previa['segundos_mediana'], etapa['segundos_mediana']
+        cambio = (ahora - antes) / antes if antes else 0.0
+        marca = ' ⚠️' if cambio > umbral else ''
+        if cambio > umbral:
+            regresiones.append(nombre)
+        print(f"{nombre:<28}{antes:>10.3f}{ahora:>12.3f}{cambio:>+10.1%}"
+              f"{_mb(previa.get('rss_pico_mb')):>11}{_mb(etapa.get('rss_pico_mb')):>12}{marca}")
+    return regresiones
+
+
+def _mb(valor: Optional[float]) -> str:
+    return '-' if valor is None else f"{valor:.0f} MB"
+
+
+def imprimir_resumen(resultados: dict):
+    """Tabla de tiempos y memoria por etapa"""
+    print(f"\n{'Etapa':<28}{'Mín (s)':>10}{'Mediana (s)':>13}{'RSS pico':>11}")
+    for nombre, etapa in resultados['etapas'].items():
+        print(f"{nombre:<28}{etapa['segundos_min']:>10.3f}{etapa['segundos_mediana']:>13.3f}"
+              f"{_mb(etapa['rss_pico_mb']):>11}")
+    if not resultados['rss_pico_por_etapa']:
+        print("(RSS pico acumulado del proceso: este sistema no permite reiniciarlo por etapa)")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark del pipeline MUTUALSER con datos sintéticos")
+    parser.add_argument('--archivos', type=int, default=50, help="Libros a generar (default: 50)")
+    parser.add_argument('--filas', type=int, default=150, help="Filas de detalle promedio por libro (default: 150)")
+    parser.add_argument('--repeticiones', type=int, default=3, help="Repeticiones del pipeline (default: 3)")
+    parser.add_argument('--semilla', type=int, default=0, help="Semilla del generador (default: 0)")
+    parser.add_argument('--tecnologias', type=int, default=2000, help="Códigos de tecnología distintos (default: 2000)")
+    parser.add_argument('--datos', help="Carpeta del lote sintético (se reutiliza si ya existe)")
+    parser.add_argument('--paralelo', action='store_true', help="Leer los archivos con el pool de procesos")
+    parser.add_argument('--workers', type=int, help="Procesos del pool de lectura")
+    parser.add_argument('--salida', help="Archivo JSON donde guardar los resultados")
+    parser.add_argument('--comparar', help="JSON de una corrida anterior para detectar regresiones")
+    parser.add_argument('--umbral', type=float, default=UMBRAL_REGRESION,
+                        help="Aumento relativo de tiempo considerado regresión (default: 0.10)")
+    parser.add_argument('--verbose', action='store_true', help="Mostrar la salida del procesador")
+    args = parser.parse_args(argv)
+
+    resultados = ejecutar_benchmark(
+        args.archivos, args.filas, args.repeticiones, args.semilla, args.tecnologias,
+        args.datos, paralelo=args.paralelo, max_workers=args.workers, silencioso=not args.verbose,
+    )
+    imprimir_resumen(resultados)
+
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f, indent=2, ensure_ascii=False)
+        print(f"\n✅ Resultados guardados en {args.salida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            base = json.load(f)
+        regresiones = comparar(resultados, base, args.umbral)
+        if regresiones:
+            print(f"\n❌ Regresiones de tiempo: {', '.join(regresiones)}")
+            return 1
+        print("\n✅ Sin regresiones de tiempo")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
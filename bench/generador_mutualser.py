@@ -0,0 +1,216 @@
+"""
+Generador de libros sintéticos de respuesta MUTUALSER
+
+Arma archivos con la misma forma que los adjuntos reales: filas de preámbulo
+(EPS, NIT, radicado), una línea FECHA, el título 'Detalle de glosa', la tabla
+de detalle con columnas adicionales y filas TOTAL al final. Las facturas
+incluyen pares AU/TA de la misma tecnología para ejercitar su combinación.
+
+También genera el archivo de homologación correspondiente a las tecnologías
+usadas: códigos exactos, códigos que solo coinciden por dígitos, productos
+que no existen en COD_SERV_FACT y tecnologías sin homologar.
+
+Todo es determinístico para una misma semilla.
+"""
+import json
+import os
+import random
+from datetime import date, timedelta
+from typing import List, Optional
+
+from openpyxl import Workbook
+
+ENCABEZADOS = [
+    'Número de factura', 'Número de glosa', 'Tecnología', 'Nombre tecnología',
+    'Cantidad facturada', 'Valor Facturado', 'Cantidad glosada', 'Valor glosado',
+    'Concepto de glosa', 'Código de glosa', 'Observacion', 'Estado',
+]
+
+CONCEPTOS = {
+    'FA': 'FACTURACION', 'TA': 'TARIFAS', 'SO': 'SOPORTES',
+    'AU': 'AUTORIZACION', 'CO': 'COBERTURA', 'PE': 'PERTINENCIA',
+}
+
+OBSERVACIONES = [
+    'No se evidencia soporte de la atención',
+    'Tarifa superior a la pactada en el contrato',
+    'Servicio sin autorización previa',
+    'Cantidad facturada mayor a la soportada',
+    'Se glosa según auditoría médica',
+    '',
+]
+
+# Nombre del manifiesto que identifica un lote ya generado
+MANIFIESTO = 'manifiesto.json'
+
+# Cambiarla si cambia el contenido generado (invalida los lotes existentes)
+VERSION_GENERADOR = 1
+
+
+def _tecnologias(cantidad: int, rnd: random.Random) -> List[object]:
+    """Códigos de tecnología: numéricos (int), con guiones y alfanuméricos"""
+    codigos: List[object] = []
+    for i in range(cantidad):
+        tipo = i % 4
+        if tipo == 0:
+            codigos.append(890000 + i)
+        elif tipo == 1:
+            codigos.append(f"{19900000 + i}-{rnd.randint(1, 9)}")
+        elif tipo == 2:
+            codigos.append(f"MED{i:05d}")
+        else:
+            codigos.append(str(600000 + i))
+    return codigos
+
+
+def generar_homologacion(ruta: str, tecnologias: List[object], semilla: int = 0) -> str:
+    """
+    Escribe el archivo de homologación para las tecnologías dadas
+
+    Aproximadamente: 70% homologación exacta, 10% solo por dígitos,
+    10% con producto inexistente en COD_SERV_FACT y 10% sin fila.
+
+    Returns:
+        Ruta del archivo generado
+    """
+    rnd = random.Random(semilla)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Homologacion')
+    ws.append(['Código Servicio de la ERP', 'Código producto en DGH', 'COD_SERV_FACT'])
+
+    for i, tecnologia in enumerate(tecnologias):
+        caso = rnd.random()
+        producto = f"DGH{i:06d}"
+        if caso < 0.7:
+            ws.append([tecnologia, producto, producto])
+        elif caso < 0.8:
+            digitos = ''.join(filter(str.isdigit, str(tecnologia)))
+            ws.append([f"COD-{digitos}" if digitos else tecnologia, producto, f"X{producto}"])
+        elif caso < 0.9:
+            ws.append([tecnologia, f"NOEXISTE{i}", None])
+        # El resto queda sin homologar
+
+    wb.save(ruta)
+    return ruta
+
+
+def generar_libro(ruta: str, filas: int, rnd: random.Random, tecnologias: List[object],
+                  fecha: date, consecutivo: int = 0) -> int:
+    """
+    Escribe un libro de respuesta MUTUALSER
+
+    Args:
+        ruta: Ruta del .xlsx a generar
+        filas: Filas de detalle (sin contar preámbulo ni totales)
+        rnd: Generador aleatorio (determina el contenido)
+        tecnologias: Códigos de tecnología disponibles
+        fecha: Fecha del documento
+        consecutivo: Número del archivo (para facturas y glosas únicas)
+
+    Returns:
+        Filas de detalle escritas
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Hoja1')
+
+    # Preámbulo
+    ws.append(['MUTUALSER EPS'])
+    ws.append(['NIT', '806008394-7'])
+    ws.append([])
+    ws.append(['RESPUESTA A GLOSA - RADICADO', f"RAD{consecutivo:07d}"])
+    ws.append(['FECHA', fecha.isoformat()])
+    ws.append([])
+    ws.append(['Detalle de glosa'])
+    ws.append(ENCABEZADOS)
+
+    escritas = 0
+    total_glosado = 0
+    factura = 0
+    while escritas < filas:
+        factura += 1
+        numero_factura = f"FE{consecutivo:05d}{factura:04d}"
+        numero_glosa = 500000 + consecutivo * 1000 + factura
+        for _ in range(min(rnd.randint(1, 8), filas - escritas)):
+            tecnologia = rnd.choice(tecnologias)
+            cantidad = rnd.randint(1, 10)
+            valor = rnd.randint(5, 500) * 1000
+            glosado = valor * rnd.randint(1, cantidad) // cantidad
+            # AU seguida de TA sobre la misma tecnología en parte de los casos
+            prefijos = ['AU', 'TA'] if rnd.random() < 0.15 and escritas + 2 <= filas else [rnd.choice(list(CONCEPTOS))]
+            for prefijo in prefijos:
+                ws.append([
+                    numero_factura, numero_glosa, tecnologia, f"Servicio {tecnologia}",
+                    cantidad, valor, rnd.randint(1, cantidad), glosado,
+                    CONCEPTOS[prefijo], f"{prefijo}{rnd.randint(1, 60):02d}{rnd.randint(1, 9):02d}",
+                    rnd.choice(OBSERVACIONES), 'ABIERTA',
+                ])
+                total_glosado += glosado
+                escritas += 1
+
+    ws.append([])
+    ws.append(['TOTAL', None, None, None, None, None, None, total_glosado])
+    ws.append(['SUMA GLOSAS', None, None, None, None, None, None, total_glosado])
+    wb.save(ruta)
+    return escritas
+
+
+def generar_lote(directorio: str, archivos: int, filas: int, semilla: int = 0,
+                 tecnologias: int = 2000, variacion: float = 0.5) -> dict:
+    """
+    Genera un lote de libros MUTUALSER y su archivo de homologación
+
+    Si el directorio ya contiene un lote con los mismos parámetros se reutiliza.
+
+    Args:
+        directorio: Carpeta de salida
+        archivos: Cantidad de libros
+        filas: Filas de detalle promedio por libro
+        semilla: Semilla del generador aleatorio
+        tecnologias: Cantidad de códigos de tecnología distintos
+        variacion: Variación relativa de filas entre libros (0 = todos iguales)
+
+    Returns:
+        Manifiesto con parámetros, rutas de archivos, homologación y total de filas
+    """
+    parametros = {
+        'archivos': archivos, 'filas': filas, 'semilla': semilla,
+        'tecnologias': tecnologias, 'variacion': variacion,
+        'version_generador': VERSION_GENERADOR,
+    }
+    existente = _leer_manifiesto(directorio)
+    if existente and existente.get('parametros') == parametros and all(
+        os.path.exists(ruta) for ruta in existente['archivos'] + [existente['homologacion']]
+    ):
+        return existente
+
+    os.makedirs(directorio, exist_ok=True)
+    rnd = random.Random(semilla)
+    codigos = _tecnologias(tecnologias, rnd)
+    homologacion = generar_homologacion(os.path.join(directorio, 'mutualser_homologacion.xlsx'), codigos, semilla)
+
+    rutas = []
+    total_filas = 0
+    fecha_base = date(2025, 1, 1)
+    for i in range(archivos):
+        filas_libro = max(1, round(filas * (1 + rnd.uniform(-variacion, variacion))))
+        ruta = os.path.join(directorio, f"respuesta_glosa_{i:05d}.xlsx")
+        total_filas += generar_libro(ruta, filas_libro, rnd, codigos, fecha_base + timedelta(days=i % 365), i)
+        rutas.append(ruta)
+
+    manifiesto = {
+        'parametros': parametros,
+        'archivos': rutas,
+        'homologacion': homologacion,
+        'filas': total_filas,
+    }
+    with open(os.path.join(directorio, MANIFIESTO), 'w', encoding='utf-8') as f:
+        json.dump(manifiesto, f, indent=2)
+    return manifiesto
+
+
+def _leer_manifiesto(directorio: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(directorio, MANIFIESTO), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
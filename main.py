@@ -4,6 +4,7 @@ Ejecuta la nueva versión modular de la aplicación
 """
 import sys
 import os
+import multiprocessing
 
 # Agregar el directorio raíz al path para imports
 ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -18,4 +19,6 @@ from app.ui.app import main
 import flet as ft
 
 if __name__ == "__main__":
+    # Necesario para los procesos de lectura en paralelo en el ejecutable (PyInstaller)
+    multiprocessing.freeze_support()
     ft.app(target=main)
@@ -0,0 +1,147 @@
+"""
+Tests para el benchmark del pipeline MUTUALSER (bench/).
+
+Este módulo contiene tests unitarios para verificar:
+- Que los libros sintéticos se procesen como adjuntos reales
+- Reutilización de lotes ya generados
+- Medición de etapas anidadas
+- Resultados JSON y detección de regresiones
+"""
+import json
+import os
+from unittest.mock import patch
+
+from app.core.mutualser_processor import MutualserProcessor
+from bench import bench_mutualser, generador_mutualser
+from bench.bench_mutualser import Cronometro, comparar, ejecutar_benchmark
+
+
+class TestGeneradorMutualser:
+    """Tests para el generador de libros sintéticos."""
+
+    def test_libros_procesables(self, tmp_path):
+        """El procesador extrae todas las filas de detalle sin preámbulo ni totales"""
+        manifiesto = generador_mutualser.generar_lote(str(tmp_path), archivos=3, filas=40, tecnologias=50)
+        processor = MutualserProcessor(output_dir=str(tmp_path / 'salida'), cargar_homologacion=False)
+
+        df = processor.procesar_multiples_archivos(manifiesto['archivos'], paralelo=False)
+
+        assert len(df) == manifiesto['filas']
+        assert not df['Número de factura'].astype(str).str.contains('TOTAL|SUMA').any()
+        assert df['Fecha'].notna().all()
+        assert df['Código de glosa'].astype(str).str.startswith('AU').any()
+        assert df['Código de glosa'].astype(str).str.startswith('TA').any()
+
+    def test_homologacion_con_casos_mixtos(self, tmp_path):
+        """La homologación generada deja tecnologías homologadas y sin homologar"""
+        manifiesto = generador_mutualser.generar_lote(str(tmp_path), archivos=2, filas=80, tecnologias=40)
+        processor = MutualserProcessor(output_dir=str(tmp_path / 'salida'), cargar_homologacion=False)
+        processor.procesar_multiples_archivos(manifiesto['archivos'], paralelo=False)
+        processor.homologacion_path = manifiesto['homologacion']
+
+        processor._leer_homologacion()
+        processor._aplicar_homologacion()
+
+        codigos = processor.df_consolidado['Codigo homologado DGH']
+        assert (codigos != '').any()
+        assert (codigos == '').any()
+
+    def test_determinista_y_reutiliza_lote(self, tmp_path):
+        """Los mismos parámetros reutilizan el lote; otra semilla lo regenera"""
+        primero = generador_mutualser.generar_lote(str(tmp_path), archivos=2, filas=10, tecnologias=20)
+
+        with patch.object(generador_mutualser, 'generar_libro') as mock_generar:
+            segundo = generador_mutualser.generar_lote(str(tmp_path), archivos=2, filas=10, tecnologias=20)
+        assert mock_generar.call_count == 0
+        assert segundo == primero
+
+        otro = generador_mutualser.generar_lote(str(tmp_path), archivos=2, filas=10, tecnologias=20, semilla=1)
+        assert otro['parametros']['semilla'] == 1
+
+
+class TestCronometro:
+    """Tests para la medición de etapas."""
+
+    def test_etapas_anidadas(self):
+        """Las etapas hijas se nombran con la ruta de la padre y acumulan llamadas"""
+        cronometro = Cronometro()
+
+        with cronometro.medir('exportar'):
+            assert cronometro.etapa_actual() == 'exportar'
+            for _ in range(2):
+                with cronometro.medir('objeciones'):
+                    pass
+
+        assert list(cronometro.etapas) == ['exportar/objeciones', 'exportar']
+        assert cronometro.etapas['exportar']['segundos'] >= cronometro.etapas['exportar/objeciones']['segundos']
+        assert cronometro.etapa_actual() is None
+
+    def test_pico_padre_incluye_hijas(self):
+        """El pico de RSS de la etapa padre no es menor que el de sus hijas"""
+        cronometro = Cronometro()
+
+        with patch.object(bench_mutualser, 'pico_rss_mb', side_effect=[500.0, 100.0]):
+            with cronometro.medir('exportar'):
+                with cronometro.medir('consolidado'):
+                    pass
+
+        assert cronometro.etapas['exportar/consolidado']['rss_pico_mb'] == 500.0
+        assert cronometro.etapas['exportar']['rss_pico_mb'] == 500.0
+
+    def test_envolver_metodo(self):
+        """envolver mide cada llamada y conserva el resultado"""
+        class Objeto:
+            def calcular(self, x):
+                return x * 2
+
+        objeto = Objeto()
+        cronometro = Cronometro()
+        cronometro.envolver(objeto, 'calcular', 'calculo')
+
+        assert objeto.calcular(4) == 8
+        assert 'calculo' in cronometro.etapas
+
+
+class TestResultadosBenchmark:
+    """Tests para la corrida completa y la comparación."""
+
+    def test_corrida_completa(self, tmp_path):
+        """Una corrida mide todas las etapas del pipeline y es serializable"""
+        resultados = ejecutar_benchmark(archivos=2, filas=20, repeticiones=1, tecnologias=30,
+                                        datos_dir=str(tmp_path / 'datos'))
+
+        assert set(resultados['etapas']) == {
+            'lectura', 'carga_homologacion', 'exportar', 'exportar/homologacion',
+            'exportar/consolidado', 'exportar/objeciones', 'exportar/objeciones/au_ta',
+        }
+        corrida = resultados['repeticiones'][0]
+        assert corrida['exportado'] is True
+        assert corrida['registros'] == resultados['parametros']['filas_totales']
+        json.dumps(resultados)
+
+    def test_comparar_detecta_regresion(self):
+        """Solo las etapas más lentas que el umbral son regresiones"""
+        base = {'parametros': {'filas_totales': 10}, 'etapas': {
+            'lectura': {'segundos_mediana': 1.0, 'rss_pico_mb': 90.0},
+            'exportar': {'segundos_mediana': 2.0, 'rss_pico_mb': 95.0},
+        }}
+        actual = {'parametros': {'filas_totales': 10}, 'etapas': {
+            'lectura': {'segundos_mediana': 1.05, 'rss_pico_mb': 90.0},
+            'exportar': {'segundos_mediana': 3.0, 'rss_pico_mb': 99.0},
+            'nueva': {'segundos_mediana': 0.5, 'rss_pico_mb': None},
+        }}
+
+        assert comparar(actual, base, umbral=0.10) == ['exportar']
+
+    def test_main_guarda_json(self, tmp_path):
+        """main guarda los resultados y retorna 0 sin regresiones"""
+        salida = tmp_path / 'resultados.json'
+
+        codigo = bench_mutualser.main([
+            '--archivos', '1', '--filas', '10', '--repeticiones', '1', '--tecnologias', '20',
+            '--datos', str(tmp_path / 'datos'), '--salida', str(salida),
+        ])
+
+        assert codigo == 0
+        assert os.path.exists(salida)
+        assert json.loads(salida.read_text(encoding='utf-8'))['version_formato'] == bench_mutualser.VERSION_FORMATO
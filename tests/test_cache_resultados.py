@@ -0,0 +1,104 @@
+"""
+Tests para la caché de resultados por archivo (cache_resultados.py).
+
+Este módulo contiene tests unitarios para verificar:
+- Guardado y lectura de DataFrames conservando tipos
+- Claves por contenido y extensión del archivo
+- Invalidación por versión, entradas dañadas y poda
+"""
+import os
+import time
+
+import pandas as pd
+
+from app.core.cache_resultados import CacheResultados
+
+
+def _escribir(path, contenido=b'contenido'):
+    with open(path, 'wb') as f:
+        f.write(contenido)
+    return str(path)
+
+
+class TestCacheResultadosClaves:
+    """Tests para las claves de caché."""
+    
+    def test_misma_clave_para_mismo_contenido(self, tmp_path):
+        """La clave depende del contenido, no del nombre"""
+        cache = CacheResultados(str(tmp_path / 'cache'), 'v1')
+        a = _escribir(tmp_path / 'a.xlsx')
+        b = _escribir(tmp_path / 'b.xlsx')
+        
+        assert cache.clave_archivo(a) == cache.clave_archivo(b)
+    
+    def test_clave_cambia_con_contenido_y_extension(self, tmp_path):
+        """Contenido o extensión distintos generan claves distintas"""
+        cache = CacheResultados(str(tmp_path / 'cache'), 'v1')
+        base = cache.clave_archivo(_escribir(tmp_path / 'a.xlsx'))
+        
+        assert cache.clave_archivo(_escribir(tmp_path / 'b.xlsx', b'otro')) != base
+        assert cache.clave_archivo(_escribir(tmp_path / 'a.csv')) != base
+    
+    def test_clave_de_varios_archivos(self, tmp_path):
+        """La clave de varios archivos depende de su orden y coincide con la de uno solo"""
+        cache = CacheResultados(str(tmp_path / 'cache'), 'v1')
+        a = _escribir(tmp_path / 'a.xlsx')
+        b = _escribir(tmp_path / 'b.xlsx', b'otro')
+        
+        assert cache.clave_archivos([a]) == cache.clave_archivo(a)
+        assert cache.clave_archivos([a, b]) != cache.clave_archivos([b, a])
+        assert cache.clave_archivos([a, str(tmp_path / 'no_existe.xlsx')]) is None
+    
+    def test_archivo_inexistente_sin_clave(self, tmp_path):
+        """Un archivo que no se puede leer no tiene clave"""
+        cache = CacheResultados(str(tmp_path / 'cache'), 'v1')
+        assert cache.clave_archivo(str(tmp_path / 'no_existe.xlsx')) is None
+        assert cache.obtener(None) is None
+
+
+class TestCacheResultadosAlmacenamiento:
+    """Tests para guardar y recuperar DataFrames."""
+    
+    def test_guardar_y_obtener_conserva_tipos(self, tmp_path):
+        """El DataFrame recuperado es idéntico al guardado"""
+        cache = CacheResultados(str(tmp_path / 'cache'), 'v1')
+        df = pd.DataFrame({
+            'Número de factura': ['FE1', 'FE2'],
+            'Valor glosado': [100, 200],
+            'Fecha': pd.to_datetime(['2025-03-15', '2025-03-16']),
+        })
+        
+        assert cache.guardar('clave', df) is True
+        pd.testing.assert_frame_equal(cache.obtener('clave'), df)
+        assert cache.aciertos == 1
+    
+    def test_cambio_de_version_descarta_entradas(self, tmp_path):
+        """Otra versión no ve las entradas anteriores y las elimina"""
+        directorio = str(tmp_path / 'cache')
+        CacheResultados(directorio, 'v1').guardar('clave', pd.DataFrame({'a': [1]}))
+        
+        cache = CacheResultados(directorio, 'v2')
+        
+        assert cache.obtener('clave') is None
+        assert os.listdir(directorio) == [cache.version]
+    
+    def test_entrada_danada_se_descarta(self, tmp_path):
+        """Un archivo ilegible se trata como ausente y se borra"""
+        cache = CacheResultados(str(tmp_path / 'cache'), 'v1')
+        ruta = os.path.join(cache.directorio, 'clave' + CacheResultados.EXTENSION)
+        _escribir(ruta, b'no es pickle')
+        
+        assert cache.obtener('clave') is None
+        assert not os.path.exists(ruta)
+    
+    def test_podar_conserva_las_mas_recientes(self, tmp_path):
+        """La poda borra las entradas de uso más antiguo"""
+        cache = CacheResultados(str(tmp_path / 'cache'), 'v1', max_entradas=2)
+        for i, clave in enumerate(['a', 'b', 'c']):
+            cache.guardar(clave, pd.DataFrame({'a': [i]}))
+            ruta = os.path.join(cache.directorio, clave + CacheResultados.EXTENSION)
+            os.utime(ruta, (time.time() - 100 + i, time.time() - 100 + i))
+        
+        assert cache.podar() == 1
+        assert cache.obtener('a') is None
+        assert cache.obtener('c') is not None
@@ -2,9 +2,15 @@
 Tests para coosalud_processor.py
 Cubre: lógica crítica de procesamiento de archivos
 """
+import os
 import pytest
+import numpy as np
 import pandas as pd
-from app.service.processors.coosalud_processor import CoosaludProcessor
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from unittest.mock import patch
+from app.service.attachment_service import AttachmentService
+from app.service.processors.coosalud_processor import CoosaludProcessor, _cargar_par
 
 
 class TestCoosaludProcessor:
@@ -312,3 +318,601 @@ class TestCoosaludProcessor:
         loaded = pd.read_excel(output_path, sheet_name=None)
         assert 'Detalles' in loaded
         assert 'Glosa' in loaded
+
+
+def _crear_pares(tmp_path, cantidad):
+    """Crea pares DETALLE/GLOSAS FC{n}.xlsx y retorna las rutas"""
+    rutas = []
+    for n in range(cantidad):
+        detalle = tmp_path / f"DETALLE FC{1000 + n}.xlsx"
+        glosa = tmp_path / f"GLOSAS FC{1000 + n}.xlsx"
+        pd.DataFrame({
+            'id_detalle': [n * 10 + 1, n * 10 + 2],
+            'codigo_servicio': ['890201', '999999'],
+        }).to_excel(detalle, index=False)
+        pd.DataFrame({
+            'id_detalle': [n * 10 + 1],
+            'codigo_glosa': [f'AU{n}'],
+            'justificacion_glosa': [f'Justificación {n}'],
+        }).to_excel(glosa, index=False)
+        rutas.extend([str(detalle), str(glosa)])
+    return rutas
+
+
+class _PoolQueSeRompe:
+    """ProcessPoolExecutor falso: resuelve los primeros trabajos y luego se rompe"""
+    
+    def __init__(self, sanos):
+        self.sanos = sanos
+        self.enviados = 0
+    
+    def __call__(self, max_workers=None):
+        return self
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        return False
+    
+    def submit(self, fn, *args):
+        futuro = Future()
+        self.enviados += 1
+        if self.enviados <= self.sanos:
+            futuro.set_result(fn(*args))
+        else:
+            futuro.set_exception(BrokenProcessPool("proceso terminado"))
+        return futuro
+
+
+class TestCoosaludCargaPares:
+    """Tests para la lectura de pares DETALLE/GLOSAS en serie y en paralelo"""
+    
+    def test_paralelo_igual_a_serie(self, tmp_path):
+        """Leer en procesos da el mismo resultado y orden que en serie"""
+        rutas = _crear_pares(tmp_path, 4)
+        
+        serie, _ = CoosaludProcessor().process_glosas(rutas, paralelo=False)
+        paralelo, _ = CoosaludProcessor().process_glosas(rutas, paralelo=True, max_workers=2)
+        
+        pd.testing.assert_frame_equal(paralelo['detalle'].drop(columns=['fecha_correo']),
+                                      serie['detalle'].drop(columns=['fecha_correo']))
+        pd.testing.assert_frame_equal(paralelo['glosa'], serie['glosa'])
+        assert paralelo['detalle']['_FACTURA'].unique().tolist() == ['FC1000', 'FC1001', 'FC1002', 'FC1003']
+    
+    def test_par_con_error(self, tmp_path):
+        """Un par ilegible queda en warnings y el resto se procesa"""
+        rutas = _crear_pares(tmp_path, 3)
+        (tmp_path / "GLOSAS FC1001.xlsx").write_bytes(b"no es un excel")
+        processor = CoosaludProcessor()
+        
+        for paralelo in (False, True):
+            result, _ = processor.process_glosas(rutas, paralelo=paralelo, max_workers=2)
+            
+            assert result['detalle']['_FACTURA'].unique().tolist() == ['FC1000', 'FC1002']
+            assert len(processor.warnings) == 1
+            assert 'FC1001' in processor.warnings[0]
+    
+    def test_progreso_por_par(self, tmp_path):
+        """progress_callback se llama una vez por par con el total de pares"""
+        rutas = _crear_pares(tmp_path, 3)
+        
+        for paralelo in (False, True):
+            llamadas = []
+            CoosaludProcessor().process_glosas(
+                rutas, paralelo=paralelo, max_workers=2,
+                progress_callback=lambda c, t, f, llamadas=llamadas: llamadas.append((c, t, f))
+            )
+            
+            assert [(c, t) for c, t, _ in llamadas] == [(1, 3), (2, 3), (3, 3)]
+            assert sorted(f for _, _, f in llamadas) == ['FC1000', 'FC1001', 'FC1002']
+    
+    def test_pool_roto_conserva_pares_leidos(self, tmp_path):
+        """Si el pool se rompe a mitad, solo se leen en serie los pares sin resultado"""
+        rutas = _crear_pares(tmp_path, 4)
+        serie, _ = CoosaludProcessor().process_glosas(rutas, paralelo=False)
+        processor = CoosaludProcessor()
+        llamadas = []
+        
+        with patch('app.service.processors.coosalud_processor.ProcessPoolExecutor', _PoolQueSeRompe(sanos=2)), \
+             patch.object(processor, '_cargar_pares_en_serie', wraps=processor._cargar_pares_en_serie) as en_serie:
+            result, _ = processor.process_glosas(
+                rutas, paralelo=True, max_workers=2,
+                progress_callback=lambda c, t, f: llamadas.append((c, t))
+            )
+        
+        assert [len(pares) for pares, *_ in (c.args for c in en_serie.call_args_list)] == [2]
+        assert llamadas == [(1, 4), (2, 4), (3, 4), (4, 4)]
+        pd.testing.assert_frame_equal(result['glosa'], serie['glosa'])
+        assert result['detalle']['_FACTURA'].unique().tolist() == ['FC1000', 'FC1001', 'FC1002', 'FC1003']
+    
+    def test_sin_pool_lee_en_serie(self, tmp_path):
+        """Si el pool no puede crearse se lee en serie"""
+        rutas = _crear_pares(tmp_path, 2)
+        
+        with patch('app.service.processors.coosalud_processor.ProcessPoolExecutor', side_effect=OSError("sin procesos")):
+            result, _ = CoosaludProcessor().process_glosas(rutas, paralelo=True)
+        
+        assert len(result['detalle']) == 4
+
+
+class TestCoosaludCachePares:
+    """Tests para la caché de pares entre corridas"""
+    
+    def test_segunda_corrida_no_lee_excel(self, tmp_path):
+        """Los pares sin cambios se toman de la caché con el mismo resultado"""
+        rutas = _crear_pares(tmp_path, 3)
+        cache_dir = str(tmp_path / 'cache')
+        esperado, _ = CoosaludProcessor(cache_dir=cache_dir).process_glosas(rutas, email_date='2025-01-05', paralelo=False)
+        
+        with patch('app.service.processors.coosalud_processor._cargar_par') as mock_cargar:
+            resultado, _ = CoosaludProcessor(cache_dir=cache_dir).process_glosas(rutas, email_date='2025-01-05', paralelo=False)
+        
+        mock_cargar.assert_not_called()
+        pd.testing.assert_frame_equal(resultado['detalle'], esperado['detalle'])
+        pd.testing.assert_frame_equal(resultado['glosa'], esperado['glosa'])
+    
+    def test_solo_lee_pares_nuevos_o_modificados(self, tmp_path):
+        """Un par modificado y uno nuevo se leen; el resto sale de la caché, en orden"""
+        rutas = _crear_pares(tmp_path, 3)
+        cache_dir = str(tmp_path / 'cache')
+        CoosaludProcessor(cache_dir=cache_dir).process_glosas(rutas[:4], paralelo=False)
+        pd.DataFrame({
+            'id_detalle': [11],
+            'codigo_glosa': ['FA9'],
+            'justificacion_glosa': ['Modificada'],
+        }).to_excel(rutas[3], index=False)
+        
+        avances = []
+        with patch('app.service.processors.coosalud_processor._cargar_par', wraps=_cargar_par) as mock_cargar:
+            resultado, _ = CoosaludProcessor(cache_dir=cache_dir).process_glosas(
+                rutas, paralelo=False,
+                progress_callback=lambda completados, total, _: avances.append((completados, total))
+            )
+        
+        assert [c.args[1] for c in mock_cargar.call_args_list] == ['FC1001', 'FC1002']
+        assert avances == [(1, 3), (2, 3), (3, 3)]
+        assert resultado['detalle']['_FACTURA'].unique().tolist() == ['FC1000', 'FC1001', 'FC1002']
+        assert resultado['glosa']['codigo_glosa'].tolist() == ['AU0', 'FA9', 'AU2']
+    
+    def test_par_con_error_no_se_guarda(self, tmp_path):
+        """Un par ilegible no entra a la caché y se vuelve a intentar"""
+        rutas = _crear_pares(tmp_path, 1)
+        (tmp_path / "GLOSAS FC1000.xlsx").write_bytes(b"no es un excel")
+        processor = CoosaludProcessor(cache_dir=str(tmp_path / 'cache'))
+        
+        processor.process_glosas(rutas, paralelo=False)
+        
+        assert not [n for n in os.listdir(processor.cache.directorio) if n.endswith('.pkl')]
+    
+    def test_sin_cache_por_defecto(self):
+        """Sin cache_dir no se usa caché"""
+        assert CoosaludProcessor().cache is None
+
+
+class TestCoosaludClasificacionContenido:
+    """Tests para la clasificación de archivos por su encabezado"""
+    
+    def test_archivos_renombrados(self, tmp_path):
+        """Archivos sin palabra clave en el nombre se clasifican por sus columnas"""
+        rutas = _crear_pares(tmp_path, 2)
+        renombrado = tmp_path / "reenviado FC1001.xlsx"
+        os.replace(rutas[3], renombrado)
+        rutas[3] = str(renombrado)
+        processor = CoosaludProcessor()
+        
+        pairs = processor.identify_file_pairs(rutas)
+        
+        assert [p['factura'] for p in pairs] == ['FC1000', 'FC1001']
+        assert pairs[1]['glosa'] == str(renombrado)
+        assert any('reenviado FC1001.xlsx' in w for w in processor.warnings)
+    
+    def test_nombres_intercambiados(self, tmp_path):
+        """Un DETALLE con columnas de glosa (y viceversa) se empareja según su contenido"""
+        rutas = _crear_pares(tmp_path, 1)
+        detalle, glosa = rutas
+        temporal = tmp_path / "tmp.xlsx"
+        os.replace(detalle, temporal)
+        os.replace(glosa, detalle)
+        os.replace(temporal, glosa)
+        
+        pairs = CoosaludProcessor().identify_file_pairs(rutas)
+        assert pairs == [{"detalle": glosa, "glosa": detalle, "factura": "FC1000"}]
+        
+        pairs_nombre = CoosaludProcessor().identify_file_pairs(rutas, por_contenido=False)
+        assert pairs_nombre == [{"detalle": detalle, "glosa": glosa, "factura": "FC1000"}]
+    
+    def test_devolucion_por_contenido(self, tmp_path):
+        """Un archivo con columnas de devolución se ignora aunque el nombre diga DETALLE"""
+        rutas = _crear_pares(tmp_path, 1)
+        pd.DataFrame({'numero_factura': ['1'], 'motivo_devolucion': ['x']}).to_excel(rutas[0], index=False)
+        
+        assert CoosaludProcessor().identify_file_pairs(rutas) == []
+    
+    def test_columnas_de_devolucion_en_glosa_y_detalle(self, tmp_path):
+        """Una columna de devolución no descarta archivos con firma de GLOSA o DETALLE"""
+        rutas = _crear_pares(tmp_path, 1)
+        pd.DataFrame({
+            'id_detalle': [1], 'codigo_servicio': ['890201'], 'fecha_devolucion': [None],
+        }).to_excel(rutas[0], index=False)
+        pd.DataFrame({
+            'id_detalle': [1], 'codigo_glosa': ['AU01'], 'justificacion_glosa': ['x'], 'valor_devolucion': [0],
+        }).to_excel(rutas[1], index=False)
+        
+        pairs = CoosaludProcessor().identify_file_pairs(rutas)
+        
+        assert pairs == [{"detalle": rutas[0], "glosa": rutas[1], "factura": "FC1000"}]
+    
+    def test_encabezado_desconocido_usa_nombre(self, tmp_path):
+        """Si las columnas no identifican el tipo se respeta el nombre"""
+        rutas = _crear_pares(tmp_path, 1)
+        pd.DataFrame({'otra': [1]}).to_excel(rutas[0], index=False)
+        
+        assert len(CoosaludProcessor().identify_file_pairs(rutas)) == 1
+    
+    def test_tipo_memorizado_por_contenido(self, tmp_path):
+        """El mismo contenido con otro nombre no vuelve a abrir el archivo"""
+        rutas = _crear_pares(tmp_path, 1)
+        copia = tmp_path / "copia.xlsx"
+        copia.write_bytes(open(rutas[1], 'rb').read())
+        processor = CoosaludProcessor()
+        
+        assert processor._tipo_por_contenido(rutas[1]) == CoosaludProcessor.TIPO_GLOSA
+        with patch('app.service.processors.coosalud_processor.leer_encabezado') as mock_leer:
+            assert processor._tipo_por_contenido(str(copia)) == CoosaludProcessor.TIPO_GLOSA
+        mock_leer.assert_not_called()
+
+
+class TestCoosaludHomologacionMasiva:
+    """Tests para la homologación de detalles en procesamiento masivo"""
+    
+    @staticmethod
+    def _processor(homologador_df):
+        processor = CoosaludProcessor()
+        processor.homologador_df = homologador_df
+        return processor
+    
+    def test_homologa_con_codigos_normalizados(self):
+        """Números, texto con espacios y minúsculas coinciden con el homologador"""
+        processor = self._processor(pd.DataFrame({
+            'Código Servicio de la ERP': [890201, 'abc1', 555, 777],
+            'Código producto en DGH': ['DGH1', 'dgh2', 0, 'DGH4'],
+        }))
+        detalle = pd.DataFrame({'codigo_servicio': [890201.0, ' ABC1 ', '555', np.nan, 'X9', 890201]})
+        
+        result = processor._homologate_detalle_silent(detalle)
+        
+        assert result['Codigo homologado DGH'].tolist() == ['DGH1', 'DGH2', '', '', '', 'DGH1']
+        assert result['Codigo no homologado'].tolist() == ['', '', '555', '', 'X9', '']
+        assert 'codigo_glosa' not in result.columns
+    
+    def test_igual_a_homologacion_detallada(self):
+        """La versión masiva da las mismas columnas que _homologate_detalle"""
+        processor = self._processor(pd.DataFrame({
+            'Código Servicio de la ERP': ['890201', '890202', '890202', None],
+            'Código producto en DGH': ['CUPS001', 'CUPS002', 'CUPS003', 'CUPS004'],
+        }))
+        detalle = pd.DataFrame({'codigo_servicio': ['890201', 890202, '999999', None]})
+        
+        masivo = processor._homologate_detalle_silent(detalle)
+        detallado = processor._homologate_detalle(detalle)
+        
+        pd.testing.assert_frame_equal(masivo, detallado)
+        assert masivo['Codigo homologado DGH'].tolist() == ['CUPS001', 'CUPS003', '', '']
+    
+    def test_diccionario_se_arma_una_vez(self):
+        """El diccionario se arma una vez por homologador cargado"""
+        processor = self._processor(pd.DataFrame({
+            'Código Servicio de la ERP': ['1'], 'Código producto en DGH': ['A'],
+        }))
+        detalle = pd.DataFrame({'codigo_servicio': ['1', '2']})
+        
+        with patch.object(processor, '_build_homologation_dict', wraps=processor._build_homologation_dict) as mock_build:
+            for _ in range(3):
+                processor._homologate_detalle_silent(detalle)
+            assert mock_build.call_count == 1
+            
+            processor.homologador_df = pd.DataFrame({
+                'Código Servicio de la ERP': ['2'], 'Código producto en DGH': ['B'],
+            })
+            result = processor._homologate_detalle_silent(detalle)
+            assert mock_build.call_count == 2
+        
+        assert result['Codigo homologado DGH'].tolist() == ['', 'B']
+
+
+class TestCoosaludRegistroHomologadores:
+    """Tests para el registro de homologadores compartido entre instancias"""
+    
+    @pytest.fixture(autouse=True)
+    def registro_limpio(self):
+        CoosaludProcessor.limpiar_registro_homologadores()
+        yield
+        CoosaludProcessor.limpiar_registro_homologadores()
+    
+    @staticmethod
+    def _guardar(ruta, codigos, destinos):
+        pd.DataFrame({
+            'Código Servicio de la ERP': codigos,
+            'Código producto en DGH': destinos,
+        }).to_excel(ruta, index=False)
+    
+    def test_instancias_comparten_lectura(self, tmp_path):
+        """Varias instancias con la misma ruta leen el archivo una sola vez"""
+        ruta = tmp_path / "homologador.xlsx"
+        self._guardar(ruta, ['890201'], ['DGH1'])
+        
+        with patch('app.service.processors.coosalud_processor.pd.read_excel', wraps=pd.read_excel) as mock_leer:
+            primero = CoosaludProcessor(homologador_path=str(ruta))
+            segundo = CoosaludProcessor(homologador_path=str(ruta))
+            assert primero.load_homologador()
+            assert segundo.load_homologador()
+        
+        assert mock_leer.call_count == 1
+        assert segundo.homologador_df is primero.homologador_df
+        assert segundo._diccionario_homologacion() == {'890201': 'DGH1'}
+    
+    def test_recarga_si_el_archivo_cambia(self, tmp_path):
+        """Un cambio de mtime o tamaño invalida la entrada del registro"""
+        ruta = tmp_path / "homologador.xlsx"
+        self._guardar(ruta, ['890201'], ['DGH1'])
+        CoosaludProcessor(homologador_path=str(ruta)).load_homologador()
+        
+        self._guardar(ruta, ['890201', '890202'], ['DGH1', 'DGH2'])
+        stat = os.stat(ruta)
+        os.utime(ruta, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        processor = CoosaludProcessor(homologador_path=str(ruta))
+        
+        assert processor.load_homologador()
+        assert processor._diccionario_homologacion() == {'890201': 'DGH1', '890202': 'DGH2'}
+    
+    def test_recarga_con_cambios_del_journal(self, tmp_path):
+        """Un guardado del CRUD (solo journal) invalida la entrada del registro"""
+        from app.core.homologacion_service import HomologacionService
+        
+        ruta = tmp_path / "coosalud_homologacion.xlsx"
+        self._guardar(ruta, ['890201'], ['DGH1'])
+        assert CoosaludProcessor(homologador_path=str(ruta)).load_homologador()
+        
+        service = HomologacionService()
+        service.homologacion_path = str(ruta)
+        service.columnas_actuales = HomologacionService.EPS_COLUMNAS['coosalud']
+        service.eps = 'coosalud'
+        service._cargar()
+        assert service.agregar('890202', 'DGH2')
+        HomologacionService.clear_all_cache()
+        
+        processor = CoosaludProcessor(homologador_path=str(ruta))
+        assert processor.load_homologador()
+        assert processor._diccionario_homologacion() == {'890201': 'DGH1', '890202': 'DGH2'}
+    
+    def test_precarga_en_segundo_plano(self, tmp_path):
+        """Tras la precarga, cargar el homologador no vuelve a leer el archivo"""
+        ruta = tmp_path / "homologador.xlsx"
+        self._guardar(ruta, ['890201'], ['DGH1'])
+        
+        hilo = CoosaludProcessor.precargar_homologador(str(ruta))
+        assert hilo is not None
+        hilo.join()
+        
+        with patch('app.service.processors.coosalud_processor.pd.read_excel') as mock_leer:
+            processor = CoosaludProcessor(homologador_path=str(ruta))
+            assert processor.load_homologador()
+        
+        assert mock_leer.call_count == 0
+        assert len(processor.homologador_df) == 1
+    
+    def test_archivo_inexistente(self, tmp_path):
+        """Sin archivo se registra el error y la precarga no lanza excepciones"""
+        ruta = str(tmp_path / "no_existe.xlsx")
+        processor = CoosaludProcessor(homologador_path=ruta)
+        
+        assert processor.load_homologador() is False
+        assert "no encontrado" in processor.errors[0]
+        CoosaludProcessor.precargar_homologador(ruta).join()
+
+
+class TestCoosaludFechasCorreo:
+    """Tests para la asignación de fecha_correo desde los metadatos de adjuntos"""
+    
+    def test_fecha_por_factura(self, tmp_path):
+        """Cada fila toma la fecha del correo de su DETALLE; sin metadatos usa la actual"""
+        rutas = _crear_pares(tmp_path, 3)
+        adjuntos = AttachmentService(base_dir=str(tmp_path / 'adjuntos'))
+        adjuntos.file_metadata = {
+            rutas[0]: {"email_date": "2025-01-10 08:00:00"},
+            rutas[4]: {"email_date": "2025-02-20 09:30:00"},
+        }
+        
+        result, _ = CoosaludProcessor().process_glosas(rutas, attachment_service=adjuntos, paralelo=False)
+        
+        fechas = result['detalle'].groupby('_FACTURA')['fecha_correo'].unique()
+        assert fechas['FC1000'].tolist() == ["2025-01-10 08:00:00"]
+        assert fechas['FC1002'].tolist() == ["2025-02-20 09:30:00"]
+        assert len(fechas['FC1001']) == 1
+        assert fechas['FC1001'][0] not in ("", "2025-01-10 08:00:00", "2025-02-20 09:30:00")
+    
+    def test_mapa_usa_ultimo_par_de_la_factura(self):
+        """Si dos pares comparten factura prevalece el último, como en la asignación por par"""
+        adjuntos = type('Adjuntos', (), {})()
+        adjuntos.file_metadata = {
+            'a.xlsx': {"email_date": "2025-01-01"},
+            'b.xlsx': {"email_date": "2025-03-03"},
+        }
+        pairs = [
+            {"factura": "FC1", "detalle": "a.xlsx", "glosa": "ga.xlsx"},
+            {"factura": "FC1", "detalle": "b.xlsx", "glosa": "gb.xlsx"},
+            {"factura": "FC2", "detalle": "c.xlsx", "glosa": "gc.xlsx"},
+        ]
+        
+        fechas, con_fecha, sin_fecha = CoosaludProcessor()._fechas_correo_por_factura(pairs, adjuntos)
+        
+        assert fechas["FC1"] == "2025-03-03"
+        assert set(fechas) == {"FC1", "FC2"}
+        assert (con_fecha, sin_fecha) == (2, 1)
+
+
+class TestCoosaludPorLotes:
+    """Tests para el procesamiento por lotes con escritura incremental"""
+    
+    @staticmethod
+    def _leer_salidas(directorio):
+        """Hojas de cada archivo de salida, por prefijo del nombre"""
+        return {
+            ruta.name.split('_')[0]: pd.read_excel(ruta, sheet_name=None)
+            for ruta in directorio.glob('*.xlsx')
+        }
+    
+    def test_salidas_iguales_a_completo(self, tmp_path):
+        """Por lotes se escriben las mismas hojas y filas que combinando todo"""
+        rutas = _crear_pares(tmp_path, 5)
+        completo_dir = tmp_path / 'completo'
+        lotes_dir = tmp_path / 'lotes'
+        completo_dir.mkdir()
+        lotes_dir.mkdir()
+        
+        CoosaludProcessor().process_glosas(rutas, output_dir=str(completo_dir), email_date='2025-01-05',
+                                           por_lotes=False, paralelo=False)
+        resumen, message = CoosaludProcessor().process_glosas(rutas, output_dir=str(lotes_dir), email_date='2025-01-05',
+                                                              por_lotes=True, pares_por_lote=2, paralelo=False)
+        
+        assert "[OK]" in message
+        assert resumen['detalle_filas'] == 10
+        esperado = self._leer_salidas(completo_dir)
+        obtenido = self._leer_salidas(lotes_dir)
+        assert set(obtenido) == {'COOSALUD', 'Objeciones'}
+        for archivo, hojas in esperado.items():
+            for hoja, df in hojas.items():
+                pd.testing.assert_frame_equal(obtenido[archivo][hoja], df)
+    
+    def test_progreso_acumulado_entre_lotes(self, tmp_path):
+        """El progreso se reporta sobre el total de pares, no por lote"""
+        rutas = _crear_pares(tmp_path, 3)
+        avances = []
+        
+        CoosaludProcessor().process_glosas(
+            rutas, output_dir=str(tmp_path), por_lotes=True, pares_por_lote=2, paralelo=False,
+            progress_callback=lambda completados, total, factura: avances.append((completados, total, factura))
+        )
+        
+        assert avances == [(1, 3, 'FC1000'), (2, 3, 'FC1001'), (3, 3, 'FC1002')]
+    
+    def test_sin_directorio_procesa_completo(self, tmp_path):
+        """Sin directorio de salida se retornan los DataFrames combinados"""
+        rutas = _crear_pares(tmp_path, 2)
+        
+        result, _ = CoosaludProcessor().process_glosas(rutas, por_lotes=True, paralelo=False)
+        
+        assert isinstance(result['detalle'], pd.DataFrame)
+        assert len(result['detalle']) == 4
+    
+    def test_consecutivo_continua_entre_lotes(self):
+        """CDCONSEC sigue la numeración de facturas de los lotes anteriores"""
+        processor = CoosaludProcessor()
+        consecutivos = {}
+        lote1 = pd.DataFrame({'numero_factura': ['100', '200', '100']})
+        lote2 = pd.DataFrame({'numero_factura': ['200', '300']})
+        
+        obj1 = processor._construir_objeciones(lote1, consecutivos=consecutivos)
+        obj2 = processor._construir_objeciones(lote2, consecutivos=consecutivos)
+        
+        assert obj1['CDCONSEC'].tolist() == [1, 2, 1]
+        assert obj2['CDCONSEC'].tolist() == [2, 3]
+
+
+class TestCoosaludAgregacionGlosas:
+    """Tests para la agregación vectorizada de codigo_glosa y justificacion_glosa"""
+    
+    def test_ta_al_final_ordena_y_luego_quita_repetidas(self):
+        """_prepare_glosa_merge ordena por (es TA, código) antes de quitar repetidas"""
+        glosa_df = pd.DataFrame({
+            'id_detalle': [1, 1, 1, 1],
+            'codigo_glosa': ['203', 'SO1', 'AU2', 'FA9'],
+            'justificacion_glosa': ['Tarifa', 'Soporte', 'Tarifa', ' Factura '],
+        })
+        
+        result = CoosaludProcessor()._prepare_glosa_merge(glosa_df)
+        
+        # AU2 < FA9 < SO1 y luego TA0301; 'Tarifa' queda en la posición de AU2
+        assert result.loc[0, 'justificacion_glosa'] == 'Tarifa // Factura // Soporte'
+        assert result.loc[0, 'codigo_glosa'] == 'FA9'
+    
+    def test_prioridad_quita_repetidas_y_luego_ordena(self):
+        """El merge directo conserva el código de la primera aparición de cada texto"""
+        glosa_df = pd.DataFrame({
+            'id_detalle': [1, 1, 1, 1, 2],
+            'codigo_glosa': ['203', 'SO1', 'AU2', 'XX1', None],
+            'justificacion_glosa': ['Tarifa', 'Soporte', 'Tarifa', 'Otra', 'Sin código'],
+        })
+        
+        result = CoosaludProcessor()._prepare_glosa_merge_by_id_detalle_direct(glosa_df)
+        
+        # 'Tarifa' queda con su primer código (TA) y va al final junto a 'Otra'
+        assert result['justificacion_glosa'].tolist() == ['Soporte // Tarifa // Otra', 'Sin código']
+        assert result['codigo_glosa'].tolist() == ['SO1', '']
+    
+    def test_codigo_prioritario_y_ta(self):
+        """Se elige FA > SO > AU > CO > CL > TA > otros, a igualdad el primero"""
+        glosa_df = pd.DataFrame({
+            'id_detalle': [1, 1, 2, 2, 3, 3],
+            'codigo_glosa': ['XX1', '201', 'CL2', 'CL1', 'YY', 'ZZ'],
+        })
+        
+        result = CoosaludProcessor()._prepare_glosa_merge(glosa_df)
+        
+        assert result['codigo_glosa'].tolist() == ['TA0101', 'CL2', 'YY']
+        assert list(result.columns) == ['id_detalle', 'codigo_glosa']
+    
+    def test_regla_ids_repetidos(self):
+        """by_id_detalle usa IDs repetidos del grupo o, si no hay, solo el primer ID"""
+        glosa_df = pd.DataFrame({
+            'numero_factura': ['F1', 'F1', 'F1', 'F2', 'F2'],
+            'id_detalle': [10, 11, 11, 20, 21],
+            'codigo_glosa': ['FA1', 'SO1', 'AU1', 'CO1', 'FA2'],
+            'justificacion_glosa': ['J10', 'J11a', 'J11b', 'J20', 'J21'],
+        })
+        
+        result = CoosaludProcessor()._prepare_glosa_merge_by_id_detalle(glosa_df, ['numero_factura'])
+        
+        assert result['codigo_glosa'].tolist() == ['SO1', 'CO1']
+        assert result['justificacion_glosa'].tolist() == ['J11a // J11b', 'J20']
+    
+    def test_claves_nan_se_descartan(self):
+        """Las filas sin id_detalle no forman grupo; sin grupos el resultado es vacío"""
+        processor = CoosaludProcessor()
+        glosa_df = pd.DataFrame({'id_detalle': [np.nan, 1.0], 'codigo_glosa': ['FA1', 'SO1']})
+        
+        assert processor._prepare_glosa_merge(glosa_df)['id_detalle'].tolist() == [1.0]
+        assert processor._prepare_glosa_merge(glosa_df.iloc[:1]).empty
+    
+    def test_homologa_cada_codigo_una_vez(self):
+        """Cada codigo_glosa distinto se homologa una sola vez"""
+        processor = CoosaludProcessor()
+        codigos = pd.Series(['203', '430', None, '203'] * 100)
+        
+        with patch.object(processor, '_homologar_codigo_glosa', wraps=processor._homologar_codigo_glosa) as mock_homologar:
+            result = processor._homologar_codigos_glosa(codigos)
+        
+        assert mock_homologar.call_count == 2
+        assert result.tolist()[:4] == ['TA0301', 'AU2103', '', 'TA0301']
+    
+    def test_homologacion_memorizada_entre_instancias(self):
+        """El mismo texto de código se resuelve una vez aunque cambie la instancia"""
+        CoosaludProcessor._homologar_texto_glosa.cache_clear()
+        
+        assert CoosaludProcessor()._homologar_codigo_glosa('203') == 'TA0301'
+        assert CoosaludProcessor()._homologar_codigo_glosa('203') == 'TA0301'
+        
+        info = CoosaludProcessor._homologar_texto_glosa.cache_info()
+        assert info.misses == 1
+        assert info.hits == 1
+    
+    def test_serie_equivale_a_escalar(self):
+        """La transformación de la columna coincide con la función escalar valor a valor"""
+        processor = CoosaludProcessor()
+        valores = [203, 430.0, np.nan, ' fa0101 ', '6', '999', '', 'None', 117]
+        
+        result = processor._homologar_codigos_glosa(pd.Series(valores, dtype=object))
+        esperado = ['' if pd.isna(v) else processor._homologar_codigo_glosa(str(v)) for v in valores]
+        
+        assert result.tolist() == esperado
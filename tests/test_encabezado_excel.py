@@ -0,0 +1,52 @@
+"""
+Tests para la lectura rápida de encabezados (encabezado_excel.py).
+
+Este módulo contiene tests unitarios para verificar:
+- Lectura de la primera fila de la primera hoja
+- Formatos no compatibles y archivos dañados
+- Normalización de nombres de columna
+"""
+import pandas as pd
+from openpyxl import Workbook
+
+from app.core.encabezado_excel import leer_encabezado, nombres_normalizados
+
+
+class TestLeerEncabezado:
+    """Tests para leer_encabezado."""
+
+    def test_primera_fila_de_la_primera_hoja(self, tmp_path):
+        """Retorna los nombres que usaría pd.read_excel, sin celdas vacías al final"""
+        ruta = tmp_path / 'detalle.xlsx'
+        wb = Workbook()
+        ws = wb.active
+        ws.append(['id_detalle', 'codigo_servicio', 2025, None])
+        ws.append([1, '890201', 3, 'x'])
+        wb.create_sheet('Otra').append(['codigo_glosa'])
+        wb.save(ruta)
+
+        assert leer_encabezado(str(ruta)) == ['id_detalle', 'codigo_servicio', 2025]
+        assert list(pd.read_excel(ruta).columns[:3]) == ['id_detalle', 'codigo_servicio', 2025]
+
+    def test_hoja_vacia(self, tmp_path):
+        """Un libro sin filas retorna lista vacía"""
+        ruta = tmp_path / 'vacio.xlsx'
+        Workbook().save(ruta)
+
+        assert leer_encabezado(str(ruta)) == []
+
+    def test_formato_no_compatible_o_danado(self, tmp_path):
+        """Formatos que openpyxl no abre y archivos dañados retornan None"""
+        danado = tmp_path / 'danado.xlsx'
+        danado.write_bytes(b'no es un excel')
+        csv = tmp_path / 'datos.csv'
+        csv.write_text('a,b\n1,2\n')
+
+        assert leer_encabezado(str(danado)) is None
+        assert leer_encabezado(str(csv)) is None
+        assert leer_encabezado(str(tmp_path / 'no_existe.xlsx')) is None
+
+    def test_nombres_normalizados(self):
+        """Minúsculas, sin espacios extremos y vacío para celdas None"""
+        assert nombres_normalizados([' Codigo_Glosa ', None, 12]) == ['codigo_glosa', '', '12']
+        assert nombres_normalizados(None) == []
@@ -0,0 +1,181 @@
+"""
+Tests para la escritura rápida de Excel (excel_writer.py).
+
+Este módulo contiene tests unitarios para verificar:
+- Que cada motor genere las mismas celdas que DataFrame.to_excel
+- Nombres y orden de hojas
+- Escritura por partes con EscritorExcel
+- Manejo de errores (sin hojas, motor inexistente)
+"""
+from datetime import date
+
+import numpy as np
+import openpyxl
+import pandas as pd
+import pytest
+
+from app.core import excel_writer
+
+
+def _datos_mixtos():
+    """DataFrame con los tipos que aparecen en consolidados y objeciones"""
+    return pd.DataFrame({
+        'CDCONSEC': [1, 2, 3],
+        'CRNCXC': ['FC000012345', np.nan, ''],
+        'Fecha': pd.to_datetime(['2025-03-15 10:30:00', None, '2025-01-02 00:00:00']),
+        'Fecha correo': [date(2025, 3, 15), None, date(2025, 1, 2)],
+        'CROVALOBJ': [1500.5, np.inf, -np.inf],
+        'Activo': [True, False, True],
+        'Observacion': ['Tarifa - Sin soporte', 'Ñandú áéí', None],
+    })
+
+
+def _celdas(ruta):
+    """(hoja, valor, tipo, formato) de cada celda con contenido"""
+    wb = openpyxl.load_workbook(ruta)
+    celdas = []
+    for ws in wb.worksheets:
+        for fila in ws.iter_rows():
+            for celda in fila:
+                if celda.value not in (None, ''):
+                    celdas.append((ws.title, celda.coordinate, celda.value, celda.data_type, celda.number_format))
+    return celdas
+
+
+class TestEscribirExcel:
+    """Tests para escribir_excel con cada motor disponible."""
+
+    def test_mismas_celdas_que_to_excel(self, tmp_path):
+        """Cada motor escribe los mismos valores, tipos y formatos que pandas"""
+        df = _datos_mixtos()
+        referencia = tmp_path / 'pandas.xlsx'
+        df.to_excel(referencia, index=False)
+
+        for motor in excel_writer.MOTORES:
+            ruta = tmp_path / f'{motor}.xlsx'
+            assert excel_writer.escribir_excel(ruta, df, motor=motor) == motor
+            assert _celdas(ruta) == _celdas(referencia), motor
+
+    def test_fechas_en_columna_categorica(self, tmp_path):
+        """Las fechas de una columna category llevan el mismo formato que pandas"""
+        df = pd.DataFrame({
+            'Fecha': pd.Series(pd.to_datetime(['2025-03-15 10:30:00', '2025-03-15 10:30:00', None]),
+                               dtype='category'),
+            'Codigo': pd.Series(['A', 'B', 'A'], dtype='category'),
+        })
+        referencia = tmp_path / 'pandas.xlsx'
+        df.to_excel(referencia, index=False)
+
+        for motor in excel_writer.MOTORES:
+            ruta = tmp_path / f'{motor}.xlsx'
+            excel_writer.escribir_excel(ruta, df, motor=motor)
+            assert _celdas(ruta) == _celdas(referencia), motor
+
+    def test_filas_por_bloques(self, tmp_path, monkeypatch):
+        """Las filas se convierten por bloques y el resultado no cambia"""
+        df = _datos_mixtos()
+        referencia = tmp_path / 'pandas.xlsx'
+        df.to_excel(referencia, index=False)
+        monkeypatch.setattr(excel_writer, 'FILAS_POR_BLOQUE', 2)
+        tamanos = []
+        valores_columna = excel_writer._valores_columna
+
+        def _valores_registrando(serie):
+            tamanos.append(len(serie))
+            return valores_columna(serie)
+
+        monkeypatch.setattr(excel_writer, '_valores_columna', _valores_registrando)
+
+        for motor in excel_writer.MOTORES:
+            ruta = tmp_path / f'{motor}.xlsx'
+            excel_writer.escribir_excel(ruta, df, motor=motor)
+            assert _celdas(ruta) == _celdas(referencia), motor
+        assert max(tamanos) == 2
+
+    def test_lectura_igual_a_to_excel(self, tmp_path):
+        """pd.read_excel obtiene el mismo DataFrame que con to_excel"""
+        df = _datos_mixtos()
+        referencia = tmp_path / 'pandas.xlsx'
+        df.to_excel(referencia, index=False)
+        esperado = pd.read_excel(referencia)
+
+        for motor in excel_writer.MOTORES:
+            ruta = tmp_path / f'{motor}.xlsx'
+            excel_writer.escribir_excel(ruta, df, motor=motor)
+            pd.testing.assert_frame_equal(pd.read_excel(ruta), esperado)
+
+    def test_varias_hojas_en_orden(self, tmp_path):
+        """Las hojas conservan nombre y orden del diccionario"""
+        detalle = pd.DataFrame({'numero_factura': ['1', '2']})
+        glosa = pd.DataFrame({'id_glosa': [10]})
+
+        for motor in excel_writer.MOTORES:
+            ruta = tmp_path / f'{motor}.xlsx'
+            excel_writer.escribir_excel(ruta, {'Detalles': detalle, 'Glosa': glosa}, motor=motor)
+
+            hojas = pd.read_excel(ruta, sheet_name=None)
+            assert list(hojas) == ['Detalles', 'Glosa']
+            assert hojas['Detalles']['numero_factura'].tolist() == [1, 2]
+            assert hojas['Glosa']['id_glosa'].tolist() == [10]
+
+    def test_dataframe_vacio_escribe_encabezado(self, tmp_path):
+        """Un DataFrame sin filas deja solo la fila de encabezado en 'Sheet1'"""
+        df = pd.DataFrame(columns=['Código Servicio de la ERP', 'Código producto en DGH'])
+
+        for motor in excel_writer.MOTORES:
+            ruta = tmp_path / f'{motor}.xlsx'
+            excel_writer.escribir_excel(ruta, df, motor=motor)
+
+            wb = openpyxl.load_workbook(ruta)
+            assert wb.sheetnames == ['Sheet1']
+            assert [c.value for c in wb.active[1]] == list(df.columns)
+            assert wb.active.max_row == 1
+
+    def test_motor_por_defecto(self):
+        """Usa xlsxwriter si está instalado y openpyxl en otro caso"""
+        esperado = 'xlsxwriter' if excel_writer.xlsxwriter is not None else 'openpyxl'
+        assert excel_writer.motor_por_defecto() == esperado
+
+    def test_motor_inexistente(self, tmp_path):
+        """Un motor no registrado genera ValueError"""
+        with pytest.raises(ValueError):
+            excel_writer.escribir_excel(tmp_path / 'x.xlsx', pd.DataFrame({'a': [1]}), motor='xls')
+
+    def test_sin_hojas(self, tmp_path):
+        """Un diccionario vacío genera ValueError"""
+        with pytest.raises(ValueError):
+            excel_writer.escribir_excel(tmp_path / 'x.xlsx', {})
+
+
+class TestEscritorExcel:
+    """Tests para la escritura por partes."""
+
+    def test_por_partes_igual_a_completo(self, tmp_path):
+        """Agregar por partes (intercalando hojas) da las mismas celdas que de una vez"""
+        df = _datos_mixtos()
+        glosa = pd.DataFrame({'id_glosa': [10, 11, 12]})
+        referencia = tmp_path / 'completo.xlsx'
+        excel_writer.escribir_excel(referencia, {'Detalles': df, 'Glosa': glosa})
+
+        for motor in excel_writer.MOTORES:
+            ruta = tmp_path / f'{motor}.xlsx'
+            with excel_writer.EscritorExcel(ruta, motor=motor) as escritor:
+                for i in range(len(df)):
+                    escritor.agregar('Detalles', df.iloc[i:i + 1])
+                    escritor.agregar('Glosa', glosa.iloc[i:i + 1])
+
+            assert escritor.filas('Detalles') == 3
+            assert _celdas(ruta) == _celdas(referencia), motor
+
+    def test_columnas_del_primer_dataframe(self, tmp_path):
+        """Las partes siguientes se alinean al encabezado de la primera"""
+        ruta = tmp_path / 'x.xlsx'
+        with excel_writer.EscritorExcel(ruta) as escritor:
+            escritor.agregar('Detalles', pd.DataFrame({'a': [1], 'b': ['x']}))
+            escritor.agregar('Detalles', pd.DataFrame({'b': ['y'], 'c': [3]}))
+            assert escritor.columnas('Detalles') == ['a', 'b']
+
+        leido = pd.read_excel(ruta)
+        assert list(leido.columns) == ['a', 'b']
+        assert leido['b'].tolist() == ['x', 'y']
+        assert pd.isna(leido['a'].iloc[1])
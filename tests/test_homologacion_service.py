@@ -13,6 +13,10 @@ import pandas as pd
 from pathlib import Path
 import tempfile
 import os
+import json
+import threading
+import time
+from datetime import datetime
 from unittest.mock import Mock, patch, MagicMock, mock_open
 
 from app.core.homologacion_service import HomologacionService
@@ -333,7 +337,7 @@ class TestHomologacionServiceFileOperations:
         assert self.service.df is not None
         assert self.service.df.empty
 
-    @patch('app.core.homologacion_service.pd.DataFrame.to_excel')
+    @patch('app.core.homologacion_service.excel_writer.escribir_excel')
     @patch('app.core.homologacion_service.os.makedirs')
     def test_guardar_exitoso(self, mock_makedirs, mock_to_excel):
         """Test guardar archivo exitosamente"""
@@ -398,3 +402,532 @@ class TestHomologacionServiceIntegration:
             # Listar con filtro
             filtrado = service.listar(filtro='100')
             assert len(filtrado) == 1
+
+
+class TestHomologacionServiceJournal:
+    """Tests para el journal de cambios append-only."""
+    
+    def setup_method(self):
+        """Setup para cada test"""
+        HomologacionService.clear_all_cache()
+    
+    def _crear_servicio(self, temp_dir):
+        """Crea un servicio apuntando a un snapshot temporal"""
+        test_file = os.path.join(temp_dir, 'mutualser_homologacion.xlsx')
+        pd.DataFrame({
+            'Código Servicio de la ERP': ['100', '200'],
+            'Código producto en DGH': ['ABC100', 'DEF200'],
+            'COD_SERV_FACT': ['FACT100', 'FACT200']
+        }).to_excel(test_file, index=False)
+        
+        service = HomologacionService()
+        service.homologacion_path = test_file
+        service.columnas_actuales = HomologacionService.EPS_COLUMNAS['mutualser']
+        service.eps = 'mutualser'
+        service._cargar()
+        return service, test_file
+    
+    def test_journal_path(self):
+        """El journal vive junto al archivo de homologación"""
+        ruta = HomologacionService._journal_path_de(os.path.join('dir', 'mutualser_homologacion.xlsx'))
+        assert ruta == os.path.join('dir', 'mutualser_homologacion.journal.jsonl')
+    
+    def test_agregar_no_reescribe_snapshot(self, tmp_path):
+        """Agregar un código solo escribe en el journal"""
+        service, test_file = self._crear_servicio(str(tmp_path))
+        mtime_antes = os.stat(test_file).st_mtime_ns
+        
+        with patch('app.core.homologacion_service.excel_writer.escribir_excel') as mock_to_excel:
+            assert service.agregar('300', 'GHI300', 'FACT300') is True
+            mock_to_excel.assert_not_called()
+        
+        assert os.stat(test_file).st_mtime_ns == mtime_antes
+        entradas = HomologacionService._leer_journal(HomologacionService._journal_path_de(test_file))
+        assert len(entradas) == 1
+        assert entradas[0]['op'] == 'agregar'
+        assert entradas[0]['codigo'] == '300'
+    
+    def test_lectura_aplica_journal_sobre_snapshot(self, tmp_path):
+        """Una nueva carga reconstruye el estado desde snapshot + journal"""
+        service, test_file = self._crear_servicio(str(tmp_path))
+        service.agregar('300', 'GHI300', 'FACT300')
+        service.actualizar('100', 'NUEVO100')
+        service.eliminar('200')
+        
+        HomologacionService.clear_all_cache()
+        otro = HomologacionService()
+        otro.homologacion_path = test_file
+        otro.columnas_actuales = HomologacionService.EPS_COLUMNAS['mutualser']
+        otro.eps = 'mutualser'
+        otro._cargar()
+        
+        codigos = otro.df['Código Servicio de la ERP'].astype(str).tolist()
+        assert codigos == ['100', '300']
+        assert otro.df.iloc[0]['Código producto en DGH'] == 'NUEVO100'
+    
+    def test_compactar_archiva_journal(self, tmp_path):
+        """La compactación reescribe el XLSX y mueve el journal a backups"""
+        service, test_file = self._crear_servicio(str(tmp_path))
+        service.agregar('300', 'GHI300', 'FACT300')
+        journal_path = HomologacionService._journal_path_de(test_file)
+        
+        assert service.compactar() is True
+        
+        assert not os.path.exists(journal_path)
+        backups = os.listdir(os.path.join(str(tmp_path), 'backups'))
+        assert len(backups) == 1
+        assert backups[0].endswith('.jsonl')
+        assert len(pd.read_excel(test_file)) == 3
+    
+    def test_compacta_al_superar_umbral(self, tmp_path):
+        """El journal se compacta automáticamente al alcanzar el máximo de entradas"""
+        service, test_file = self._crear_servicio(str(tmp_path))
+        
+        with patch.object(HomologacionService, 'JOURNAL_MAX_ENTRADAS', 2):
+            service.agregar('300', 'GHI300')
+            assert os.path.exists(HomologacionService._journal_path_de(test_file))
+            service.agregar('400', 'JKL400')
+        
+        assert not os.path.exists(HomologacionService._journal_path_de(test_file))
+        assert len(pd.read_excel(test_file)) == 4
+    
+    def test_procesadores_leen_cambios_del_journal(self, tmp_path):
+        """Lo guardado por el CRUD llega a los procesadores antes de compactar"""
+        from app.core.homologar_observacion import HomologadorObservacion
+        from app.core.mutualser_processor import MutualserProcessor
+        from app.service.processors.coosalud_processor import CoosaludProcessor
+        
+        service, test_file = self._crear_servicio(str(tmp_path))
+        service.agregar('300', 'GHI300', 'FACT300')
+        service.actualizar('100', 'NUEVO100')
+        assert os.path.exists(HomologacionService._journal_path_de(test_file))
+        
+        mutualser = MutualserProcessor(output_dir=str(tmp_path / 'salida'), homologacion_path=test_file,
+                                       cargar_homologacion=False)
+        mutualser._leer_homologacion()
+        observacion = HomologadorObservacion(homologacion_path=test_file)
+        CoosaludProcessor.limpiar_registro_homologadores()
+        coosalud = CoosaludProcessor(homologador_path=test_file)
+        assert coosalud.load_homologador()
+        CoosaludProcessor.limpiar_registro_homologadores()
+        
+        for df in (mutualser.df_homologacion, observacion.df_homologacion, coosalud.homologador_df):
+            codigos = df['Código Servicio de la ERP'].astype(str).tolist()
+            assert codigos == ['100', '200', '300']
+            assert df.iloc[0]['Código producto en DGH'] == 'NUEVO100'
+        assert 'FACT300' in mutualser._todos_cod_serv_fact
+        assert coosalud._diccionario_homologacion()['300'] == 'GHI300'
+    
+    def test_aplicar_journal_es_idempotente(self):
+        """Reaplicar un journal ya incluido en el snapshot no duplica filas"""
+        df = pd.DataFrame({
+            'Código Servicio de la ERP': ['100'],
+            'Código producto en DGH': ['ABC100']
+        })
+        entradas = [{'op': 'agregar', 'codigo': '200',
+                     'valores': {'Código Servicio de la ERP': '200', 'Código producto en DGH': 'DEF200'}}]
+        
+        una_vez = HomologacionService._aplicar_journal(df, entradas)
+        dos_veces = HomologacionService._aplicar_journal(una_vez, entradas)
+        
+        assert len(una_vez) == 2
+        assert len(dos_veces) == 2
+
+
+class TestHomologacionServiceCargaMasiva:
+    """Tests para la carga masiva vectorizada."""
+    
+    def setup_method(self):
+        """Setup para cada test"""
+        self.service = HomologacionService()
+        self.service.eps = 'mutualser'
+        self.service.columnas_actuales = HomologacionService.EPS_COLUMNAS['mutualser']
+        self.service.df = pd.DataFrame({
+            'Código Servicio de la ERP': ['100', '200'],
+            'Código producto en DGH': ['ABC100', 'DEF200'],
+            'COD_SERV_FACT': ['FACT100', 'FACT200']
+        })
+    
+    @patch.object(HomologacionService, '_guardar')
+    def test_upsert_masivo_agrega_nuevos_y_omite_existentes(self, mock_guardar):
+        """Agrega solo códigos nuevos, sin duplicados, y persiste una sola vez"""
+        mock_guardar.return_value = True
+        df_nuevos = pd.DataFrame({
+            'Código Servicio de la ERP': ['300', ' 100 ', '300', '', '400'],
+            'Código producto en DGH': ['GHI300', 'X', 'OTRO', 'Y', 'JKL400']
+        })
+        
+        resultado = self.service.upsert_masivo(df_nuevos)
+        
+        assert resultado['agregados'] == 2
+        assert resultado['omitidos'] == 1
+        assert len(resultado['errores']) == 1
+        mock_guardar.assert_called_once()
+        assert self.service.df['Código Servicio de la ERP'].tolist() == ['100', '200', '300', '400']
+        # COD_SERV_FACT toma el código DGH por defecto
+        assert self.service.df.iloc[2]['COD_SERV_FACT'] == 'GHI300'
+    
+    @patch.object(HomologacionService, '_guardar')
+    def test_upsert_masivo_sobrescribe_existentes(self, mock_guardar):
+        """Con sobrescribir=True actualiza los códigos existentes"""
+        mock_guardar.return_value = True
+        df_nuevos = pd.DataFrame({
+            'Código Servicio de la ERP': ['200'],
+            'Código producto en DGH': ['NUEVO200']
+        })
+        
+        resultado = self.service.upsert_masivo(df_nuevos, sobrescribir=True)
+        
+        assert resultado['actualizados'] == 1
+        assert self.service.df.iloc[1]['Código producto en DGH'] == 'NUEVO200'
+    
+    @patch.object(HomologacionService, '_guardar')
+    def test_agregar_multiples_persiste_una_vez(self, mock_guardar):
+        """agregar_multiples usa el camino masivo"""
+        mock_guardar.return_value = True
+        
+        agregados = self.service.agregar_multiples([('300', 'GHI300'), ('400', 'JKL400', 'F400'), ('100', 'X')])
+        
+        assert agregados == 2
+        mock_guardar.assert_called_once()
+    
+    def test_verificar_carga_masiva_clasifica_filas(self):
+        """Clasifica válidos, duplicados y errores con número de fila"""
+        df_carga = pd.DataFrame({
+            'codigo_eps': ['300', '100', '300', None, '500'],
+            'codigo_homologo': ['GHI300', 'X', 'OTRO', 'Y', None]
+        })
+        
+        resultado = self.service.verificar_carga_masiva(df_carga)
+        
+        assert resultado['validos'] == [('300', 'GHI300')]
+        assert resultado['duplicados_archivo'] == [{'codigo': '100', 'homologo_nuevo': 'X', 'fila': 3}]
+        assert resultado['duplicados_carga'] == [
+            {'codigo': '300', 'homologo': 'OTRO', 'fila_original': 2, 'fila_duplicada': 4}
+        ]
+        assert resultado['errores'] == [
+            'Fila 5: Código EPS vacío',
+            'Fila 6: Código homólogo vacío para 500'
+        ]
+
+
+class TestHomologacionServiceConcurrencia:
+    """Tests para el control de concurrencia entre usuarios."""
+    
+    def setup_method(self):
+        """Setup para cada test"""
+        HomologacionService.clear_all_cache()
+    
+    def _crear_archivo(self, temp_dir):
+        """Crea un snapshot temporal compartido"""
+        test_file = os.path.join(temp_dir, 'mutualser_homologacion.xlsx')
+        pd.DataFrame({
+            'Código Servicio de la ERP': ['100', '200'],
+            'Código producto en DGH': ['ABC100', 'DEF200'],
+            'COD_SERV_FACT': ['FACT100', 'FACT200']
+        }).to_excel(test_file, index=False)
+        return test_file
+    
+    def _abrir(self, test_file):
+        """Simula la sesión de un analista sobre el archivo compartido"""
+        HomologacionService.clear_all_cache()
+        service = HomologacionService()
+        service.homologacion_path = test_file
+        service.columnas_actuales = HomologacionService.EPS_COLUMNAS['mutualser']
+        service.eps = 'mutualser'
+        service._cargar()
+        return service
+    
+    def test_cambios_en_filas_distintas_se_fusionan(self, tmp_path):
+        """Dos usuarios agregando códigos distintos no se pisan"""
+        test_file = self._crear_archivo(str(tmp_path))
+        usuario_a = self._abrir(test_file)
+        usuario_b = self._abrir(test_file)
+        
+        assert usuario_a.agregar('300', 'GHI300') is True
+        assert usuario_b.agregar('400', 'JKL400') is True
+        
+        codigos = set(usuario_b.df['Código Servicio de la ERP'].astype(str))
+        assert codigos == {'100', '200', '300', '400'}
+        assert set(self._abrir(test_file).df['Código Servicio de la ERP'].astype(str)) == codigos
+    
+    def test_misma_fila_modificada_genera_conflicto(self, tmp_path):
+        """Actualizar una fila que otro usuario ya cambió se rechaza"""
+        test_file = self._crear_archivo(str(tmp_path))
+        usuario_a = self._abrir(test_file)
+        usuario_b = self._abrir(test_file)
+        
+        assert usuario_a.actualizar('100', 'NUEVO_A') is True
+        assert usuario_b.actualizar('100', 'NUEVO_B') is False
+        
+        assert usuario_b.conflictos[0]['codigo'] == '100'
+        fila = self._abrir(test_file).buscar_por_codigo_erp('100')
+        assert fila['Código producto en DGH'] == 'NUEVO_A'
+    
+    def test_eliminar_fila_ya_eliminada_no_es_conflicto(self, tmp_path):
+        """Si otro usuario ya eliminó el código, la eliminación se da por hecha"""
+        test_file = self._crear_archivo(str(tmp_path))
+        usuario_a = self._abrir(test_file)
+        usuario_b = self._abrir(test_file)
+        
+        assert usuario_a.eliminar('200') is True
+        assert usuario_b.eliminar('200') is True
+        assert usuario_b.conflictos == []
+    
+    def test_lock_ocupado_impide_guardar(self, tmp_path):
+        """Con el lock tomado por otro usuario el guardado falla sin escribir"""
+        test_file = self._crear_archivo(str(tmp_path))
+        service = self._abrir(test_file)
+        lock_path = HomologacionService._lock_path_de(test_file)
+        with open(lock_path, 'w', encoding='utf-8') as f:
+            f.write('{"owner": "otro"}')
+        
+        with patch.object(HomologacionService, 'LOCK_ESPERA_SEGUNDOS', 0):
+            assert service.agregar('300', 'GHI300') is False
+        
+        assert not os.path.exists(HomologacionService._journal_path_de(test_file))
+        assert os.path.exists(lock_path)
+    
+    def test_lock_vencido_se_reemplaza(self, tmp_path):
+        """Un lock abandonado más allá del lease no bloquea para siempre"""
+        test_file = self._crear_archivo(str(tmp_path))
+        service = self._abrir(test_file)
+        lock_path = HomologacionService._lock_path_de(test_file)
+        with open(lock_path, 'w', encoding='utf-8') as f:
+            f.write('{"owner": "otro"}')
+        antiguo = os.path.getmtime(lock_path) - HomologacionService.LOCK_LEASE_SEGUNDOS - 5
+        os.utime(lock_path, (antiguo, antiguo))
+        
+        assert service.agregar('300', 'GHI300') is True
+        assert not os.path.exists(lock_path)
+    
+    def _lock_vencido_de(self, lock_path, dueno):
+        """Escribe un lock de ``dueno`` sin renovar más allá del lease"""
+        viejo = datetime.fromtimestamp(time.time() - HomologacionService.LOCK_LEASE_SEGUNDOS - 5).isoformat()
+        with open(lock_path, 'w', encoding='utf-8') as f:
+            json.dump({'owner': dueno, 'ts': viejo}, f)
+    
+    def test_dos_usuarios_rompen_el_mismo_lock_vencido(self, tmp_path):
+        """Si A ya reemplazó el lock vencido, B no se lleva el lock nuevo de A"""
+        lock_path = str(tmp_path / 'homologacion.lock')
+        self._lock_vencido_de(lock_path, 'abandonado')
+        usuario_a = HomologacionService()
+        usuario_b = HomologacionService()
+        tokens = {}
+        lock_vencido = usuario_b._lock_vencido
+        
+        def b_ve_vencido_y_a_se_adelanta(path):
+            vencido = lock_vencido(path)
+            if 'a' not in tokens:
+                tokens['a'] = usuario_a._adquirir_lock(lock_path)
+            return vencido
+        
+        with patch.object(HomologacionService, 'LOCK_ESPERA_SEGUNDOS', 0), \
+             patch.object(usuario_b, '_lock_vencido', side_effect=b_ve_vencido_y_a_se_adelanta):
+            tokens['b'] = usuario_b._adquirir_lock(lock_path)
+        
+        assert tokens['a'] is not None
+        assert tokens['b'] is None
+        assert HomologacionService._dueno_lock(lock_path) == tokens['a']
+    
+    def test_lock_apartado_que_no_era_el_vencido_se_devuelve(self, tmp_path):
+        """Si el lock cambió justo antes de apartarlo, se devuelve a su lugar"""
+        lock_path = str(tmp_path / 'homologacion.lock')
+        self._lock_vencido_de(lock_path, 'abandonado')
+        usuario_a = HomologacionService()
+        usuario_b = HomologacionService()
+        dueno_lock = HomologacionService._dueno_lock
+        tokens = {}
+        
+        def a_se_adelanta(path):
+            dueno = dueno_lock(path)
+            if 'a' not in tokens:
+                tokens['a'] = usuario_a._adquirir_lock(lock_path)
+            return dueno
+        
+        with patch.object(HomologacionService, 'LOCK_ESPERA_SEGUNDOS', 0), \
+             patch.object(usuario_b, '_dueno_lock', side_effect=a_se_adelanta):
+            assert usuario_b._romper_lock_vencido(lock_path, 'abandonado') is False
+        
+        assert HomologacionService._dueno_lock(lock_path) == tokens['a']
+        assert not [n for n in os.listdir(tmp_path) if '.stale.' in n]
+    
+    def test_contendientes_en_paralelo_sobre_lock_vencido(self, tmp_path):
+        """Varios usuarios compitiendo por un lock vencido: solo uno lo obtiene"""
+        lock_path = str(tmp_path / 'homologacion.lock')
+        self._lock_vencido_de(lock_path, 'abandonado')
+        inicio = threading.Barrier(4)
+        tokens = []
+        
+        def competir():
+            service = HomologacionService()
+            inicio.wait()
+            tokens.append(service._adquirir_lock(lock_path))
+        
+        with patch.object(HomologacionService, 'LOCK_ESPERA_SEGUNDOS', 0.5):
+            hilos = [threading.Thread(target=competir) for _ in range(4)]
+            for hilo in hilos:
+                hilo.start()
+            for hilo in hilos:
+                hilo.join()
+        
+        ganadores = [t for t in tokens if t is not None]
+        assert len(ganadores) == 1
+        assert HomologacionService._dueno_lock(lock_path) == ganadores[0]
+    
+    def test_lease_se_mide_desde_ts_del_dueno(self, tmp_path):
+        """El mtime del servidor no decide el lease si el lock trae ts"""
+        lock_path = str(tmp_path / 'homologacion.lock')
+        service = HomologacionService()
+        lease = HomologacionService.LOCK_LEASE_SEGUNDOS
+        
+        with open(lock_path, 'w', encoding='utf-8') as f:
+            json.dump(HomologacionService._contenido_lock('otro'), f)
+        antiguo = time.time() - lease - 5
+        os.utime(lock_path, (antiguo, antiguo))
+        assert service._lock_vencido(lock_path) is False
+        
+        viejo = datetime.fromtimestamp(time.time() - lease - 5).isoformat()
+        with open(lock_path, 'w', encoding='utf-8') as f:
+            json.dump({'owner': 'otro', 'ts': viejo}, f)
+        assert service._lock_vencido(lock_path) is True
+    
+    def test_lock_se_renueva_mientras_se_mantiene(self, tmp_path):
+        """El dueño renueva el ts del lock durante operaciones largas"""
+        test_file = self._crear_archivo(str(tmp_path))
+        service = self._abrir(test_file)
+        lock_path = HomologacionService._lock_path_de(test_file)
+        
+        with patch.object(HomologacionService, 'LOCK_RENOVACION_SEGUNDOS', 0.05):
+            with service._bloqueo_escritura() as bloqueado:
+                assert bloqueado
+                with open(lock_path, encoding='utf-8') as f:
+                    inicial = json.load(f)
+                time.sleep(0.3)
+                with open(lock_path, encoding='utf-8') as f:
+                    renovado = json.load(f)
+        
+        assert renovado['owner'] == inicial['owner']
+        assert renovado['ts'] > inicial['ts']
+        assert not os.path.exists(lock_path)
+        assert not [n for n in os.listdir(tmp_path) if n.endswith('.tmp')]
+    
+    def test_refrescar_detecta_cambios_de_otro_usuario(self, tmp_path):
+        """refrescar recarga solo cuando el archivo cambió"""
+        test_file = self._crear_archivo(str(tmp_path))
+        usuario_a = self._abrir(test_file)
+        usuario_b = self._abrir(test_file)
+        
+        assert usuario_b.refrescar() is False
+        usuario_a.agregar('300', 'GHI300')
+        
+        assert usuario_b.refrescar() is True
+        assert '300' in set(usuario_b.df['Código Servicio de la ERP'].astype(str))
+
+
+class TestHomologacionServiceSearchCache:
+    """Tests para el caché LRU de búsquedas por código."""
+    
+    def setup_method(self):
+        """Setup para cada test"""
+        HomologacionService.clear_all_cache()
+        self.service = HomologacionService()
+        self.service.eps = 'mutualser'
+        self.service.columnas_actuales = HomologacionService.EPS_COLUMNAS['mutualser']
+        self.service.df = pd.DataFrame({
+            'Código Servicio de la ERP': ['100', '200', '300'],
+            'Código producto en DGH': ['ABC100', 'DEF200', 'GHI300'],
+            'COD_SERV_FACT': ['FACT100', 'FACT200', 'FACT300']
+        })
+    
+    def test_cache_guarda_tuplas_no_dataframes(self):
+        """Cada código cacheado es una tupla liviana"""
+        self.service.buscar_por_codigo_erp('200')
+        self.service.buscar_por_codigo_erp('999')
+        
+        filas = HomologacionService._search_cache['mutualser_search']['filas']
+        assert isinstance(filas['200'], tuple)
+        assert filas['999'] is None
+    
+    def test_cache_acotado_descarta_menos_usados(self):
+        """El LRU no crece más allá de SEARCH_CACHE_MAX"""
+        with patch.object(HomologacionService, 'SEARCH_CACHE_MAX', 2):
+            self.service.buscar_por_codigo_erp('100')
+            self.service.buscar_por_codigo_erp('200')
+            self.service.buscar_por_codigo_erp('100')  # 100 pasa a ser el más reciente
+            self.service.buscar_por_codigo_erp('300')
+        
+        filas = HomologacionService._search_cache['mutualser_search']['filas']
+        assert list(filas.keys()) == ['100', '300']
+    
+    @patch.object(HomologacionService, '_guardar')
+    def test_cache_se_invalida_al_editar(self, mock_guardar):
+        """Una edición cambia la versión y no se sirven resultados viejos"""
+        mock_guardar.return_value = True
+        assert self.service.buscar_por_codigo_erp('100')['Código producto en DGH'] == 'ABC100'
+        
+        self.service.actualizar('100', 'NUEVO100')
+        
+        assert self.service.buscar_por_codigo_erp('100')['Código producto en DGH'] == 'NUEVO100'
+    
+    def test_lote_usa_cache_y_busca_faltantes(self):
+        """La búsqueda por lote combina aciertos de caché y una sola búsqueda"""
+        self.service.buscar_por_codigo_erp('100')
+        
+        resultados = self.service.buscar_por_codigo_erp_lote(['100', ' 300 ', '999'])
+        
+        assert resultados['100']['Código producto en DGH'] == 'ABC100'
+        assert resultados['300']['Código producto en DGH'] == 'GHI300'
+        assert resultados['999'] is None
+
+
+class TestHomologacionServiceListar:
+    """Tests para el filtro indexado e incremental de listar."""
+    
+    def setup_method(self):
+        """Setup para cada test"""
+        HomologacionService.clear_all_cache()
+        self.service = HomologacionService()
+        self.service.eps = 'coosalud'
+        self.service.columnas_actuales = HomologacionService.EPS_COLUMNAS['coosalud']
+        self.service.df = pd.DataFrame({
+            'Código Servicio de la ERP': ['100', '120', '123', '200'],
+            'Código producto en DGH': ['ABC', 'DEF', 'GHI', 'XYZ12']
+        })
+    
+    def test_filtro_no_distingue_mayusculas(self):
+        """El filtro busca en todas las columnas sin importar mayúsculas"""
+        resultado = self.service.listar(filtro='xyz')
+        assert resultado['Código Servicio de la ERP'].tolist() == ['200']
+    
+    def test_filtro_no_cruza_columnas(self):
+        """Un filtro no coincide uniendo el final de una columna con la siguiente"""
+        assert self.service.listar(filtro='100abc').empty
+    
+    def test_filtro_incremental_reduce_candidatos(self):
+        """Extender la consulta solo revisa las filas que ya coincidían"""
+        self.service.listar(filtro='12')
+        assert self.service.total_coincidencias == 3
+        assert list(self.service._ultimo_filtro[2]) == [1, 2, 3]
+        
+        resultado = self.service.listar(filtro='123')
+        
+        assert resultado['Código Servicio de la ERP'].tolist() == ['123']
+        assert list(self.service._ultimo_filtro[2]) == [2]
+    
+    def test_paginacion(self):
+        """Se retorna solo la página pedida y el total queda disponible"""
+        pagina = self.service.listar(limite=2, desde=2)
+        
+        assert pagina['Código Servicio de la ERP'].tolist() == ['123', '200']
+        assert self.service.total_coincidencias == 4
+    
+    @patch.object(HomologacionService, '_guardar')
+    def test_indice_se_refresca_al_editar(self, mock_guardar):
+        """Tras agregar un código el filtro lo encuentra"""
+        mock_guardar.return_value = True
+        assert self.service.listar(filtro='999').empty
+        
+        self.service.agregar('999', 'NUEVO')
+        
+        assert self.service.listar(filtro='999')['Código Servicio de la ERP'].tolist() == ['999']
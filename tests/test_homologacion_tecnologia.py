@@ -0,0 +1,99 @@
+"""
+Tests para la homologación de tecnologías compartida (homologacion_tecnologia.py).
+
+Este módulo contiene tests unitarios para verificar:
+- Búsqueda exacta y por dígitos en Código Servicio de la ERP
+- Validación contra COD_SERV_FACT
+- Homologación de columnas completas resolviendo cada código una vez
+- Columna 'Tecnologia NO homologada'
+"""
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+
+from app.core.homologacion_tecnologia import IndiceHomologacion, tecnologias_no_homologadas
+
+
+def _homologacion():
+    return pd.DataFrame({
+        'Código Servicio de la ERP': ['9001', '12-345', '777', '777', '555', 890201],
+        'Código producto en DGH': ['D1', 'D-2', np.nan, 'D1', '0', 'X7'],
+        'COD_SERV_FACT': ['D1', '2-D', 'OTRO', None, '', 'X7'],
+    })
+
+
+def _indice(df=None):
+    df = _homologacion() if df is None else df
+    cod_serv_fact = set(df['COD_SERV_FACT'].dropna().astype(str).str.strip()) - {'0', ''}
+    return IndiceHomologacion(df, cod_serv_fact)
+
+
+class TestIndiceHomologacionBuscar:
+    """Tests para la búsqueda de un código."""
+    
+    def test_busqueda_exacta(self):
+        """Encuentra el código ERP exacto y valida el producto en COD_SERV_FACT"""
+        assert _indice().buscar(' 9001 ') == 'D1'
+        assert _indice().buscar(890201) == 'X7'
+    
+    def test_busqueda_por_digitos(self):
+        """Sin coincidencia exacta busca por la parte numérica"""
+        assert _indice().buscar('12345') == '2-D'
+        assert _indice().buscar('AB9001') == 'D1'
+    
+    def test_primera_fila_manda(self):
+        """Se usa la primera fila encontrada aunque su producto esté vacío"""
+        assert _indice().buscar('777') == ''
+    
+    def test_producto_invalido_o_sin_codigo(self):
+        """Producto '0', códigos vacíos o NaN no se homologan"""
+        indice = _indice()
+        assert indice.buscar('555') == ''
+        assert indice.buscar('') == ''
+        assert indice.buscar(np.nan) == ''
+        assert indice.buscar('nan') == ''
+        assert indice.buscar('no existe') == ''
+    
+    def test_sin_archivo_o_columnas(self):
+        """Sin homologación o sin columnas requeridas todo queda vacío"""
+        sin_columna = _homologacion().drop(columns=['COD_SERV_FACT'])
+        
+        assert IndiceHomologacion(None, None).buscar('9001') == ''
+        assert IndiceHomologacion(sin_columna, {'D1'}).buscar('9001') == ''
+
+
+class TestIndiceHomologacionSerie:
+    """Tests para la homologación de columnas completas."""
+    
+    def test_homologar_igual_a_buscar_por_fila(self):
+        """El resultado vectorizado coincide con la búsqueda fila a fila"""
+        indice = _indice()
+        tecnologias = pd.Series(['9001', 12345, None, '777', 'AB9001', '9001', 890201.0], index=range(10, 17))
+        
+        resultado = indice.homologar(tecnologias)
+        
+        assert list(resultado.index) == list(tecnologias.index)
+        assert resultado.tolist() == [indice.buscar(v) for v in tecnologias]
+    
+    def test_cada_codigo_se_resuelve_una_vez(self):
+        """Los códigos repetidos se buscan una sola vez"""
+        indice = _indice()
+        tecnologias = pd.Series(['9001', '12345'] * 500)
+        
+        with patch.object(indice, '_buscar_texto', wraps=indice._buscar_texto) as mock_buscar:
+            resultado = indice.homologar(tecnologias)
+        
+        assert mock_buscar.call_count == 2
+        assert resultado.value_counts().to_dict() == {'D1': 500, '2-D': 500}
+
+
+class TestTecnologiasNoHomologadas:
+    """Tests para la columna 'Tecnologia NO homologada'."""
+    
+    def test_solo_filas_sin_codigo(self):
+        """Conserva la tecnología original solo donde no hubo código"""
+        tecnologias = pd.Series(['9001', 555, None, 'ABC'])
+        codigos = pd.Series(['D1', '', '', np.nan])
+        
+        assert tecnologias_no_homologadas(tecnologias, codigos).tolist() == ['', 555, '', 'ABC']
@@ -177,3 +177,25 @@ class TestHomologadorObservacionConjunto:
         
         assert 'FACT001' in homologador.todos_cod_serv_fact
         assert 'FACT002' in homologador.todos_cod_serv_fact
+
+
+class TestHomologadorObservacionArchivo:
+    """Tests para homologar_archivo."""
+    
+    def test_homologar_archivo(self, tmp_path):
+        """Agrega el código homologado y la tecnología no homologada"""
+        homologacion = tmp_path / "homologador.xlsx"
+        pd.DataFrame({
+            'Código Servicio de la ERP': ['SRV001', '12345'],
+            'Código producto en DGH': ['FACT001', 'FACT002'],
+            'COD_SERV_FACT': ['FACT001', 'FACT002']
+        }).to_excel(homologacion, index=False)
+        entrada = tmp_path / "observacion.xlsx"
+        pd.DataFrame({'Tecnología': ['SRV001', '12345', 'NOEXISTE', 'SRV001']}).to_excel(entrada, index=False)
+        
+        homologador = HomologadorObservacion(homologacion_path=str(homologacion))
+        salida = homologador.homologar_archivo(str(entrada), str(tmp_path / "salida.xlsx"))
+        
+        df = pd.read_excel(salida, dtype=str, keep_default_na=False)
+        assert df['Codigo homologado DGH'].tolist() == ['FACT001', 'FACT002', '', 'FACT001']
+        assert df['Tecnologia NO homologada'].tolist() == ['', '', 'NOEXISTE', '']
@@ -8,10 +8,14 @@ Este módulo contiene tests unitarios para verificar:
 - Procesamiento de datos
 """
 import pytest
+import numpy as np
 import pandas as pd
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
 from unittest.mock import Mock, patch, MagicMock
 
+from app.core import objeciones
 from app.core.mutualser_processor import MutualserProcessor
 
 
@@ -200,3 +204,346 @@ class TestMutualserProcessorClass:
     def test_has_docstring(self):
         """La clase tiene docstring"""
         assert MutualserProcessor.__doc__ is not None
+
+
+def _crear_archivo_mutualser(path, filas=5):
+    """Crea un archivo MUTUALSER de prueba con encabezado desplazado"""
+    from openpyxl import Workbook
+    wb = Workbook()
+    ws = wb.active
+    ws.append(['MUTUALSER EPS'])
+    ws.append(['FECHA', '2025-03-15'])
+    ws.append(['Detalle de glosa'])
+    ws.append(['Número de factura', 'Número de glosa', 'Tecnología', 'Valor glosado',
+               'Valor glosado', None, 'Observacion'])
+    for i in range(filas):
+        ws.append([f'FE{i}', 1000 + i, '9001' if i % 2 else 12345, 100 * i, 7, None, 'obs'])
+    ws.append(['TOTAL', None, None, 99999])
+    wb.save(path)
+    return path
+
+
+class TestMutualserLecturaArchivo:
+    """Tests para la lectura de cada archivo en una sola pasada."""
+    
+    def setup_method(self):
+        """Setup para cada test"""
+        with patch('os.path.exists', return_value=False), patch('os.makedirs'):
+            self.processor = MutualserProcessor(output_dir='test_output')
+    
+    def test_tabla_desde_crudo_equivale_a_read_excel(self, tmp_path):
+        """Recortar la lectura cruda da lo mismo que releer con header"""
+        archivo = _crear_archivo_mutualser(str(tmp_path / 'glosa.xlsx'))
+        df_raw = pd.read_excel(archivo, header=None)
+        
+        esperado = pd.read_excel(archivo, header=3)
+        resultado = MutualserProcessor._tabla_desde_crudo(df_raw, 3)
+        
+        pd.testing.assert_frame_equal(resultado, esperado)
+    
+    def test_procesar_archivo_lee_una_sola_vez(self, tmp_path):
+        """procesar_archivo parsea el libro una única vez"""
+        archivo = _crear_archivo_mutualser(str(tmp_path / 'glosa.xlsx'))
+        
+        with patch('app.core.mutualser_processor.pd.read_excel', wraps=pd.read_excel) as mock_read:
+            df = self.processor.procesar_archivo(archivo)
+        
+        assert mock_read.call_count == 1
+        assert len(df) == 5
+        assert df['Fecha'].iloc[0] == '2025-03-15'
+
+
+class _PoolQueSeRompe:
+    """ProcessPoolExecutor falso: resuelve los primeros trabajos y luego se rompe"""
+    
+    def __init__(self, sanos):
+        self.sanos = sanos
+        self.enviados = 0
+    
+    def __call__(self, max_workers=None):
+        return self
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        return False
+    
+    def submit(self, fn, *args):
+        futuro = Future()
+        self.enviados += 1
+        if self.enviados <= self.sanos:
+            futuro.set_result(fn(*args))
+        else:
+            futuro.set_exception(BrokenProcessPool("proceso terminado"))
+        return futuro
+
+
+class TestMutualserProcesamientoParalelo:
+    """Tests para la lectura de múltiples archivos en procesos."""
+    
+    def setup_method(self):
+        """Setup para cada test"""
+        with patch('os.path.exists', return_value=False), patch('os.makedirs'):
+            self.processor = MutualserProcessor(output_dir='test_output')
+    
+    def _crear_archivos(self, tmp_path, cantidad):
+        """Crea archivos con distinta cantidad de filas para distinguir el orden"""
+        return [
+            _crear_archivo_mutualser(str(tmp_path / f'glosa_{i}.xlsx'), filas=i + 1)
+            for i in range(cantidad)
+        ]
+    
+    def test_sin_homologacion_no_lee_archivo_homologador(self):
+        """Los procesos del pool no cargan el archivo de homologación"""
+        with patch.object(MutualserProcessor, '_cargar_homologacion') as mock_cargar, \
+                patch('os.makedirs'):
+            MutualserProcessor(output_dir='test_output', cargar_homologacion=False)
+        mock_cargar.assert_not_called()
+    
+    def test_paralelo_conserva_orden_y_resultado(self, tmp_path):
+        """El consolidado en paralelo es idéntico al secuencial"""
+        archivos = self._crear_archivos(tmp_path, 4)
+        archivos.insert(2, str(tmp_path / 'no_existe.xlsx'))
+        
+        with patch('os.path.exists', return_value=False), patch('os.makedirs'):
+            serial = MutualserProcessor(output_dir='test_output')
+        esperado = serial.procesar_multiples_archivos(archivos, paralelo=False)
+        
+        resultado = self.processor.procesar_multiples_archivos(archivos, paralelo=True, max_workers=2)
+        
+        pd.testing.assert_frame_equal(resultado, esperado)
+        assert self.processor.archivos_procesados == serial.archivos_procesados
+        assert [e['archivo'] for e in self.processor.errores] == [archivos[2]]
+    
+    def test_progreso_por_archivo(self, tmp_path):
+        """El callback de progreso se llama una vez por archivo"""
+        archivos = self._crear_archivos(tmp_path, 3)
+        avances = []
+        
+        self.processor.procesar_multiples_archivos(
+            archivos, paralelo=True, max_workers=2,
+            progress_callback=lambda hechos, total, _: avances.append((hechos, total))
+        )
+        
+        assert avances == [(1, 3), (2, 3), (3, 3)]
+    
+    def test_pool_roto_conserva_archivos_leidos(self, tmp_path):
+        """Si el pool se rompe a mitad, solo se leen en serie los archivos sin resultado"""
+        archivos = self._crear_archivos(tmp_path, 4)
+        with patch('os.path.exists', return_value=False), patch('os.makedirs'):
+            serial = MutualserProcessor(output_dir='test_output')
+        esperado = serial.procesar_multiples_archivos(archivos, paralelo=False)
+        avances = []
+        
+        with patch('app.core.mutualser_processor.ProcessPoolExecutor', _PoolQueSeRompe(sanos=2)), \
+                patch.object(self.processor, '_leer_en_serie', wraps=self.processor._leer_en_serie) as en_serie:
+            resultado = self.processor.procesar_multiples_archivos(
+                archivos, paralelo=True, max_workers=2,
+                progress_callback=lambda hechos, total, _: avances.append((hechos, total))
+            )
+        
+        assert en_serie.call_args.args[0] == archivos[2:]
+        assert avances == [(1, 4), (2, 4), (3, 4), (4, 4)]
+        pd.testing.assert_frame_equal(resultado, esperado)
+        assert sorted(self.processor.archivos_procesados) == sorted(archivos)
+
+
+class TestMutualserEncabezadoYMapeo:
+    """Tests para la detección de encabezados y el mapeo de columnas."""
+    
+    def setup_method(self):
+        """Setup para cada test"""
+        MutualserProcessor._mapeos_por_encabezado.clear()
+        with patch('os.path.exists', return_value=False), patch('os.makedirs'):
+            self.processor = MutualserProcessor(output_dir='test_output')
+    
+    def test_detecta_encabezado_en_bloque_posterior(self):
+        """El encabezado se encuentra aunque esté después del primer bloque"""
+        df_raw = pd.DataFrame([
+            ['MUTUALSER', None],
+            ['Fecha', '15/03/2025'],
+            [None, None],
+            [None, 'Número de factura'],
+            ['FE1', 100],
+        ])
+        
+        with patch.object(MutualserProcessor, 'ENCABEZADO_FILAS_BLOQUE', 2):
+            header, fecha = self.processor._detectar_encabezado(df_raw)
+        
+        assert header == 3
+        assert fecha == '2025-03-15'
+    
+    def test_detalle_de_glosa_usa_fila_siguiente(self):
+        """'DETALLE DE GLOSA' indica que el encabezado está en la fila siguiente"""
+        df_raw = pd.DataFrame([['Detalle de glosa'], ['Factura'], ['FE1']])
+        
+        assert self.processor._detectar_encabezado(df_raw) == (1, None)
+    
+    def test_sin_encabezado(self):
+        """Sin marcadores no hay encabezado"""
+        df_raw = pd.DataFrame([['a', 'b'], ['c', None]])
+        
+        assert self.processor._detectar_encabezado(df_raw) == (None, None)
+    
+    def test_mapeo_ignora_tildes_y_mayusculas(self):
+        """Las columnas se resuelven sin importar tildes ni mayúsculas"""
+        mapeo = self.processor._resolver_mapeo(['NUMERO DE FACTURA ', 'Tecnologia', 'Otra'])
+        
+        assert mapeo['Número de factura'] == 'NUMERO DE FACTURA '
+        assert mapeo['Tecnología'] == 'Tecnologia'
+        assert mapeo['Valor glosado'] is None
+    
+    def test_mapeo_se_reutiliza_por_formato(self):
+        """Archivos con los mismos encabezados no vuelven a comparar nombres"""
+        columnas = ['Número de factura', 'Tecnología']
+        self.processor._resolver_mapeo(columnas)
+        
+        with patch.object(MutualserProcessor, '_normalizar_nombre') as mock_normalizar:
+            self.processor._resolver_mapeo(list(columnas))
+        
+        mock_normalizar.assert_not_called()
+
+
+class TestMutualserCacheResultados:
+    """Tests para la caché de resultados por archivo."""
+    
+    def _crear_procesador(self, tmp_path):
+        """Procesador sin homologación con caché en tmp_path"""
+        with patch.object(MutualserProcessor, '_cargar_homologacion'):
+            return MutualserProcessor(output_dir=str(tmp_path / 'out'), cache_dir=str(tmp_path / 'cache'))
+    
+    def _crear_archivos(self, tmp_path, cantidad):
+        return [
+            _crear_archivo_mutualser(str(tmp_path / f'glosa_{i}.xlsx'), filas=i + 1)
+            for i in range(cantidad)
+        ]
+    
+    def test_sin_cache_por_defecto(self):
+        """Sin cache_dir no se usa caché"""
+        with patch('os.path.exists', return_value=False), patch('os.makedirs'):
+            processor = MutualserProcessor(output_dir='test_output')
+        assert processor.cache is None
+    
+    def test_segunda_corrida_no_parsea(self, tmp_path):
+        """Los archivos ya procesados se toman de la caché"""
+        archivos = self._crear_archivos(tmp_path, 3)
+        esperado = self._crear_procesador(tmp_path).procesar_multiples_archivos(archivos, paralelo=False)
+        
+        processor = self._crear_procesador(tmp_path)
+        with patch.object(processor, 'procesar_archivo') as mock_procesar:
+            resultado = processor.procesar_multiples_archivos(archivos, paralelo=False)
+        
+        mock_procesar.assert_not_called()
+        pd.testing.assert_frame_equal(resultado, esperado)
+        assert processor.archivos_procesados == archivos
+    
+    def test_solo_parsea_archivos_nuevos(self, tmp_path):
+        """Un archivo nuevo se parsea y el resto sale de la caché, en orden"""
+        archivos = self._crear_archivos(tmp_path, 3)
+        self._crear_procesador(tmp_path).procesar_multiples_archivos(archivos[:2], paralelo=False)
+        
+        processor = self._crear_procesador(tmp_path)
+        avances = []
+        with patch.object(processor, 'procesar_archivo', wraps=processor.procesar_archivo) as mock_procesar:
+            resultado = processor.procesar_multiples_archivos(
+                archivos, paralelo=False,
+                progress_callback=lambda hechos, total, _: avances.append((hechos, total))
+            )
+        
+        assert [c.args[0] for c in mock_procesar.call_args_list] == [archivos[2]]
+        assert len(resultado) == 1 + 2 + 3
+        assert resultado['Número de factura'].tolist() == ['FE0', 'FE0', 'FE1', 'FE0', 'FE1', 'FE2']
+        assert avances == [(2, 3), (3, 3)]
+    
+    def test_archivo_modificado_se_vuelve_a_parsear(self, tmp_path):
+        """Si cambia el contenido del archivo, la caché no aplica"""
+        archivo = _crear_archivo_mutualser(str(tmp_path / 'glosa.xlsx'), filas=2)
+        self._crear_procesador(tmp_path).procesar_multiples_archivos([archivo], paralelo=False)
+        
+        _crear_archivo_mutualser(archivo, filas=4)
+        resultado = self._crear_procesador(tmp_path).procesar_multiples_archivos([archivo], paralelo=False)
+        
+        assert len(resultado) == 4
+
+
+class TestMutualserTiposConsolidado:
+    """Tests para la normalización de tipos del consolidado."""
+    
+    def setup_method(self):
+        """Setup para cada test"""
+        with patch('os.path.exists', return_value=False), patch('os.makedirs'):
+            self.processor = MutualserProcessor(output_dir='test_output')
+    
+    def _consolidado(self):
+        return pd.DataFrame({
+            'Número de factura': ['FE1', 'FE2', 'FE3', 'FE4'],
+            'Número de glosa': [5000, 5000, 5000, 5001],
+            'Cantidad glosada': pd.Series([1, 2, None, 4], dtype=object),
+            'Valor glosado': pd.Series([100, 200.5, 300, None], dtype=object),
+            'Valor Facturado': ['$ 1.200', 1500, None, '2.000'],
+            'Código de glosa': ['AU0101', 'TA0201', 'AU0101', 'AU0101'],
+            'Fecha': pd.Series(['2025-03-15', pd.Timestamp('2025-04-01'), '', None], dtype=object),
+        })
+    
+    def test_tipos_compactos(self):
+        """Categorías, números y fechas quedan con tipos compactos"""
+        df = self.processor._normalizar_tipos(self._consolidado())
+        
+        assert isinstance(df['Número de glosa'].dtype, pd.CategoricalDtype)
+        assert isinstance(df['Código de glosa'].dtype, pd.CategoricalDtype)
+        assert str(df['Cantidad glosada'].dtype) == 'Int64'
+        assert df['Valor glosado'].dtype == float
+        assert pd.api.types.is_datetime64_any_dtype(df['Fecha'])
+        assert df['Fecha'].iloc[1] == pd.Timestamp('2025-04-01')
+        assert df['Fecha'].iloc[2:].isna().all()
+    
+    def test_no_convierte_con_perdida(self):
+        """Montos en texto y fechas no interpretables se conservan"""
+        df = self._consolidado()
+        df.loc[3, 'Fecha'] = 'sin fecha'
+        
+        normalizado = self.processor._normalizar_tipos(df.copy())
+        
+        assert normalizado['Valor Facturado'].tolist() == df['Valor Facturado'].tolist()
+        assert normalizado['Fecha'].tolist() == df['Fecha'].tolist()
+    
+    def test_objeciones_iguales_con_tipos_compactos(self):
+        """Las columnas de objeciones no cambian tras normalizar"""
+        original = self._consolidado()
+        normalizado = self.processor._normalizar_tipos(self._consolidado())
+        
+        for col in ['Cantidad glosada', 'Valor glosado', 'Valor Facturado']:
+            assert objeciones.valor_numerico(normalizado[col]).tolist() == objeciones.valor_numerico(original[col]).tolist()
+        assert objeciones.formatear_fecha_dmy(normalizado['Fecha']).tolist() == objeciones.formatear_fecha_dmy(original['Fecha']).tolist()
+    
+    def test_consolidado_normalizado(self, tmp_path):
+        """procesar_multiples_archivos entrega el consolidado con tipos compactos"""
+        archivos = [_crear_archivo_mutualser(str(tmp_path / f'glosa_{i}.xlsx')) for i in range(2)]
+        
+        df = self.processor.procesar_multiples_archivos(archivos, paralelo=False)
+        
+        assert pd.api.types.is_datetime64_any_dtype(df['Fecha'])
+        assert df['Valor glosado'].dtype == np.int64
+    
+    def test_exportar_fecha_como_texto(self, tmp_path):
+        """El consolidado exportado conserva la fecha como texto 'YYYY-MM-DD'"""
+        from openpyxl import load_workbook
+        self.processor.output_dir = str(tmp_path)
+        df = self._consolidado()
+        df['Tecnología'] = ['9001', '9002', '9003', '9004']
+        df['Fecha'] = pd.Series(['2024-01-15', '2024-01-15', '2024-02-01', None], dtype=object)
+        self.processor.df_consolidado = self.processor._normalizar_tipos(df)
+        
+        with patch.object(self.processor, '_aplicar_homologacion'), \
+             patch.object(self.processor, '_generar_archivo_objeciones', return_value=None):
+            output_path, _ = self.processor.exportar_consolidado('consolidado.xlsx')
+        
+        ws = load_workbook(output_path).active
+        encabezados = [c.value for c in ws[1]]
+        columna = encabezados.index('Fecha') + 1
+        celdas = [ws.cell(row=fila, column=columna) for fila in range(2, 6)]
+        assert [c.value for c in celdas[:3]] == ['2024-01-15', '2024-01-15', '2024-02-01']
+        assert all(c.data_type == 's' for c in celdas[:3])
+        assert celdas[3].value in (None, '')
+        assert pd.api.types.is_datetime64_any_dtype(self.processor.df_consolidado['Fecha'])
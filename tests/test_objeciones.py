@@ -0,0 +1,172 @@
+"""
+Tests para las transformaciones compartidas de objeciones (objeciones.py).
+
+Este módulo contiene tests unitarios para verificar:
+- Combinación AU/TA contra un archivo golden generado con la implementación fila a fila
+- Formateo vectorizado de columnas (CRNCXC, fechas, valores, observaciones y REG GLOSA)
+"""
+import json
+import random
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from app.core import objeciones
+
+GOLDEN_DIR = Path(__file__).parent / 'golden'
+
+
+def _datos_au_ta(filas=400, semilla=2024):
+    """DataFrame de objeciones con casos borde de AU/TA (NaN, vacíos, minúsculas)"""
+    rnd = random.Random(semilla)
+    facturas = ['FC00001', 'FC00002', 'FC00003', np.nan]
+    servicios = ['890201', '890301', '', np.nan]
+    conceptos = ['AU0101', 'TA0201', 'ta0301', 'au0102', 'FA0101', 'SO0201', np.nan, '']
+    observaciones = ['Falta autorización', 'Tarifa pactada', '', '   ', np.nan, ' con espacios ', 'nan']
+    return pd.DataFrame({
+        'CDCONSEC': range(1, filas + 1),
+        'CRNCXC': [rnd.choice(facturas) for _ in range(filas)],
+        'CRNCONOBJ': [rnd.choice(conceptos) for _ in range(filas)],
+        'SLNSERPRO': [rnd.choice(servicios) for _ in range(filas)],
+        'CROVALOBJ': [rnd.randint(0, 100000) for _ in range(filas)],
+        'CRDOBSERV': [rnd.choice(observaciones) for _ in range(filas)],
+    })
+
+
+def _serializar(df):
+    """Representación JSON estable de un DataFrame (índice, columnas y valores)"""
+    valores = df.astype(object).where(df.notna(), None)
+    return json.dumps({
+        'index': [int(i) for i in df.index],
+        'columns': list(df.columns),
+        'data': valores.values.tolist(),
+    }, ensure_ascii=False, indent=1, default=str)
+
+
+class TestCombinarAuTa:
+    """Tests para la combinación vectorizada de filas AU/TA."""
+    
+    def test_coincide_con_golden(self):
+        """El resultado es idéntico al generado con la implementación fila a fila"""
+        resultado, procesadas = objeciones.combinar_au_ta(_datos_au_ta())
+        
+        esperado = (GOLDEN_DIR / 'au_ta_esperado.json').read_text(encoding='utf-8')
+        assert _serializar(resultado) == esperado
+        assert procesadas == len(_datos_au_ta()) - len(resultado)
+    
+    def test_combina_observaciones_en_fila_au(self):
+        """Las observaciones TA se agregan a la primera fila AU y las TA se eliminan"""
+        df = pd.DataFrame({
+            'CRNCXC': ['F1', 'F1', 'F1', 'F2'],
+            'SLNSERPRO': ['S1', 'S1', 'S1', 'S1'],
+            'CRNCONOBJ': ['AU01', 'TA01', 'TA02', 'TA01'],
+            'CRDOBSERV': ['', 'uno', 'dos', 'sola'],
+        })
+        
+        resultado, procesadas = objeciones.combinar_au_ta(df)
+        
+        assert procesadas == 2
+        assert resultado['CRNCONOBJ'].tolist() == ['AU01', 'TA01']
+        assert resultado['CRDOBSERV'].tolist() == ['\\\\ uno \\\\ dos', 'sola']
+        assert list(resultado.index) == [0, 1]
+    
+    def test_sin_pares_retorna_igual(self):
+        """Sin grupos AU+TA el DataFrame no cambia"""
+        df = pd.DataFrame({
+            'CRNCXC': ['F1', 'F2'], 'SLNSERPRO': ['S1', 'S1'],
+            'CRNCONOBJ': ['AU01', 'TA01'], 'CRDOBSERV': ['a', 'b'],
+        }, index=[5, 7])
+        
+        resultado, procesadas = objeciones.combinar_au_ta(df)
+        
+        assert procesadas == 0
+        pd.testing.assert_frame_equal(resultado, df)
+    
+    def test_procesadores_usan_la_misma_combinacion(self):
+        """MUTUALSER y COOSALUD producen el mismo resultado AU/TA"""
+        from unittest.mock import patch
+
+        from app.core.mutualser_processor import MutualserProcessor
+        from app.service.processors.coosalud_processor import CoosaludProcessor
+        
+        with patch('os.path.exists', return_value=False), patch('os.makedirs'):
+            mutualser = MutualserProcessor(output_dir='test_output')
+        coosalud = CoosaludProcessor()
+        
+        esperado = (GOLDEN_DIR / 'au_ta_esperado.json').read_text(encoding='utf-8')
+        assert _serializar(mutualser._procesar_au_ta(_datos_au_ta())) == esperado
+        assert _serializar(coosalud._procesar_au_ta(_datos_au_ta())) == esperado
+
+
+class TestFormateoColumnas:
+    """Tests para los constructores vectorizados de columnas de Objeciones.xlsx."""
+    
+    def test_crncxc_formato_mutualser(self):
+        """Agrega FC0000 conservando el número y deja vacío lo vacío"""
+        serie = pd.Series(['12345', 'fc678', ' FC90 ', '', np.nan, 4321, 0, 'A-1'])
+        
+        resultado = objeciones.formatear_crncxc(serie)
+        
+        assert resultado.tolist() == [
+            'FC000012345', 'FC0000678', 'FC000090', '', '', 'FC00004321', '', 'FC0000A-1'
+        ]
+    
+    def test_crncxc_solo_digitos(self):
+        """El formato COOSALUD conserva solo dígitos y vacía si no hay"""
+        serie = pd.Series(['FC-12.345', 'ABC', '987', np.nan], index=[10, 11, 12, 13])
+        
+        resultado = objeciones.formatear_crncxc(serie, solo_digitos=True)
+        
+        assert resultado.tolist() == ['FC000012345', '', 'FC0000987', '']
+        assert list(resultado.index) == [10, 11, 12, 13]
+    
+    def test_fecha_dmy_texto_y_datetime(self):
+        """Formatea texto, Timestamp y columnas datetime; lo inválido queda vacío"""
+        texto = pd.Series(['2025-03-15', 'Mon, 3 Mar 2025 10:00:00 -0500', 'no es fecha', '', np.nan, '2025-03-15'])
+        fechas = pd.Series(pd.to_datetime(['2025-01-02', None]))
+        
+        assert objeciones.formatear_fecha_dmy(texto).tolist() == [
+            '15/03/2025', '03/03/2025', '', '', '', '15/03/2025'
+        ]
+        assert objeciones.formatear_fecha_dmy(fechas).tolist() == ['02/01/2025', '']
+    
+    def test_valor_numerico_entero(self):
+        """Sin decimales elimina separadores y trunca a entero"""
+        serie = pd.Series(['$ 1.234.567', '1,500', 99.9, '', np.nan, 'abc'])
+        
+        resultado = objeciones.valor_numerico(serie)
+        
+        assert resultado.dtype == np.int64
+        assert resultado.tolist() == [1234567, 1500, 99, 0, 0, 0]
+    
+    def test_valor_numerico_con_decimales(self):
+        """Con decimales interpreta separadores colombianos e internacionales"""
+        serie = pd.Series(['$ 1.234.567,89', '1,234,567.89', '1500,5', '1,500', '1.000.000', '12.5', 7, 'x'])
+        
+        resultado = objeciones.valor_numerico(serie, decimales=True)
+        
+        assert resultado.tolist() == [1234567.89, 1234567.89, 1500.5, 1500.0, 1000000.0, 12.5, 7.0, 0.0]
+    
+    def test_combinar_observaciones(self):
+        """Une concepto y observación no vacíos con ' - '"""
+        df = pd.DataFrame({
+            'Concepto de glosa': ['Tarifa', '', np.nan, ' Pertinencia '],
+            'Observacion': ['Sin soporte', 'Solo obs', np.nan, '  '],
+        })
+        
+        assert objeciones.combinar_observaciones(df).tolist() == [
+            'Tarifa - Sin soporte', 'Solo obs', '', 'Pertinencia'
+        ]
+        assert objeciones.combinar_observaciones(df[['Observacion']]).tolist() == [
+            'Sin soporte', 'Solo obs', '', ''
+        ]
+    
+    def test_reg_glosa(self):
+        """Antepone el texto REG GLOSA al número y deja vacío si no hay número"""
+        numeros = pd.Series([5000, np.nan, 'G-12'], index=[4, 5, 6])
+        
+        resultado = objeciones.reg_glosa(numeros)
+        
+        assert resultado.tolist() == ['REG, GLOSA SEGUN RAD N. 5000', '', 'REG, GLOSA SEGUN RAD N. G-12']
+        assert list(resultado.index) == [4, 5, 6]